@@ -1,7 +1,56 @@
-from collections import deque
-from dataclasses import dataclass
-from datetime import datetime
-from typing import Deque, Dict, List
+import base64
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from .batch_writer import BatchWriter
+from .config import settings
+
+SEVERITIES = ("info", "warning", "critical")
+STATUSES = ("active", "acknowledged", "closed")
+
+_COLUMNS = (
+    "id, message, timestamp, severity, grid_id, device_id, status, acknowledged_by, acknowledged_at, "
+    "first_seen, last_seen, count, closed_at"
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id TEXT PRIMARY KEY,
+    message TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    grid_id TEXT,
+    device_id TEXT,
+    status TEXT NOT NULL DEFAULT 'active',
+    acknowledged_by TEXT,
+    acknowledged_at TEXT,
+    ts REAL NOT NULL,
+    alert_key TEXT,
+    first_seen TEXT,
+    last_seen TEXT,
+    count INTEGER NOT NULL DEFAULT 1,
+    closed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_ts ON alerts (ts DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_alerts_grid_status ON alerts (grid_id, status, ts DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_alerts_grid_severity ON alerts (grid_id, severity, ts DESC, id DESC);
+"""
+
+# Columns added after the first release of the store, applied to existing databases on open
+_ADDED_COLUMNS = {
+    "alert_key": "TEXT",
+    "first_seen": "TEXT",
+    "last_seen": "TEXT",
+    "count": "INTEGER NOT NULL DEFAULT 1",
+    "closed_at": "TEXT",
+}
+
+Key = Tuple[Optional[str], Optional[str], str]
 
 
 @dataclass
@@ -10,20 +59,291 @@ class Alert:
     message: str
     timestamp: str
     severity: str = "warning"
+    grid_id: Optional[str] = None
+    device_id: Optional[str] = None
+    status: str = "active"
+    acknowledged_by: Optional[str] = None
+    acknowledged_at: Optional[str] = None
+    first_seen: Optional[str] = None
+    last_seen: Optional[str] = None
+    count: int = 1
+    closed_at: Optional[str] = None
+
+
+def alert_type(message: str) -> str:
+    """Alert type used for coalescing: the message prefix before ':' (e.g. "Load Abnormality")."""
+    return message.split(":", 1)[0].strip()
+
+
+def _epoch(timestamp: str) -> float:
+    parsed = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _encode_cursor(ts: float, alert_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{ts!r}|{alert_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """Raises ValueError for cursors this store did not produce."""
+    try:
+        ts, alert_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return float(ts), alert_id
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
 
 
 class AlertsStore:
-    def __init__(self, maxlen: int = 1000) -> None:
-        self._alerts: Deque[Alert] = deque(maxlen=maxlen)
+    """SQLite-backed alerts in WAL mode.
 
-    def add(self, message: str, timestamp: str) -> Alert:
-        alert_id = f"alert-{int(datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp())}-{len(self._alerts)}"
-        alert = Alert(id=alert_id, message=message, timestamp=timestamp)
-        self._alerts.appendleft(alert)
+    Inserts from the ingest workers are queued and committed in batches on a
+    background thread; reads and acknowledgements go through their own
+    connections so they never wait behind a batch commit.
+
+    Repeats of an alert with the same (grid, device, type) key coalesce into
+    the open alert for that key, bumping its ``count`` and ``last_seen``,
+    until no repeat has arrived for ``quiet_period`` seconds; the alert is
+    then closed and the next occurrence opens a new one. Acknowledging an
+    open alert ends its coalescing the same way.
+    """
+
+    def __init__(self, path: str, quiet_period: float = 300.0) -> None:
+        self._path = path
+        self._quiet_period = quiet_period
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        # key -> (open alert, monotonic time of its last occurrence)
+        self._open: Dict[Key, Tuple[Alert, float]] = {}
+        self._coalesced = 0
+        # Bumped after every commit that changes stored alerts; list responses are validated against it
+        self.version = 0
+        self._sweeper: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._writer_conn = self._connect()
+        self._writer_conn.executescript(_SCHEMA)
+        self._migrate()
+        self._reader_conn = self._connect()
+        # Kept up to date by the writer, so stats never have to count the table
+        (self._stored,) = self._reader_conn.execute("SELECT COUNT(*) FROM alerts").fetchone()
+        self._load_open()
+        self._writer = BatchWriter(
+            flush=self._apply,
+            batch_size=settings.alerts_batch_size,
+            flush_interval=settings.alerts_flush_interval,
+            max_queue=settings.alerts_queue_size,
+            policy="block",
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _migrate(self) -> None:
+        existing = {row[1] for row in self._writer_conn.execute("PRAGMA table_info(alerts)")}
+        for column, ddl in _ADDED_COLUMNS.items():
+            if column not in existing:
+                self._writer_conn.execute(f"ALTER TABLE alerts ADD COLUMN {column} {ddl}")
+        self._writer_conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_alerts_open_key ON alerts (alert_key) WHERE status != 'closed'"
+        )
+
+    def _load_open(self) -> None:
+        # Alerts left open by a previous run keep coalescing; their quiet period restarts now
+        now = time.monotonic()
+        rows = self._reader_conn.execute(
+            f"SELECT {_COLUMNS} FROM alerts WHERE status != 'closed' AND alert_key IS NOT NULL"
+        ).fetchall()
+        for row in rows:
+            alert = Alert(*row)
+            self._open[(alert.grid_id, alert.device_id, alert_type(alert.message))] = (alert, now)
+
+    def start(self) -> None:
+        self._writer.start()
+        if self._sweeper is None:
+            self._stopping.clear()
+            self._sweeper = threading.Thread(target=self._sweep, name="alerts-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._sweeper is not None:
+            self._sweeper.join(timeout=5)
+            self._sweeper = None
+        self._writer.stop()
+
+    def add(
+        self,
+        message: str,
+        timestamp: str,
+        grid_id: Optional[str] = None,
+        device_id: Optional[str] = None,
+        severity: str = "warning",
+    ) -> Alert:
+        """Record an occurrence; a returned alert with ``count == 1`` is a new one."""
+        ts = _epoch(timestamp)
+        if severity not in SEVERITIES:
+            severity = "warning"
+        key = (grid_id, device_id, alert_type(message))
+        now = time.monotonic()
+        with self._open_lock:
+            current = self._open.get(key)
+            if current is not None and current[0].status == "active" and now - current[1] <= self._quiet_period:
+                alert = current[0]
+                alert.count += 1
+                alert.last_seen = timestamp
+                self._open[key] = (alert, now)
+                self._coalesced += 1
+                self._writer.put(("touch", alert.id, timestamp, alert.count))
+                return alert
+            if current is not None:
+                self._close(key, current[0])
+            alert = Alert(
+                id=f"alert-{uuid.uuid4().hex[:16]}",
+                message=message,
+                timestamp=timestamp,
+                severity=severity,
+                grid_id=grid_id,
+                device_id=device_id,
+                first_seen=timestamp,
+                last_seen=timestamp,
+            )
+            self._open[key] = (alert, now)
+            self._writer.put(("insert", alert, ts, "|".join(str(part) for part in key)))
         return alert
 
-    def list(self) -> List[Dict]:
-        return [alert.__dict__ for alert in list(self._alerts)]
+    def _close(self, key: Key, alert: Alert) -> None:
+        # Caller holds _open_lock
+        del self._open[key]
+        alert.status = "closed"
+        alert.closed_at = datetime.now(timezone.utc).isoformat()
+        self._writer.put(("close", alert.id, alert.closed_at))
+
+    def _sweep(self) -> None:
+        interval = max(1.0, min(self._quiet_period / 4, 30.0))
+        while not self._stopping.wait(interval):
+            cutoff = time.monotonic() - self._quiet_period
+            with self._open_lock:
+                stale = [(key, alert) for key, (alert, seen) in self._open.items() if seen < cutoff]
+                for key, alert in stale:
+                    self._close(key, alert)
+
+    def _apply(self, batch: List[tuple]) -> None:
+        inserts = []
+        touches: Dict[str, Tuple[str, int]] = {}
+        acks = []
+        closes = []
+        for op in batch:
+            if op[0] == "insert":
+                _, a, ts, key = op
+                inserts.append((
+                    a.id, a.message, a.timestamp, a.severity, a.grid_id, a.device_id, a.status, ts,
+                    key, a.first_seen, a.last_seen, a.count, a.acknowledged_by, a.acknowledged_at,
+                ))
+            elif op[0] == "touch":
+                # Only the newest occurrence per alert in a batch needs writing
+                touches[op[1]] = (op[2], op[3])
+            elif op[0] == "ack":
+                acks.append((op[2], op[3], op[1]))
+            else:
+                closes.append((op[2], op[1]))
+        with self._write_lock:
+            self._writer_conn.execute("BEGIN")
+            try:
+                inserted = self._writer_conn.executemany(
+                    "INSERT OR IGNORE INTO alerts "
+                    "(id, message, timestamp, severity, grid_id, device_id, status, ts, "
+                    "alert_key, first_seen, last_seen, count, acknowledged_by, acknowledged_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    inserts,
+                )
+                self._writer_conn.executemany(
+                    "UPDATE alerts SET last_seen = ?, count = ? WHERE id = ?",
+                    [(last_seen, count, alert_id) for alert_id, (last_seen, count) in touches.items()],
+                )
+                self._writer_conn.executemany(
+                    "UPDATE alerts SET status = 'acknowledged', acknowledged_by = ?, acknowledged_at = ? "
+                    "WHERE id = ? AND status = 'active'",
+                    acks,
+                )
+                self._writer_conn.executemany(
+                    "UPDATE alerts SET status = 'closed', closed_at = ? WHERE id = ?",
+                    closes,
+                )
+            except Exception:
+                self._writer_conn.execute("ROLLBACK")
+                raise
+            self._writer_conn.execute("COMMIT")
+            self._stored += inserted.rowcount
+            self.version += 1
+
+    def list(
+        self,
+        grid_id: Optional[str] = None,
+        status: Optional[str] = None,
+        severity: Optional[str] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Newest-first page of alerts and the cursor for the next page (None on the last page)."""
+        clauses = []
+        params: list = []
+        for column, value in (("grid_id", grid_id), ("status", status), ("severity", severity)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if cursor is not None:
+            ts, alert_id = decode_cursor(cursor)
+            clauses.append("(ts < ? OR (ts = ? AND id < ?))")
+            params.extend([ts, ts, alert_id])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT {_COLUMNS}, ts FROM alerts {where} ORDER BY ts DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+        with self._read_lock:
+            rows = self._reader_conn.execute(sql, params).fetchall()
+        page = rows[:limit]
+        alerts = [Alert(*row[:-1]).__dict__ for row in page]
+        next_cursor = _encode_cursor(page[-1][-1], page[-1][0]) if len(rows) > limit else None
+        return alerts, next_cursor
+
+    def get(self, alert_id: str) -> Optional[Alert]:
+        with self._read_lock:
+            row = self._reader_conn.execute(f"SELECT {_COLUMNS} FROM alerts WHERE id = ?", (alert_id,)).fetchone()
+        return Alert(*row) if row else None
+
+    def acknowledge(self, alert_id: str, operator: Optional[str] = None) -> Optional[Alert]:
+        acknowledged_at = datetime.now(timezone.utc).isoformat()
+        # An open alert may still be queued for insert; acknowledging it also ends its coalescing
+        with self._open_lock:
+            pending = next((alert for alert, _ in self._open.values() if alert.id == alert_id), None)
+            queue_ack = pending is not None and pending.status == "active"
+            if queue_ack:
+                pending.status = "acknowledged"
+                pending.acknowledged_by = operator
+                pending.acknowledged_at = acknowledged_at
+            pending = replace(pending) if pending is not None else None
+        # Primary-key update; acknowledging twice keeps the first operator and time
+        with self._write_lock:
+            updated = self._writer_conn.execute(
+                "UPDATE alerts SET status = 'acknowledged', acknowledged_by = ?, acknowledged_at = ? "
+                "WHERE id = ? AND status = 'active'",
+                (operator, acknowledged_at, alert_id),
+            )
+            if updated.rowcount:
+                self.version += 1
+        if queue_ack and not updated.rowcount:
+            # Not committed yet: the queued insert may already carry it, otherwise this applies right after it
+            self._writer.put(("ack", alert_id, operator, acknowledged_at))
+        return self.get(alert_id) or pending
+
+    def stats(self) -> Dict[str, Any]:
+        with self._open_lock:
+            open_count = len(self._open)
+        return {"stored": self._stored, "open": open_count, "coalesced": self._coalesced, "writer": self._writer.stats()}
 
 
-alerts_store = AlertsStore()
+alerts_store = AlertsStore(settings.alerts_db_path, quiet_period=settings.alerts_quiet_period)
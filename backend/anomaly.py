@@ -0,0 +1,362 @@
+import math
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import settings
+
+# Payload fields tracked per device; readings missing a field leave its statistics untouched
+METRICS = ("live_power_consumption", "live_generation", "battery_soc", "temp_equipment", "solar_irradiance")
+
+GENERATION = "live_generation"
+IRRADIANCE = "solar_irradiance"
+
+# Pseudo-metric name used for the generation/irradiance ratio in stats and firings
+RATIO = "generation_per_irradiance"
+
+# (grid_id, device_id, reading timestamp, raw payload)
+Reading = Tuple[str, str, datetime, Dict[str, Any]]
+
+
+@dataclass
+class Anomaly:
+    grid_id: str
+    device_id: str
+    metric: str
+    value: float
+    baseline: float
+    score: float
+    timestamp: datetime
+
+    @property
+    def message(self) -> str:
+        # The prefix before ':' is the coalescing type, so each metric gets its own open alert
+        if self.metric == RATIO:
+            change = (self.value / self.baseline - 1) * 100 if self.baseline else 0.0
+            return (
+                f"Renewable Performance Anomaly: generation per unit of irradiance {self.value:.4g} "
+                f"is {abs(change):.0f}% {'below' if change < 0 else 'above'} its baseline {self.baseline:.4g}."
+            )
+        return (
+            f"Anomaly ({self.metric}): value {self.value:.4g} is {abs(self.score):.1f} standard deviations "
+            f"{'below' if self.score < 0 else 'above'} its baseline {self.baseline:.4g}."
+        )
+
+    @property
+    def severity(self) -> str:
+        return "warning"
+
+
+class AnomalyDetector:
+    """Per-device streaming statistics over telemetry, scored in vectorized batches.
+
+    Each device owns one row in a set of preallocated NumPy arrays, so the
+    state per device is fixed-size and updating it is O(1) per sample:
+
+    - an exponentially weighted mean and variance per metric (``alpha``);
+    - rolling min/max per metric over ``window`` seconds, kept as ``blocks``
+      ring slots of ``window / blocks`` seconds each, so the window edge is
+      accurate to one slot;
+    - an exponentially weighted baseline of generation per unit of irradiance,
+      updated only while irradiance is at least ``min_irradiance``.
+
+    Once a device has ``warmup`` samples of a metric, a sample more than
+    ``z_threshold`` standard deviations from the mean is an anomaly; the ratio
+    is scored the same way against its own (slower) baseline and must also
+    differ from it by at least ``ratio_min_deviation``. Every sample is scored
+    against the baseline before it is folded in. A metric fires once when it
+    becomes anomalous and re-arms when a sample is back within bounds.
+
+    Rows grow by doubling up to ``max_devices``; beyond that the device seen
+    least recently is evicted and its row reused, so memory is bounded.
+    """
+
+    def __init__(
+        self,
+        metrics: Sequence[str] = METRICS,
+        alpha: float = 0.05,
+        z_threshold: float = 4.0,
+        warmup: int = 30,
+        window: float = 3600.0,
+        blocks: int = 12,
+        ratio_alpha: float = 0.01,
+        ratio_min_deviation: float = 0.25,
+        min_irradiance: float = 50.0,
+        max_devices: int = 10000,
+    ) -> None:
+        self.metrics = tuple(metrics)
+        self._columns = {name: i for i, name in enumerate(self.metrics)}
+        self._ratio_columns = (self._columns.get(GENERATION), self._columns.get(IRRADIANCE))
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.blocks = max(1, blocks)
+        self.block_seconds = window / self.blocks
+        self.ratio_alpha = ratio_alpha
+        self.ratio_min_deviation = ratio_min_deviation
+        self.min_irradiance = min_irradiance
+        self.max_devices = max(1, max_devices)
+        self._lock = threading.Lock()
+        self._rows: Dict[Tuple[str, str], int] = {}
+        self._keys: List[Optional[Tuple[str, str]]] = []
+        self._tick = 0
+        self.observed = 0
+        self.fired = 0
+        self.evicted = 0
+        self._allocate(min(256, self.max_devices))
+
+    def _allocate(self, capacity: int) -> None:
+        """Create or grow the state arrays to ``capacity`` rows; new rows start empty."""
+        m, b = len(self.metrics), self.blocks
+        old = getattr(self, "_mean", None)
+        size = 0 if old is None else len(old)
+        fresh = {
+            "_mean": np.zeros((capacity, m)),
+            "_var": np.zeros((capacity, m)),
+            "_count": np.zeros((capacity, m), dtype=np.int32),
+            "_active": np.zeros((capacity, m), dtype=bool),
+            "_block_id": np.full((capacity, b), -1, dtype=np.int64),
+            "_block_min": np.full((capacity, b, m), np.nan, dtype=np.float32),
+            "_block_max": np.full((capacity, b, m), np.nan, dtype=np.float32),
+            "_ratio_mean": np.zeros(capacity),
+            "_ratio_var": np.zeros(capacity),
+            "_ratio_count": np.zeros(capacity, dtype=np.int32),
+            "_ratio_active": np.zeros(capacity, dtype=bool),
+            "_last_used": np.zeros(capacity, dtype=np.int64),
+        }
+        for name, array in fresh.items():
+            if size:
+                array[:size] = getattr(self, name)
+            setattr(self, name, array)
+        self._keys.extend([None] * (capacity - size))
+
+    def _reset(self, row: int) -> None:
+        for name in ("_mean", "_var", "_count", "_active", "_ratio_mean", "_ratio_var", "_ratio_count", "_ratio_active"):
+            getattr(self, name)[row] = 0
+        self._block_id[row] = -1
+        self._block_min[row] = np.nan
+        self._block_max[row] = np.nan
+
+    def _row(self, key: Tuple[str, str]) -> int:
+        row = self._rows.get(key)
+        if row is None:
+            if len(self._rows) < len(self._keys):
+                row = len(self._rows)
+            elif len(self._keys) < self.max_devices:
+                row = len(self._keys)
+                self._allocate(min(len(self._keys) * 2, self.max_devices))
+            else:
+                row = int(np.argmin(self._last_used))
+                if self._last_used[row] == self._tick:
+                    # Every row is in use by this batch; leave the reading unscored
+                    return -1
+                del self._rows[self._keys[row]]
+                self._reset(row)
+                self.evicted += 1
+            self._rows[key] = row
+            self._keys[row] = key
+        self._last_used[row] = self._tick
+        return row
+
+    def observe(self, readings: Sequence[Reading]) -> List[Anomaly]:
+        """Fold a batch of readings into the statistics and return the anomalies they raise.
+
+        Readings of one device must arrive in order; within a batch they are
+        applied in order too.
+        """
+        if not readings:
+            return []
+        nan = math.nan
+        values = np.array(
+            [[_number(payload.get(name), nan) for name in self.metrics] for _, _, _, payload in readings],
+            dtype=np.float64,
+        ).reshape(len(readings), len(self.metrics))
+        times = np.array([timestamp.timestamp() for _, _, timestamp, _ in readings])
+        firings: List[Anomaly] = []
+        with self._lock:
+            self._tick += 1
+            rows = np.array([self._row((grid_id, device_id)) for grid_id, device_id, _, _ in readings], dtype=np.int64)
+            keep = np.flatnonzero(rows >= 0)
+            # Each pass takes at most one reading per device, so rows are unique within a pass
+            # and the fancy-indexed updates below cannot collide
+            for batch_index in _passes(rows[keep]):
+                batch_index = keep[batch_index]
+                firings.extend(self._apply(rows[batch_index], times[batch_index], values[batch_index], batch_index, readings))
+            self.observed += len(keep)
+            self.fired += len(firings)
+        return firings
+
+    def _apply(
+        self, rows: np.ndarray, times: np.ndarray, x: np.ndarray, batch_index: np.ndarray, readings: Sequence[Reading]
+    ) -> List[Anomaly]:
+        present = ~np.isnan(x)
+        mean, var, count = self._mean[rows], self._var[rows], self._count[rows]
+
+        # Score against the baseline before this sample moves it
+        std = np.sqrt(var)
+        floor = 0.01 * np.abs(mean) + 1e-3
+        z = (x - mean) / np.maximum(std, floor)
+        anomalous = present & (count >= self.warmup) & (np.abs(z) > self.z_threshold)
+        active = self._active[rows]
+        fire = anomalous & ~active
+        self._active[rows] = np.where(present, anomalous, active)
+
+        # West's incremental EWMA update; the first sample seeds the mean. An anomalous sample
+        # is folded in clamped to the threshold, so a single spike cannot inflate the variance
+        # enough to hide the next one, while a lasting level shift is still followed.
+        limit = self.z_threshold * np.maximum(std, floor)
+        diff = np.where(present, np.where(anomalous, np.clip(x - mean, -limit, limit), x - mean), 0.0)
+        increment = self.alpha * diff
+        first = present & (count == 0)
+        self._mean[rows] = np.where(first, x, mean + increment)
+        self._var[rows] = np.where(first, 0.0, (1 - self.alpha) * (var + diff * increment))
+        self._count[rows] = count + present
+
+        self._update_extremes(rows, times, x)
+        ratio_firings = self._update_ratio(rows, x, batch_index, readings)
+
+        out: List[Anomaly] = []
+        for i, column in zip(*np.nonzero(fire)):
+            grid_id, device_id, timestamp, _ = readings[batch_index[i]]
+            out.append(Anomaly(
+                grid_id, device_id, self.metrics[column], float(x[i, column]), float(mean[i, column]),
+                float(z[i, column]), timestamp,
+            ))
+        return out + ratio_firings
+
+    def _update_extremes(self, rows: np.ndarray, times: np.ndarray, x: np.ndarray) -> None:
+        block = np.floor(times / self.block_seconds).astype(np.int64)
+        slot = block % self.blocks
+        # A slot still holding an older block is restarted before the sample lands in it
+        stale = self._block_id[rows, slot] < block
+        if stale.any():
+            self._block_id[rows[stale], slot[stale]] = block[stale]
+            self._block_min[rows[stale], slot[stale]] = np.nan
+            self._block_max[rows[stale], slot[stale]] = np.nan
+        # Samples older than the slot's block leave it alone rather than reopen a past block
+        current = self._block_id[rows, slot] == block
+        r, s, v = rows[current], slot[current], x[current].astype(np.float32)
+        self._block_min[r, s] = np.fmin(self._block_min[r, s], v)
+        self._block_max[r, s] = np.fmax(self._block_max[r, s], v)
+
+    def _update_ratio(
+        self, rows: np.ndarray, x: np.ndarray, batch_index: np.ndarray, readings: Sequence[Reading]
+    ) -> List[Anomaly]:
+        generation_column, irradiance_column = self._ratio_columns
+        if generation_column is None or irradiance_column is None:
+            return []
+        generation, irradiance = x[:, generation_column], x[:, irradiance_column]
+        usable = ~np.isnan(generation) & (irradiance >= self.min_irradiance)
+        if not usable.any():
+            return []
+        rows, generation, irradiance, index = rows[usable], generation[usable], irradiance[usable], batch_index[usable]
+        ratio = generation / irradiance
+        mean, var, count = self._ratio_mean[rows], self._ratio_var[rows], self._ratio_count[rows]
+
+        z = (ratio - mean) / np.maximum(np.sqrt(var), 0.01 * np.abs(mean) + 1e-9)
+        deviation = np.abs(ratio - mean) / np.maximum(np.abs(mean), 1e-9)
+        anomalous = (count >= self.warmup) & (np.abs(z) > self.z_threshold) & (deviation >= self.ratio_min_deviation)
+        fire = anomalous & ~self._ratio_active[rows]
+        self._ratio_active[rows] = anomalous
+
+        limit = self.z_threshold * np.maximum(np.sqrt(var), 0.01 * np.abs(mean) + 1e-9)
+        diff = np.where(anomalous, np.clip(ratio - mean, -limit, limit), ratio - mean)
+        increment = self.ratio_alpha * diff
+        first = count == 0
+        self._ratio_mean[rows] = np.where(first, ratio, mean + increment)
+        self._ratio_var[rows] = np.where(first, 0.0, (1 - self.ratio_alpha) * (var + diff * increment))
+        self._ratio_count[rows] = count + 1
+
+        out: List[Anomaly] = []
+        for i in np.flatnonzero(fire):
+            grid_id, device_id, timestamp, _ = readings[index[i]]
+            out.append(Anomaly(grid_id, device_id, RATIO, float(ratio[i]), float(mean[i]), float(z[i]), timestamp))
+        return out
+
+    def snapshot(self, grid_id: str, device_id: str, now: float) -> Optional[Dict[str, Any]]:
+        """Current statistics of one device, or None if it is not tracked.
+
+        ``now`` (epoch seconds) bounds the rolling window for min/max.
+        """
+        with self._lock:
+            row = self._rows.get((grid_id, device_id))
+            if row is None:
+                return None
+            newest = math.floor(now / self.block_seconds)
+            live = (self._block_id[row] > newest - self.blocks)[:, None]
+            lows = np.where(live & ~np.isnan(self._block_min[row]), self._block_min[row], np.inf).min(axis=0)
+            highs = np.where(live & ~np.isnan(self._block_max[row]), self._block_max[row], -np.inf).max(axis=0)
+            metrics = {}
+            for column, name in enumerate(self.metrics):
+                if not self._count[row, column]:
+                    continue
+                metrics[name] = {
+                    "mean": float(self._mean[row, column]),
+                    "std": math.sqrt(float(self._var[row, column])),
+                    "min": _finite(lows[column]),
+                    "max": _finite(highs[column]),
+                    "samples": int(self._count[row, column]),
+                    "anomalous": bool(self._active[row, column]),
+                }
+            if self._ratio_count[row]:
+                metrics[RATIO] = {
+                    "mean": float(self._ratio_mean[row]),
+                    "std": math.sqrt(float(self._ratio_var[row])),
+                    "samples": int(self._ratio_count[row]),
+                    "anomalous": bool(self._ratio_active[row]),
+                }
+            return {"grid_id": grid_id, "device_id": device_id, "window_seconds": self.block_seconds * self.blocks, "metrics": metrics}
+
+    def stats(self) -> Dict[str, Any]:
+        arrays = (
+            self._mean, self._var, self._count, self._active, self._block_id, self._block_min, self._block_max,
+            self._ratio_mean, self._ratio_var, self._ratio_count, self._ratio_active, self._last_used,
+        )
+        return {
+            "devices": len(self._rows),
+            "capacity": len(self._keys),
+            "max_devices": self.max_devices,
+            "state_bytes": sum(a.nbytes for a in arrays),
+            "observed": self.observed,
+            "fired": self.fired,
+            "evicted": self.evicted,
+        }
+
+
+def _number(value: Any, default: float) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return default
+    return float(value)
+
+
+def _finite(value: float) -> Optional[float]:
+    # None when no sample of the metric is inside the window; extremes are stored as float32
+    return round(float(value), 4) if math.isfinite(value) else None
+
+
+def _passes(rows: np.ndarray) -> List[np.ndarray]:
+    """Split batch positions into passes with unique rows, keeping each row's readings in order."""
+    if len(rows) == 0:
+        return []
+    order = np.argsort(rows, kind="stable")
+    sorted_rows = rows[order]
+    starts = np.r_[0, np.flatnonzero(sorted_rows[1:] != sorted_rows[:-1]) + 1]
+    # Rank of each reading among its device's readings in this batch
+    rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+    if rank.max() == 0:
+        return [np.arange(len(rows))]
+    return [np.sort(order[rank == r]) for r in range(int(rank.max()) + 1)]
+
+
+anomaly_detector = AnomalyDetector(
+    alpha=settings.anomaly_alpha,
+    z_threshold=settings.anomaly_z_threshold,
+    warmup=settings.anomaly_warmup_samples,
+    window=settings.anomaly_window_seconds,
+    ratio_min_deviation=settings.anomaly_ratio_min_deviation,
+    min_irradiance=settings.anomaly_min_irradiance,
+    max_devices=settings.anomaly_max_devices,
+)
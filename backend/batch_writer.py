@@ -0,0 +1,146 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+POLICIES = ("block", "drop_newest", "drop_oldest")
+
+_STOP = object()
+
+
+class BatchWriter:
+    """Buffers items in a bounded queue and flushes them from a background thread.
+
+    A batch is flushed when it reaches ``batch_size`` items or when
+    ``flush_interval`` seconds have passed since the last flush, whichever
+    comes first. When the queue is full, ``policy`` decides what happens:
+    ``block`` waits up to ``block_timeout`` seconds for room, ``drop_newest``
+    discards the incoming item and ``drop_oldest`` evicts the oldest queued one.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List[Any]], None],
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_queue: int = 20000,
+        policy: str = "drop_oldest",
+        block_timeout: float = 0.5,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Invalid queue policy {policy!r}. Must be one of: {list(POLICIES)}")
+        self._flush = flush
+        self._batch_size = max(1, batch_size)
+        self._flush_interval = flush_interval
+        self._policy = policy
+        self._block_timeout = block_timeout
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._dropped = 0
+        self._written = 0
+        self._failed = 0
+        self._batches = 0
+
+    def put(self, item: Any) -> bool:
+        """Enqueue an item. Returns False if it (or an older item) was dropped."""
+        if self._policy == "block":
+            try:
+                self._queue.put(item, timeout=self._block_timeout)
+                return True
+            except queue.Full:
+                self._count_dropped(1)
+                return False
+        if self._policy == "drop_newest":
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                self._count_dropped(1)
+                return False
+        # drop_oldest: make room by evicting from the head of the queue
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self._count_dropped(1)
+                except queue.Empty:
+                    pass
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="influx-batch-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Flush whatever is queued and stop the background thread."""
+        if self._thread is None:
+            return
+        # The sentinel must get in even when the queue is full
+        while True:
+            try:
+                self._queue.put(_STOP, timeout=0.1)
+                break
+            except queue.Full:
+                if not self._thread.is_alive():
+                    break
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "capacity": self._queue.maxsize,
+                "policy": self._policy,
+                "written": self._written,
+                "failed": self._failed,
+                "dropped": self._dropped,
+                "batches": self._batches,
+            }
+
+    def _count_dropped(self, n: int) -> None:
+        with self._lock:
+            self._dropped += n
+
+    def _run(self) -> None:
+        batch: List[Any] = []
+        deadline = time.monotonic() + self._flush_interval
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+                # Drain what is already queued without waking up per item
+                while not stopping and len(batch) < self._batch_size:
+                    item = self._queue.get_nowait()
+                    if item is _STOP:
+                        stopping = True
+                    else:
+                        batch.append(item)
+            except queue.Empty:
+                pass
+            if batch and (stopping or len(batch) >= self._batch_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self._flush_interval
+
+    def _write(self, batch: List[Any]) -> None:
+        try:
+            self._flush(batch)
+        except Exception:
+            with self._lock:
+                self._failed += len(batch)
+            return
+        with self._lock:
+            self._written += len(batch)
+            self._batches += 1
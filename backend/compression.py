@@ -0,0 +1,55 @@
+import gzip
+import io
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Sent as is: each event has to reach the client the moment it is written
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+
+class _SyncFlushGzipFile(gzip.GzipFile):
+    """Flushes the compressor after every write, so each chunk written is decodable on arrival."""
+
+    def write(self, data) -> int:
+        written = super().write(data)
+        self.flush()
+        return written
+
+
+class _StreamingGZipResponder(GZipResponder):
+    def __init__(self, app: ASGIApp, minimum_size: int, compresslevel: int = 9) -> None:
+        super().__init__(app, minimum_size, compresslevel=compresslevel)
+        # A fresh buffer: the file replaced here has already written its header to the old one
+        self.gzip_buffer = io.BytesIO()
+        self.gzip_file = _SyncFlushGzipFile(mode="wb", fileobj=self.gzip_buffer, compresslevel=compresslevel)
+
+    async def send_with_gzip(self, message: Message) -> None:
+        await super().send_with_gzip(message)
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            if content_type.startswith(UNCOMPRESSED_TYPES):
+                # Passed through untouched, the way a body that is already encoded is
+                self.content_encoding_set = True
+
+
+class StreamingGZipMiddleware:
+    """Starlette's gzip middleware, made safe for streamed responses.
+
+    Event streams are never compressed, and every chunk of any other streamed
+    body is sync-flushed, so clients get it as it is produced rather than
+    once the compressor's window fills up or the response ends.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 500, compresslevel: int = 9) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = _StreamingGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
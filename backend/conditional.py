@@ -0,0 +1,42 @@
+import hashlib
+import os
+from typing import Any, Optional
+
+from fastapi.responses import Response
+
+# Changes on every start, so validators handed out before a restart (when the
+# counters they were built from start again at zero) never match afterwards.
+BOOT_ID = os.urandom(4).hex()
+
+
+def etag(*parts: Any) -> str:
+    """Weak ETag over the version counters and query parameters a response depends on.
+
+    Weak because bodies built from the same versions can still differ in
+    cosmetic fields such as ``age_seconds``.
+    """
+    digest = hashlib.blake2b("|".join(map(str, (BOOT_ID, *parts))).encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def matches(if_none_match: Optional[str], tag: str) -> bool:
+    """Weak comparison of ``tag`` against an If-None-Match header value."""
+    if not if_none_match:
+        return False
+    opaque = tag[2:]
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+def not_modified(tag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": tag, "Cache-Control": "no-cache"})
+
+
+def validated(response: Response, tag: str) -> Response:
+    # no-cache: clients may store the body but must revalidate before reuse
+    response.headers["ETag"] = tag
+    response.headers["Cache-Control"] = "no-cache"
+    return response
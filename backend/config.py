@@ -16,6 +16,96 @@ class Settings:
     mqtt_host: str = os.getenv("MQTT_BROKER_HOST", "localhost")
     mqtt_port: int = int(os.getenv("MQTT_BROKER_PORT", "1883"))
 
+    # MQTT ingest: messages are partitioned by grid across this many worker threads
+    ingest_workers: int = int(os.getenv("INGEST_WORKERS", "4"))
+    ingest_queue_size: int = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+    # A device whose latest reading is this far behind its grid's newest one is left out of grid KPIs
+    device_offline_seconds: float = float(os.getenv("DEVICE_OFFLINE_SECONDS", "300"))
+
+    # Influx queries: per-query timeout (including the wait for a slot) and concurrency cap
+    influx_query_timeout: float = float(os.getenv("INFLUX_QUERY_TIMEOUT_SECONDS", "10"))
+    influx_max_concurrent_queries: int = int(os.getenv("INFLUX_MAX_CONCURRENT_QUERIES", "32"))
+
+    # Batched Influx writes from the MQTT ingest path
+    influx_batch_size: int = int(os.getenv("INFLUX_BATCH_SIZE", "500"))
+    influx_flush_interval: float = float(os.getenv("INFLUX_FLUSH_INTERVAL_SECONDS", "1.0"))
+    influx_queue_size: int = int(os.getenv("INFLUX_QUEUE_SIZE", "20000"))
+    influx_queue_policy: str = os.getenv("INFLUX_QUEUE_POLICY", "drop_oldest")
+    influx_write_timeout: float = float(os.getenv("INFLUX_WRITE_TIMEOUT_SECONDS", "10"))
+
+    # Batches Influx rejects or times out on are spooled to disk and replayed once it recovers;
+    # an empty directory disables the spool. A segment file is sealed at SPOOL_SEGMENT_MB or
+    # SPOOL_SEGMENT_MAX_AGE_SECONDS. Replay runs in batches of N lines at a capped rate.
+    spool_dir: str = os.getenv("SPOOL_DIR", "spool")
+    spool_max_mb: int = int(os.getenv("SPOOL_MAX_MB", "1024"))
+    spool_segment_mb: int = int(os.getenv("SPOOL_SEGMENT_MB", "16"))
+    spool_segment_max_age: float = float(os.getenv("SPOOL_SEGMENT_MAX_AGE_SECONDS", "300"))
+    spool_replay_batch: int = int(os.getenv("SPOOL_REPLAY_BATCH", "5000"))
+    spool_replay_rate: float = float(os.getenv("SPOOL_REPLAY_LINES_PER_SECOND", "20000"))
+    spool_retry_interval: float = float(os.getenv("SPOOL_RETRY_INTERVAL_SECONDS", "5"))
+
+    # Responses at least this large are gzip-compressed for clients that accept it
+    compress_min_bytes: int = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+    compress_level: int = int(os.getenv("COMPRESS_LEVEL", "6"))
+
+    # Default point budget for /api/dashboard/historical responses
+    historical_max_points: int = int(os.getenv("HISTORICAL_MAX_POINTS", "1000"))
+
+    # Historical series cache: memory cap and how long a series is served without a tail refresh
+    historical_cache_mb: int = int(os.getenv("HISTORICAL_CACHE_MB", "64"))
+    historical_cache_min_refresh: float = float(os.getenv("HISTORICAL_CACHE_MIN_REFRESH_SECONDS", "1.0"))
+
+    # Ingest rolls readings up into 1m/5m/1h min/mean/max buckets that serve long historical ranges.
+    # A bucket is written once readings this many seconds past its end have arrived. The time
+    # rollups reach back to is kept in ROLLUP_STATE_PATH; older ranges are read from raw data.
+    rollups_enabled: bool = os.getenv("ROLLUPS_ENABLED", "1") == "1"
+    rollup_grace: float = float(os.getenv("ROLLUP_GRACE_SECONDS", "10"))
+    rollup_state_path: str = os.getenv("ROLLUP_STATE_PATH", "rollup_state.json")
+
+    # Bulk exports (/api/export) read the range in chunks of this many seconds, with at most
+    # EXPORT_CONCURRENCY chunks in flight per export. Exports share the Influx query slots but hold
+    # at most EXPORT_MAX_CONCURRENT_QUERIES of them, and dashboard queries waiting for a slot go first.
+    export_chunk_seconds: int = int(os.getenv("EXPORT_CHUNK_SECONDS", "3600"))
+    export_concurrency: int = int(os.getenv("EXPORT_CONCURRENCY", "2"))
+    export_max_concurrent_queries: int = int(os.getenv("EXPORT_MAX_CONCURRENT_QUERIES", "4"))
+    export_query_timeout: float = float(os.getenv("EXPORT_QUERY_TIMEOUT_SECONDS", "120"))
+    export_max_grids: int = int(os.getenv("EXPORT_MAX_GRIDS", "100"))
+
+    # Alerts store (SQLite, WAL mode); inserts are committed in batches
+    alerts_db_path: str = os.getenv("ALERTS_DB_PATH", "alerts.db")
+    alerts_batch_size: int = int(os.getenv("ALERTS_BATCH_SIZE", "200"))
+    alerts_flush_interval: float = float(os.getenv("ALERTS_FLUSH_INTERVAL_SECONDS", "0.2"))
+    alerts_queue_size: int = int(os.getenv("ALERTS_QUEUE_SIZE", "10000"))
+    # Repeats of the same (grid, device, alert type) coalesce into one open alert until quiet this long
+    alerts_quiet_period: float = float(os.getenv("ALERTS_QUIET_PERIOD_SECONDS", "300"))
+
+    # Server-side alert rules evaluated on every telemetry reading; empty path disables them.
+    # The file is re-read when it changes, checked at most this often. Rule state is kept for at
+    # most RULES_MAX_DEVICES devices (least recently seen evicted).
+    rules_path: str = os.getenv("RULES_PATH", os.path.join(os.path.dirname(__file__), "rules.json"))
+    rules_reload_interval: float = float(os.getenv("RULES_RELOAD_INTERVAL_SECONDS", "5"))
+    rules_max_devices: int = int(os.getenv("RULES_MAX_DEVICES", "10000"))
+
+    # Streaming anomaly detection on ingested telemetry: per-device EWMA baselines (and a
+    # generation/irradiance ratio baseline) scored by z-score once warmed up. State is a fixed-size
+    # array row per device, for at most ANOMALY_MAX_DEVICES devices (least recently seen evicted).
+    anomaly_enabled: bool = os.getenv("ANOMALY_ENABLED", "1") == "1"
+    anomaly_max_devices: int = int(os.getenv("ANOMALY_MAX_DEVICES", "10000"))
+    anomaly_alpha: float = float(os.getenv("ANOMALY_ALPHA", "0.05"))
+    anomaly_z_threshold: float = float(os.getenv("ANOMALY_Z_THRESHOLD", "4"))
+    anomaly_warmup_samples: int = int(os.getenv("ANOMALY_WARMUP_SAMPLES", "30"))
+    anomaly_window_seconds: float = float(os.getenv("ANOMALY_WINDOW_SECONDS", "3600"))
+    anomaly_ratio_min_deviation: float = float(os.getenv("ANOMALY_RATIO_MIN_DEVIATION", "0.25"))
+    anomaly_min_irradiance: float = float(os.getenv("ANOMALY_MIN_IRRADIANCE", "50"))
+
+    # Push channel (SSE / WebSocket): heartbeat interval, undelivered alerts kept per connection
+    push_heartbeat_seconds: float = float(os.getenv("PUSH_HEARTBEAT_SECONDS", "15"))
+    push_buffer_size: int = int(os.getenv("PUSH_BUFFER_SIZE", "100"))
+    push_max_grids: int = int(os.getenv("PUSH_MAX_GRIDS", "50"))
+
+    # Grid that untagged readings on the flat MQTT topics belong to
+    default_grid_id: str = os.getenv("DEFAULT_GRID_ID", "grid-001")
+
     api_token: str = os.getenv("API_TOKEN", "prototype_token")
 
 
@@ -1,68 +1,645 @@
-from typing import Optional
+import asyncio
+import time as clock
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
 from influxdb_client import InfluxDBClient, Point
+from influxdb_client.client.flux_table import TableList
+from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
 from influxdb_client.client.write_api import SYNCHRONOUS
+from influxdb_client.rest import ApiException
 
+from .batch_writer import BatchWriter
 from .config import settings
+from .downsample import AGGREGATES, LTTB_OVERSAMPLE, PERIOD_SECONDS, lttb, window_seconds
+from .historical_cache import HistoricalCache
+from .metrics import influx_query_seconds, influx_write_batch, influx_write_seconds
+from .rollups import (
+    GRID_AGGREGATION,
+    METRICS,
+    ROLLUP_MEASUREMENT,
+    TIERS,
+    RollupAggregator,
+    RollupCoverage,
+    Tier,
+    plan_tier,
+    tier_window,
+)
+from .singleflight import AsyncSingleFlight, SingleFlight
+from .slots import QuerySlots
+from .spool import RejectedError, Spool
 
 
+# Writes happen on the batch writer thread through the sync client; queries
+# run on the event loop through the async client and its pooled aiohttp session.
 _client: Optional[InfluxDBClient] = None
 _write_api = None
+_async_client: Optional[InfluxDBClientAsync] = None
+_query_slots: Optional[QuerySlots] = None
 
 
 def get_client() -> InfluxDBClient:
     global _client, _write_api
     if _client is None:
-        _client = InfluxDBClient(url=settings.influx_url, token=settings.influx_token, org=settings.influx_org)
+        _client = InfluxDBClient(
+            url=settings.influx_url,
+            token=settings.influx_token,
+            org=settings.influx_org,
+            timeout=int(settings.influx_write_timeout * 1000),
+        )
         _write_api = _client.write_api(write_options=SYNCHRONOUS)
     return _client
 
 
-def write_measurement(payload: dict) -> None:
+async def open_query_client() -> None:
+    """Create the shared async query client; must run on the app's event loop."""
+    global _async_client, _query_slots
+    if _async_client is None:
+        _async_client = InfluxDBClientAsync(
+            url=settings.influx_url,
+            token=settings.influx_token,
+            org=settings.influx_org,
+            timeout=int(settings.influx_query_timeout * 1000),
+            connection_pool_maxsize=settings.influx_max_concurrent_queries,
+        )
+        # Exports read in the background; dashboard queries waiting for a slot are served first
+        _query_slots = QuerySlots(settings.influx_max_concurrent_queries, settings.export_max_concurrent_queries)
+
+
+async def close_query_client() -> None:
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+
+def _query_api():
+    if _async_client is None:
+        raise RuntimeError("Influx query client is not open")
+    return _async_client.query_api()
+
+
+async def _run_query(q: str) -> TableList:
+    async with _query_slots.slot():
+        return await _query_api().query(q, org=settings.influx_org)
+
+
+# Identical Flux text already in flight is not sent again; concurrent callers share the one result
+_query_flights = AsyncSingleFlight()
+_sync_query_flights = SingleFlight()
+
+
+async def _query(q: str) -> TableList:
+    return await _query_flights.do(q, lambda: _timed_query(q))
+
+
+async def _timed_query(q: str) -> TableList:
+    # The timeout covers waiting for a free slot as well as the query itself
+    started = clock.perf_counter()
+    outcome = "error"
+    try:
+        tables = await asyncio.wait_for(_run_query(q), settings.influx_query_timeout)
+        outcome = "ok"
+        return tables
+    finally:
+        influx_query_seconds.labels(outcome).observe(clock.perf_counter() - started)
+
+
+def query_sync(q: str) -> TableList:
+    """Blocking query for threaded callers, coalesced with identical concurrent ones like the async path."""
+    return _sync_query_flights.do(q, lambda: get_client().query_api().query(q, org=settings.influx_org))
+
+
+def query_stats() -> dict:
+    stats = {"async": _query_flights.stats(), "threaded": _sync_query_flights.stats()}
+    if _query_slots is not None:
+        stats["slots"] = _query_slots.stats()
+    return stats
+
+
+def payload_time(payload: dict) -> datetime:
+    # Points are written after a batching delay, so stamp them with the
+    # reading's own time rather than letting Influx use its arrival time.
+    timestamp = payload.get("timestamp")
+    if isinstance(timestamp, str):
+        try:
+            parsed = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        except ValueError:
+            parsed = None
+        if parsed is not None:
+            return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc)
+
+
+def measurement_fields(payload: dict) -> dict:
+    return {
+        "consumption_kW": float(payload.get("live_power_consumption", 0)),
+        "generation_kW": float(payload.get("live_generation", 0)),
+        "battery_soc": int(payload.get("battery_soc", 0)),
+    }
+
+
+def build_point(fields: dict, time: datetime, grid_id: str, device_id: str) -> Point:
+    point = Point("microgrid").tag("grid_id", grid_id).tag("device_id", device_id).time(time)
+    for name, value in fields.items():
+        point.field(name, value)
+    return point
+
+
+def write_lines(lines: List[str]) -> None:
     get_client()
-    point = (
-        Point("microgrid")
-        .field("consumption_kW", float(payload.get("live_power_consumption", 0)))
-        .field("generation_kW", float(payload.get("live_generation", 0)))
-        .field("battery_soc", int(payload.get("battery_soc", 0)))
-    )
-    _write_api.write(bucket=settings.influx_bucket, record=point)
+    influx_write_batch.observe(len(lines))
+    started = clock.perf_counter()
+    outcome = "error"
+    try:
+        _write_api.write(bucket=settings.influx_bucket, record=lines)
+        outcome = "ok"
+    except ApiException as e:
+        # Bad points (field type conflicts, malformed lines) fail the same way on every retry
+        if e.status in (400, 422):
+            outcome = "rejected"
+            raise RejectedError(str(e.reason)) from e
+        raise
+    finally:
+        influx_write_seconds.labels(outcome).observe(clock.perf_counter() - started)
+
+
+spool = Spool(
+    settings.spool_dir,
+    send=write_lines,
+    max_bytes=settings.spool_max_mb * 1024 * 1024,
+    segment_bytes=settings.spool_segment_mb * 1024 * 1024,
+    segment_age=settings.spool_segment_max_age,
+    replay_batch=settings.spool_replay_batch,
+    replay_rate=settings.spool_replay_rate,
+    retry_interval=settings.spool_retry_interval,
+)
+
+
+def write_points(points: List[Point]) -> None:
+    # Serialised up front (nanosecond timestamps) so a failed batch can be spooled as is
+    spool.write([line for line in (point.to_line_protocol() for point in points) if line])
+
+
+batch_writer = BatchWriter(
+    flush=write_points,
+    batch_size=settings.influx_batch_size,
+    flush_interval=settings.influx_flush_interval,
+    max_queue=settings.influx_queue_size,
+    policy=settings.influx_queue_policy,
+)
 
 
-def query_latest() -> Optional[dict]:
-    client = get_client()
-    query_api = client.query_api()
+def _write_rollup(tier: Tier, grid_id: str, start: datetime, values: dict) -> None:
+    point = Point(ROLLUP_MEASUREMENT).tag("grid_id", grid_id).tag("tier", tier.name).time(start)
+    for metric, (low, mean, high) in values.items():
+        point.field(f"{metric}_min", float(low))
+        point.field(f"{metric}_mean", float(mean))
+        point.field(f"{metric}_max", float(high))
+    batch_writer.put(point)
+
+
+rollup_aggregator = RollupAggregator(emit=_write_rollup, grace=settings.rollup_grace)
+rollup_coverage = RollupCoverage(settings.rollup_state_path)
+
+
+def write_measurement(fields: dict, time: datetime, grid_id: str, device_id: str) -> bool:
+    if settings.rollups_enabled:
+        rollup_aggregator.add(grid_id, device_id, fields, time)
+    return batch_writer.put(build_point(fields, time, grid_id, device_id))
+
+
+def _grid_filter(grid_id: str) -> str:
+    # grid_id is a tag, so this predicate is pushed down to the series index
+    return f'  |> filter(fn: (r) => r.grid_id == "{grid_id}")\n'
+
+
+async def query_latest(grid_id: str) -> Dict[str, Tuple[dict, datetime]]:
+    """Latest values and their time per device of the grid, for devices that reported every metric in the last day."""
     q = f"""
 from(bucket: "{settings.influx_bucket}")
   |> range(start: -24h)
   |> filter(fn: (r) => r._measurement == "microgrid")
+{_grid_filter(grid_id)}  |> filter(fn: (r) => r._field == "consumption_kW" or r._field == "generation_kW" or r._field == "battery_soc")
   |> last()
 """
-    tables = query_api.query(q, org=settings.influx_org)
-    result = {"consumption_kW": None, "generation_kW": None, "battery_soc": None}
+    tables = await _query(q)
+    # One table per device and field; the grid's values are combined from these by the latest store
+    devices: Dict[str, Tuple[dict, datetime]] = {}
     for table in tables:
         for record in table.records:
-            if record.get_field() in result:
-                result[record.get_field()] = record.get_value()
-    if any(v is None for v in result.values()):
+            device_id = record.values.get("device_id")
+            if record.get_field() not in METRICS or device_id is None:
+                continue
+            values, time = devices.get(device_id, ({}, record.get_time()))
+            values[record.get_field()] = record.get_value()
+            devices[device_id] = (values, max(time, record.get_time()))
+    return {device_id: entry for device_id, entry in devices.items() if len(entry[0]) == len(METRICS)}
+
+
+historical_cache = HistoricalCache(
+    max_bytes=settings.historical_cache_mb * 1024 * 1024,
+    min_refresh=settings.historical_cache_min_refresh,
+)
+
+
+def _flux_time(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _series_query(
+    grid_id: str,
+    metric: str,
+    period: str,
+    every: int,
+    fn: str,
+    start: Optional[datetime] = None,
+    stop: Optional[datetime] = None,
+    tier: Optional[Tier] = None,
+) -> str:
+    field = _series_field(metric, fn, tier)
+    return f"""
+{_series_source(grid_id, period, start, stop, tier)}  |> filter(fn: (r) => r._field == "{field}")
+{_grid_windows(every, fn, GRID_AGGREGATION[metric], tier)}  |> keep(columns: ["_time", "_value"])
+"""
+
+
+def _grid_windows(every: int, fn: str, combine: str, tier: Optional[Tier]) -> str:
+    """Windows of a grid-level series: each device's ``fn`` per window, combined across devices.
+
+    Rollup buckets are already grid-level, so a tier only needs its buckets re-aggregated.
+    """
+    group = '  |> group(columns: ["_measurement", "_field"])\n'
+    if tier is not None:
+        return group + _window(every, fn)
+    return _window(every, fn) + group + _window(every, combine)
+
+
+def _window(every: int, fn: str) -> str:
+    return f'  |> aggregateWindow(every: {every}s, fn: {fn}, createEmpty: false, timeSrc: "_start")\n'
+
+
+def _series_source(
+    grid_id: str, period: str, start: Optional[datetime], stop: Optional[datetime], tier: Optional[Tier]
+) -> str:
+    range_start = f'time(v: "{_flux_time(start)}")' if start is not None else f"-{period}"
+    range_stop = f', stop: time(v: "{_flux_time(stop)}")' if stop is not None else ""
+    if tier is None:
+        source = f'  |> filter(fn: (r) => r._measurement == "microgrid")\n{_grid_filter(grid_id)}'
+    else:
+        source = (
+            f'  |> filter(fn: (r) => r._measurement == "{ROLLUP_MEASUREMENT}" and r.tier == "{tier.name}")\n'
+            f"{_grid_filter(grid_id)}"
+        )
+    return f"""from(bucket: "{settings.influx_bucket}")
+  |> range(start: {range_start}{range_stop})
+{source}"""
+
+
+def _series_field(metric: str, fn: str, tier: Optional[Tier]) -> str:
+    # Rollup buckets carry <metric>_min/_mean/_max; re-aggregating them with the same fn is exact
+    # for min and max. For mean every bucket of the tier spans the same time and weighs the same,
+    # giving the time-weighted mean of the window, which matches raw data for steadily reporting devices
+    return metric if tier is None else f"{metric}_{fn}"
+
+
+def _aligned_query(
+    grid_id: str,
+    metrics: Sequence[str],
+    period: str,
+    every: int,
+    fn: str,
+    start: Optional[datetime] = None,
+    stop: Optional[datetime] = None,
+    tier: Optional[Tier] = None,
+) -> str:
+    fields = [_series_field(metric, fn, tier) for metric in metrics]
+    columns = ", ".join(f'"{column}"' for column in ("_time", *fields))
+    # Same windows as _series_query for every field, then one row per window with a column per field
+    pivot = f"""  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+  |> keep(columns: [{columns}])
+"""
+    if tier is not None:
+        return f"""
+{_series_source(grid_id, period, start, stop, tier)}  |> filter(fn: (r) => {_field_filter(fields)})
+{_grid_windows(every, fn, "", tier)}{pivot}"""
+    # Device windows are computed once, then combined per field by that field's grid aggregation
+    branches = {}
+    for metric in metrics:
+        branches.setdefault(GRID_AGGREGATION[metric], []).append(metric)
+    combined = "".join(
+        f"""
+by_{combine} = devices
+  |> filter(fn: (r) => {_field_filter(group)})
+  |> group(columns: ["_measurement", "_field"])
+{_window(every, combine)}"""
+        for combine, group in branches.items()
+    )
+    return f"""
+devices = {_series_source(grid_id, period, start, stop, tier)}  |> filter(fn: (r) => {_field_filter(fields)})
+{_window(every, fn)}{combined}
+union(tables: [{", ".join(f"by_{combine}" for combine in branches)}])
+{pivot}"""
+
+
+def _field_filter(fields: Sequence[str]) -> str:
+    return " or ".join(f'r._field == "{field}"' for field in fields)
+
+
+def _plan_series(every: int) -> Tuple[int, Optional[Tier]]:
+    """Window length and rollup tier for a series query; a None tier reads raw data."""
+    tier = plan_tier(every) if settings.rollups_enabled else None
+    if tier is None:
+        return every, None
+    return tier_window(every, tier), tier
+
+
+def _rollup_boundary(tier: Tier, grid_id: str, every: int) -> datetime:
+    """Where a query switches from ``tier`` to raw data, aligned to the query's windows."""
+    boundary = rollup_aggregator.rolled_until(tier, grid_id)
+    if boundary is None:
+        # Nothing emitted for this grid by this process yet, so rollups from earlier runs
+        # (or a backfill) can be trusted up to the last bucket that must have closed
+        boundary = datetime.now(timezone.utc) - timedelta(seconds=tier.seconds + settings.rollup_grace)
+    ts = int(boundary.timestamp()) // every * every
+    return datetime.fromtimestamp(ts, timezone.utc)
+
+
+def _rollup_coverage(every: int) -> Optional[datetime]:
+    """Start of the first query window rollups fully cover, or None without any coverage."""
+    since = rollup_coverage.since()
+    if since is None:
         return None
-    return result
+    ts = -(-int(since.timestamp()) // every) * every
+    return datetime.fromtimestamp(ts, timezone.utc)
+
+
+Segment = Tuple[Optional[datetime], Optional[datetime], Optional[Tier]]
+
+
+def _segments(grid_id: str, period: str, every: int, start: Optional[datetime], tier: Optional[Tier]) -> List[Segment]:
+    """``(start, stop, tier)`` pieces a series query is split into, oldest first; a None tier reads raw data.
+
+    With a tier: raw data before rollup coverage begins, the tier up to the
+    rollup watermark, then the raw tail that has not been rolled up yet. The
+    last piece is always raw and open-ended.
+    """
+    if tier is None:
+        return [(start, None, None)]
+    boundary = _rollup_boundary(tier, grid_id, every)
+    covered = _rollup_coverage(every)
+    first = start or datetime.now(timezone.utc) - timedelta(seconds=PERIOD_SECONDS[period])
+    if first >= boundary or covered is None or covered >= boundary:
+        return [(start, None, None)]
+    if first >= covered:
+        return [(start, boundary, tier), (boundary, None, None)]
+    return [(start, covered, None), (covered, boundary, tier), (boundary, None, None)]
+
+
+async def _query_samples(q: str) -> List[Tuple[datetime, float]]:
+    tables = await _query(q)
+    samples = []
+    for table in tables:
+        for record in table.records:
+            samples.append((record.get_time(), record.get_value()))
+    return samples
+
+
+async def _fetch_series(
+    grid_id: str, metric: str, period: str, every: int, fn: str, start: Optional[datetime], tier: Optional[Tier] = None
+) -> List[Tuple[datetime, float]]:
+    parts = await asyncio.gather(*(
+        _query_samples(_series_query(grid_id, metric, period, every, fn, seg_start, seg_stop, seg_tier))
+        for seg_start, seg_stop, seg_tier in _segments(grid_id, period, every, start, tier)
+    ))
+    return [sample for part in parts for sample in part]
 
 
-def query_historical(metric: str, period: str):
-    if metric not in {"consumption_kW", "generation_kW", "battery_soc"}:
+async def _query_aligned(q: str, fields: Sequence[str]) -> List[Tuple[datetime, Tuple[Optional[float], ...]]]:
+    tables = await _query(q)
+    rows = []
+    for table in tables:
+        for record in table.records:
+            rows.append((record.get_time(), tuple(record.values.get(field) for field in fields)))
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+
+async def _fetch_aligned(
+    grid_id: str, metrics: Sequence[str], period: str, every: int, fn: str, start: Optional[datetime], tier: Optional[Tier]
+) -> List[Tuple[datetime, Tuple[Optional[float], ...]]]:
+    parts = await asyncio.gather(*(
+        _query_aligned(
+            _aligned_query(grid_id, metrics, period, every, fn, seg_start, seg_stop, seg_tier),
+            [_series_field(metric, fn, seg_tier) for metric in metrics],
+        )
+        for seg_start, seg_stop, seg_tier in _segments(grid_id, period, every, start, tier)
+    ))
+    return [row for part in parts for row in part]
+
+
+async def query_aligned(
+    grid_id: str, metrics: Sequence[str], period: str, max_points: int, agg: str = "mean"
+) -> List[Tuple[datetime, Tuple[Optional[float], ...]]]:
+    """Several metrics of a grid on shared windows, fetched in one Flux query.
+
+    Each sample is ``(window start, values)`` with one value per metric in
+    ``metrics`` order, ``None`` where a metric has no data in that window.
+    Windows, rollup tiers and caching work as in ``query_series``; LTTB picks
+    different points per series, so only mean/min/max can be aligned.
+    """
+    if not metrics or any(metric not in METRICS for metric in metrics):
         return []
-    client = get_client()
-    query_api = client.query_api()
-    q = f"""
+    if period not in PERIOD_SECONDS or agg not in AGGREGATES or agg == "lttb":
+        return []
+    every, tier = _plan_series(window_seconds(period, max_points))
+    return await historical_cache.get(
+        key=(grid_id, tuple(metrics), period, every, agg),
+        window_seconds=PERIOD_SECONDS[period],
+        fetch=lambda start: _fetch_aligned(grid_id, metrics, period, every, agg, start, tier),
+        width=len(metrics),
+    )
+
+
+async def query_series(grid_id: str, metric: str, period: str, max_points: int, agg: str = "mean") -> List[Tuple[datetime, float]]:
+    """Fetch ``metric`` over ``period`` reduced to at most ``max_points`` samples.
+
+    mean/min/max are aggregated inside Influx with ``aggregateWindow``; lttb
+    pulls a mean-aggregated series a few times finer than the budget and
+    reduces it with LTTB, so Python never materialises the raw range. Windows
+    wide enough are served from the coarsest rollup tier, with raw data
+    stitched on before rollup coverage begins and past the rollup watermark.
+    The aggregated series is cached
+    and refreshed from its tail on repeat calls.
+    """
+    if metric not in METRICS:
+        return []
+    if period not in PERIOD_SECONDS or agg not in AGGREGATES:
+        return []
+    fn = "mean" if agg == "lttb" else agg
+    budget = max_points * LTTB_OVERSAMPLE if agg == "lttb" else max_points
+    every, tier = _plan_series(window_seconds(period, budget))
+    samples = await historical_cache.get(
+        key=(grid_id, metric, period, every, fn),
+        window_seconds=PERIOD_SECONDS[period],
+        fetch=lambda start: _fetch_series(grid_id, metric, period, every, fn, start, tier),
+    )
+    if agg == "lttb":
+        samples = lttb(samples, max_points)
+    return samples
+
+
+async def _no_samples() -> AsyncIterator[Tuple[datetime, float]]:
+    return
+    yield
+
+
+class _SampleStream:
+    """Samples from ``head`` and then an Influx record stream; the query slot is released once, when done or closed.
+
+    Not a generator: ``aclose()`` on a generator that never started skips its
+    ``finally``, and a response can be cut off before the first sample is read.
+    """
+
+    def __init__(self, records, head: List[Tuple[datetime, float]]) -> None:
+        self._records = records
+        self._head = iter(head)
+        self._open = True
+
+    def __aiter__(self) -> "_SampleStream":
+        return self
+
+    async def __anext__(self) -> Tuple[datetime, float]:
+        if not self._open:
+            raise StopAsyncIteration
+        for sample in self._head:
+            return sample
+        try:
+            record = await self._records.__anext__()
+        except BaseException:
+            await self.aclose()
+            raise
+        return record.get_time(), record.get_value()
+
+    async def aclose(self) -> None:
+        if self._open:
+            self._open = False
+            try:
+                if hasattr(self._records, "aclose"):
+                    await self._records.aclose()
+            finally:
+                _query_slots.release()
+
+
+async def stream_series(grid_id: str, metric: str, period: str, max_points: int, agg: str = "mean") -> AsyncIterator[Tuple[datetime, float]]:
+    """Like ``query_series`` but yields samples as Influx streams them, bypassing the cache.
+
+    LTTB needs the whole series up front, so only mean/min/max can be streamed.
+    When a rollup tier applies, everything before the raw tail (bounded by
+    the point budget) is fetched first and the raw tail is streamed after it. The query
+    is sent before this returns, so connection errors surface to the caller.
+    A query slot is held until the stream is exhausted or closed; callers
+    that may stop early must ``aclose()`` it.
+    """
+    if metric not in METRICS:
+        return _no_samples()
+    if period not in PERIOD_SECONDS or agg not in AGGREGATES or agg == "lttb":
+        return _no_samples()
+    every, tier = _plan_series(window_seconds(period, max_points))
+    *leading, (start, _, _) = _segments(grid_id, period, every, None, tier)
+    parts = await asyncio.gather(*(
+        _query_samples(_series_query(grid_id, metric, period, every, agg, seg_start, seg_stop, seg_tier))
+        for seg_start, seg_stop, seg_tier in leading
+    ))
+    head = [sample for part in parts for sample in part]
+    q = _series_query(grid_id, metric, period, every, agg, start)
+    await asyncio.wait_for(_query_slots.acquire(), settings.influx_query_timeout)
+    try:
+        records = await asyncio.wait_for(
+            _query_api().query_stream(q, org=settings.influx_org), settings.influx_query_timeout
+        )
+    except BaseException:
+        _query_slots.release()
+        raise
+    return _SampleStream(records, head)
+
+
+def _export_query(
+    grids: Sequence[str], metrics: Sequence[str], start: datetime, stop: datetime, every: Optional[int]
+) -> str:
+    grid_filter = " or ".join(f'r.grid_id == "{grid_id}"' for grid_id in grids)
+    field_filter = " or ".join(f'r._field == "{metric}"' for metric in metrics)
+    # Windows are per device series, before the fields are pivoted into columns
+    window = f'  |> aggregateWindow(every: {every}s, fn: mean, createEmpty: false, timeSrc: "_start")\n' if every else ""
+    columns = ", ".join(f'"{column}"' for column in ("_time", "grid_id", "device_id", *metrics))
+    return f"""
 from(bucket: "{settings.influx_bucket}")
-  |> range(start: -{period})
+  |> range(start: time(v: "{_flux_time(start)}"), stop: time(v: "{_flux_time(stop)}"))
   |> filter(fn: (r) => r._measurement == "microgrid")
-  |> filter(fn: (r) => r._field == "{metric}")
-  |> keep(columns: ["_time", "_value"]) 
+  |> filter(fn: (r) => {grid_filter})
+  |> filter(fn: (r) => {field_filter})
+{window}  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+  |> group()
+  |> sort(columns: ["_time", "grid_id", "device_id"])
+  |> keep(columns: [{columns}])
 """
-    tables = query_api.query(q, org=settings.influx_org)
-    points = []
-    for table in tables:
-        for record in table.records:
-            points.append({"time": record.get_time().isoformat(), "value": record.get_value()})
-    return points
+
+
+async def query_export_chunk(
+    grids: Sequence[str], metrics: Sequence[str], start: datetime, stop: datetime, every: Optional[int] = None
+) -> List[Tuple[Any, ...]]:
+    """Rows ``(time, grid_id, device_id, *metric values)`` between ``start`` and ``stop``, oldest first.
+
+    Raw readings per device, or their ``every``-second means. Takes a
+    background query slot, so dashboard queries waiting for one go first,
+    and records are consumed as Influx streams them so a large chunk does
+    not hold the event loop while it is parsed.
+    """
+    q = _export_query(grids, metrics, start, stop, every)
+    rows: List[Tuple[Any, ...]] = []
+
+    async def fetch() -> None:
+        records = await _query_api().query_stream(q, org=settings.influx_org)
+        async for record in records:
+            values = record.values
+            rows.append((record.get_time(), values.get("grid_id"), values.get("device_id"), *(values.get(m) for m in metrics)))
+
+    async with _query_slots.slot(background=True):
+        await asyncio.wait_for(fetch(), settings.export_query_timeout)
+    return rows
+
+
+def backfill_rollups(seconds: int) -> int:
+    """Compute every rollup tier over the last ``seconds`` of raw data already in Influx, inside Influx.
+
+    Ingest only rolls up readings it sees, so data written before rollups
+    existed (or while they were disabled) needs this once. Buckets combine
+    per-device statistics across the grid like ingest does. Once every tier
+    is done, rollup coverage is extended back to the start of the range.
+    Returns the number of Flux queries run.
+    """
+    started = datetime.now(timezone.utc)
+    groups: Dict[str, List[str]] = {}
+    for metric in METRICS:
+        groups.setdefault(GRID_AGGREGATION[metric], []).append(metric)
+    queries = 0
+    for tier in TIERS:
+        for fn in ("min", "mean", "max"):
+            for combine, metrics in groups.items():
+                q = f"""
+from(bucket: "{settings.influx_bucket}")
+  |> range(start: -{seconds}s)
+  |> filter(fn: (r) => r._measurement == "microgrid")
+  |> filter(fn: (r) => {_field_filter(metrics)})
+{_window(tier.seconds, fn)}  |> group(columns: ["grid_id", "_field"])
+{_window(tier.seconds, combine)}  |> map(fn: (r) => ({{r with _measurement: "{ROLLUP_MEASUREMENT}", tier: "{tier.name}", _field: r._field + "_{fn}"}}))
+  |> to(bucket: "{settings.influx_bucket}", org: "{settings.influx_org}")
+"""
+                query_sync(q)
+                queries += 1
+    rollup_coverage.extend(started - timedelta(seconds=seconds))
+    return queries
+
+
+async def query_historical(grid_id: str, metric: str, period: str, max_points: Optional[int] = None, agg: str = "mean"):
+    samples = await query_series(grid_id, metric, period, max_points or settings.historical_max_points, agg)
+    return [{"time": time.isoformat(), "value": value} for time, value in samples]
@@ -0,0 +1,57 @@
+import math
+from datetime import datetime
+from typing import List, Sequence, Tuple
+
+Sample = Tuple[datetime, float]
+
+PERIOD_SECONDS = {"1h": 3600, "24h": 86400, "7d": 7 * 86400, "30d": 30 * 86400}
+
+AGGREGATES = ("mean", "min", "max", "lttb")
+
+# LTTB picks from pre-aggregated buckets this many times finer than the budget
+LTTB_OVERSAMPLE = 4
+
+
+def window_seconds(period: str, max_points: int) -> int:
+    """Smallest whole-second window that keeps ``period`` within ``max_points`` buckets."""
+    return max(1, math.ceil(PERIOD_SECONDS[period] / max_points))
+
+
+def lttb(samples: Sequence[Sample], threshold: int) -> List[Sample]:
+    """Largest-Triangle-Three-Buckets reduction to at most ``threshold`` samples.
+
+    Keeps the first and last samples and, for every bucket in between, the
+    sample forming the largest triangle with its neighbours, which preserves
+    peaks and troughs that averaging would flatten.
+    """
+    n = len(samples)
+    if threshold >= n or threshold < 3:
+        return list(samples)
+
+    xs = [t.timestamp() for t, _ in samples]
+    ys = [float(v) for _, v in samples]
+    every = (n - 2) / (threshold - 2)
+    out = [samples[0]]
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = min(int((i + 1) * every) + 1, n - 1)
+        next_end = max(min(int((i + 2) * every) + 1, n), next_start + 1)
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best_area = -1.0
+        best = start
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best = j
+        out.append(samples[best])
+        a = best
+    out.append(samples[-1])
+    return out
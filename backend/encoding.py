@@ -0,0 +1,119 @@
+import struct
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import orjson
+
+Sample = Tuple[datetime, float]
+
+# Samples encoded per yielded chunk when streaming
+STREAM_CHUNK = 1000
+
+JSON = "json"
+COLUMNAR = "columnar"
+BINARY = "binary"
+FORMATS = (JSON, COLUMNAR, BINARY)
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.solnova.columnar+json"
+BINARY_MEDIA_TYPE = "application/vnd.solnova.series"
+
+_ACCEPT_FORMATS = {
+    COLUMNAR_MEDIA_TYPE: COLUMNAR,
+    BINARY_MEDIA_TYPE: BINARY,
+    "application/octet-stream": BINARY,
+}
+
+# Binary series header: magic, start epoch ms, sample count, fixed step ms (0 = delta-encoded)
+BINARY_MAGIC = b"SNS1"
+_BINARY_HEADER = struct.Struct("<4sqII")
+
+
+def negotiate(accept: Optional[str], fmt: Optional[str] = None) -> str:
+    """Pick a wire format from an explicit ``format`` parameter or the Accept header."""
+    if fmt:
+        return fmt
+    for part in (accept or "").split(","):
+        media = part.split(";", 1)[0].strip().lower()
+        if media in _ACCEPT_FORMATS:
+            return _ACCEPT_FORMATS[media]
+    return JSON
+
+
+def _epoch_ms(samples: Sequence[Sample]) -> Tuple[List[int], Optional[int]]:
+    """Millisecond timestamps and the fixed step between them, if there is one."""
+    times = [round(time.timestamp() * 1000) for time, _ in samples]
+    deltas = {b - a for a, b in zip(times, times[1:])}
+    step = deltas.pop() if len(deltas) == 1 else None
+    return times, step
+
+
+def to_columnar(samples: Sequence[Sample]) -> Dict[str, Any]:
+    """Columnar series: start epoch ms plus either a fixed ``step`` or per-sample ``deltas``."""
+    return _columnar(samples, [value for _, value in samples])
+
+
+def to_aligned_columnar(samples: Sequence[Tuple[datetime, Sequence[Any]]], metrics: Sequence[str]) -> Dict[str, Any]:
+    """Columnar form of aligned multi-metric samples: ``values`` maps each metric to its list."""
+    return _columnar(samples, {metric: [values[i] for _, values in samples] for i, metric in enumerate(metrics)})
+
+
+def to_aligned(samples: Sequence[Tuple[datetime, Sequence[Any]]], metrics: Sequence[str]) -> Dict[str, Any]:
+    """Aligned multi-metric samples as ISO ``time`` strings plus one value list per metric (null where missing)."""
+    return {
+        "time": [time.isoformat() for time, _ in samples],
+        "values": {metric: [values[i] for _, values in samples] for i, metric in enumerate(metrics)},
+    }
+
+
+def _columnar(samples: Sequence[Tuple[datetime, Any]], values: Any) -> Dict[str, Any]:
+    times, step = _epoch_ms(samples)
+    series: Dict[str, Any] = {
+        "start": times[0] if times else None,
+        "count": len(times),
+        "step": step,
+        "values": values,
+    }
+    if step is None:
+        series["deltas"] = [b - a for a, b in zip(times, times[1:])]
+    return series
+
+
+def pack_series(samples: Sequence[Sample]) -> bytes:
+    """Little-endian binary series.
+
+    Header (``<4sqII``): magic ``SNS1``, start epoch ms, count, step ms. When
+    step is 0 the header is followed by ``count - 1`` uint32 millisecond
+    deltas. Then ``count`` float32 values.
+    """
+    times, step = _epoch_ms(samples)
+    count = len(times)
+    parts = [_BINARY_HEADER.pack(BINARY_MAGIC, times[0] if times else 0, count, step or 0)]
+    if count > 1 and not step:
+        parts.append(struct.pack(f"<{count - 1}I", *(b - a for a, b in zip(times, times[1:]))))
+    parts.append(struct.pack(f"<{count}f", *(float(value) for _, value in samples)))
+    return b"".join(parts)
+
+
+def _encode_points(chunk: List[Sample], first: bool) -> bytes:
+    body = b",".join(orjson.dumps({"time": time, "value": value}) for time, value in chunk)
+    return body if first else b"," + body
+
+
+async def iter_json_points(samples: AsyncIterable[Sample], chunk_size: int = STREAM_CHUNK) -> AsyncIterator[bytes]:
+    """Encode samples as a JSON array of ``{"time", "value"}`` objects, chunk by chunk.
+
+    Only one chunk of samples is held at a time, so memory stays flat
+    regardless of how many samples the source yields.
+    """
+    yield b"["
+    first = True
+    chunk: List[Sample] = []
+    async for sample in samples:
+        chunk.append(sample)
+        if len(chunk) == chunk_size:
+            yield _encode_points(chunk, first)
+            first = False
+            chunk = []
+    if chunk:
+        yield _encode_points(chunk, first)
+    yield b"]"
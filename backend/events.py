@@ -0,0 +1,129 @@
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, FrozenSet, List, Optional, Set
+
+from .config import settings
+
+Event = Dict[str, Any]
+
+
+class Subscription:
+    """Per-connection buffer of pending push events.
+
+    Measurements are coalesced per (grid, device): a slow consumer only ever
+    sees the newest reading, so their share of the buffer is bounded by the
+    number of devices it follows. Alerts are never coalesced but are kept in a
+    bounded deque; when it overflows the oldest undelivered alert is dropped.
+    """
+
+    def __init__(self, grids: Optional[FrozenSet[str]], max_alerts: int) -> None:
+        self.grids = grids
+        self.dropped = 0
+        self._measurements: Dict[tuple, Event] = {}
+        self._alerts: Deque[Event] = deque(maxlen=max_alerts)
+        self._ready = asyncio.Event()
+
+    def offer(self, event: Event) -> None:
+        if event["type"] == "measurement":
+            self._measurements[(event["grid_id"], event.get("device_id"))] = event
+        else:
+            if len(self._alerts) == self._alerts.maxlen:
+                self.dropped += 1
+            self._alerts.append(event)
+        self._ready.set()
+
+    async def next_batch(self, timeout: float) -> List[Event]:
+        """Wait up to ``timeout`` seconds for events; an empty list means send a heartbeat."""
+        if not self._ready.is_set():
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self._ready.clear()
+        batch: List[Event] = list(self._alerts)
+        batch.extend(self._measurements.values())
+        self._alerts.clear()
+        self._measurements.clear()
+        return batch
+
+
+class EventHub:
+    """Fans ingest events out to push subscribers on the asyncio loop.
+
+    ``publish`` is called from the MQTT ingest thread. Events are queued and a
+    single drain is scheduled on the loop per burst, rather than one
+    ``call_soon_threadsafe`` wake-up per message.
+    """
+
+    def __init__(self, max_alerts: int = 100) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._max_alerts = max_alerts
+        self._by_grid: Dict[str, Set[Subscription]] = {}
+        self._all: Set[Subscription] = set()
+        self._count = 0
+        self._pending: Deque[Event] = deque()
+        self._lock = threading.Lock()
+        self._scheduled = False
+        self._published = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def subscribe(self, grids: Optional[FrozenSet[str]]) -> Subscription:
+        sub = Subscription(grids, self._max_alerts)
+        if grids is None:
+            self._all.add(sub)
+        else:
+            for grid_id in grids:
+                self._by_grid.setdefault(grid_id, set()).add(sub)
+        self._count += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        if sub.grids is None:
+            self._all.discard(sub)
+        else:
+            for grid_id in sub.grids:
+                subs = self._by_grid.get(grid_id)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._by_grid[grid_id]
+        self._count -= 1
+
+    def publish(self, event: Event) -> None:
+        """Thread-safe; drops the event when nobody is listening."""
+        loop = self._loop
+        if loop is None or self._count == 0:
+            return
+        with self._lock:
+            self._pending.append(event)
+            self._published += 1
+            if self._scheduled:
+                return
+            self._scheduled = True
+        try:
+            loop.call_soon_threadsafe(self._drain)
+        except RuntimeError:
+            # Loop already closed during shutdown
+            with self._lock:
+                self._pending.clear()
+                self._scheduled = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"subscribers": self._count, "published": self._published, "pending": len(self._pending)}
+
+    def _drain(self) -> None:
+        with self._lock:
+            events = list(self._pending)
+            self._pending.clear()
+            self._scheduled = False
+        for event in events:
+            for sub in self._by_grid.get(event["grid_id"], ()):
+                sub.offer(event)
+            for sub in self._all:
+                sub.offer(event)
+
+
+event_hub = EventHub(max_alerts=settings.push_buffer_size)
@@ -0,0 +1,300 @@
+import asyncio
+import csv
+import io
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Sequence, Tuple
+
+from .config import settings
+from .db import query_export_chunk
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet exports are optional
+    pa = None
+    pq = None
+
+CSV = "csv"
+PARQUET = "parquet"
+FORMATS = (CSV, PARQUET)
+
+MEDIA_TYPES = {CSV: "text/csv; charset=utf-8", PARQUET: "application/vnd.apache.parquet"}
+
+# Rows encoded per CSV block or Parquet row group, so one chunk never becomes one huge buffer
+BLOCK_ROWS = 50_000
+
+# Last line of a cancelled CSV export, and the Parquet key-value metadata marking a cancelled one
+CSV_CANCELLED = b"# export cancelled\n"
+PARQUET_STATUS_KEY = "solnova_export"
+
+Row = Tuple[Any, ...]
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def parquet_available() -> bool:
+    return pa is not None
+
+
+def plan_chunks(start: datetime, stop: datetime, chunk_seconds: int, every: Optional[int]) -> List[Tuple[datetime, datetime]]:
+    """Split ``[start, stop)`` into consecutive chunks on multiples of the chunk length.
+
+    With ``every`` the chunk length is rounded up to whole windows, so no
+    aggregation window is split between two chunks.
+    """
+    length = max(1, chunk_seconds)
+    if every:
+        length = -(-length // every) * every
+    chunks = []
+    cursor = start
+    while cursor < stop:
+        boundary = (int(cursor.timestamp()) // length + 1) * length
+        end = min(datetime.fromtimestamp(boundary, timezone.utc), stop)
+        chunks.append((cursor, end))
+        cursor = end
+    return chunks
+
+
+class _Buffer:
+    """Write-only file the Parquet writer writes into; drained after every row group."""
+
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+class _CsvEncoder:
+    def __init__(self, metrics: Sequence[str]) -> None:
+        self._header = ["time", "grid_id", "device_id", *metrics]
+
+    def begin(self) -> bytes:
+        return self._encode([self._header])
+
+    def rows(self, rows: Sequence[Row]) -> bytes:
+        return self._encode([(t.isoformat().replace("+00:00", "Z"), *rest) for t, *rest in rows])
+
+    def end(self) -> bytes:
+        return b""
+
+    def cancel(self) -> bytes:
+        return CSV_CANCELLED
+
+    @staticmethod
+    def _encode(rows) -> bytes:
+        out = io.StringIO()
+        csv.writer(out, lineterminator="\n").writerows(rows)
+        return out.getvalue().encode()
+
+
+class _ParquetEncoder:
+    def __init__(self, metrics: Sequence[str]) -> None:
+        self._schema = pa.schema(
+            [("time", pa.timestamp("us", tz="UTC")), ("grid_id", pa.string()), ("device_id", pa.string())]
+            + [(metric, pa.float64()) for metric in metrics]
+        )
+        self._buffer = _Buffer()
+        self._writer = pq.ParquetWriter(self._buffer, self._schema, compression="zstd")
+
+    def begin(self) -> bytes:
+        return self._buffer.drain()
+
+    def rows(self, rows: Sequence[Row]) -> bytes:
+        columns = list(zip(*rows))
+        arrays = [pa.array(column, type=f.type, from_pandas=True) for column, f in zip(columns, self._schema)]
+        # One row group per block, written out as soon as it is complete
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema), row_group_size=len(rows))
+        return self._buffer.drain()
+
+    def end(self) -> bytes:
+        self._writer.close()
+        return self._buffer.drain()
+
+    def cancel(self) -> bytes:
+        # Still a readable file, holding the row groups sent so far
+        self._writer.add_key_value_metadata({PARQUET_STATUS_KEY: "cancelled"})
+        return self.end()
+
+
+@dataclass
+class Export:
+    id: str
+    grids: Tuple[str, ...]
+    metrics: Tuple[str, ...]
+    start: datetime
+    stop: datetime
+    every: Optional[int]
+    format: str
+    chunks: List[Tuple[datetime, datetime]]
+    started_at: float = field(default_factory=time.time)
+    chunks_done: int = 0
+    rows: int = 0
+    bytes: int = 0
+    cancelled: bool = False
+    _tasks: Deque[asyncio.Task] = field(default_factory=deque, repr=False)
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        for task in self._tasks:
+            task.cancel()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "grids": len(self.grids),
+            "metrics": list(self.metrics),
+            "start": self.start.isoformat(),
+            "end": self.stop.isoformat(),
+            "format": self.format,
+            "chunks": len(self.chunks),
+            "chunks_done": self.chunks_done,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "elapsed_seconds": round(time.time() - self.started_at, 3),
+        }
+
+
+class ExportRegistry:
+    """Tracks running exports so they can be listed and cancelled.
+
+    An export reads its range chunk by chunk with at most ``concurrency``
+    chunk queries in flight and yields encoded bytes in time order, so its
+    memory is bounded by a few chunks no matter how long the range is.
+    Encoding runs on a worker thread to keep the event loop free for
+    dashboard requests. ``cancel`` cancels the outstanding chunk queries and
+    ends the body cleanly with a cancel marker (a final CSV comment line,
+    or Parquet file metadata). A client disconnect stops the queries too.
+    """
+
+    def __init__(self, chunk_seconds: int, concurrency: int) -> None:
+        self._chunk_seconds = chunk_seconds
+        self._concurrency = max(1, concurrency)
+        self._active: Dict[str, Export] = {}
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+
+    def create(
+        self, grids: Sequence[str], metrics: Sequence[str], start: datetime, stop: datetime, every: Optional[int], fmt: str
+    ) -> Export:
+        return Export(
+            id=uuid.uuid4().hex[:12],
+            grids=tuple(grids),
+            metrics=tuple(metrics),
+            start=start,
+            stop=stop,
+            every=every,
+            format=fmt,
+            chunks=plan_chunks(start, stop, self._chunk_seconds, every),
+        )
+
+    def cancel(self, export_id: str) -> bool:
+        export = self._active.get(export_id)
+        if export is None:
+            return False
+        export.cancel()
+        return True
+
+    async def _chunk_rows(self, export: Export) -> AsyncIterator[List[Row]]:
+        pending = export._tasks
+        chunks = iter(export.chunks)
+
+        def schedule() -> None:
+            chunk = next(chunks, None)
+            if chunk is not None:
+                pending.append(asyncio.ensure_future(
+                    query_export_chunk(export.grids, export.metrics, chunk[0], chunk[1], export.every)
+                ))
+
+        try:
+            for _ in range(self._concurrency):
+                schedule()
+            while pending:
+                # Chunks that finished before a cancel are not handed out either
+                if export.cancelled:
+                    raise ExportCancelled(export.id)
+                try:
+                    rows = await pending[0]
+                except asyncio.CancelledError:
+                    if export.cancelled:
+                        raise ExportCancelled(export.id)
+                    raise
+                pending.popleft()
+                schedule()
+                export.chunks_done += 1
+                yield rows
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, export: Export) -> AsyncIterator[bytes]:
+        self._active[export.id] = export
+        encoder = _ParquetEncoder(export.metrics) if export.format == PARQUET else _CsvEncoder(export.metrics)
+        outcome = "failed"
+        try:
+            yield encoder.begin()
+            async for rows in self._chunk_rows(export):
+                for offset in range(0, len(rows), BLOCK_ROWS):
+                    block = rows[offset:offset + BLOCK_ROWS]
+                    data = await asyncio.to_thread(encoder.rows, block)
+                    export.rows += len(block)
+                    export.bytes += len(data)
+                    yield data
+            data = await asyncio.to_thread(encoder.end)
+            export.bytes += len(data)
+            yield data
+            outcome = "completed"
+        except ExportCancelled:
+            # Cancelled through the API: the response is still open, so finish it instead of breaking it off
+            outcome = "cancelled"
+            data = await asyncio.to_thread(encoder.cancel)
+            export.bytes += len(data)
+            yield data
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        finally:
+            del self._active[export.id]
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": [export.summary() for export in self._active.values()],
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "parquet": parquet_available(),
+        }
+
+
+def parse_time(value: datetime) -> datetime:
+    # Times without an offset are taken as UTC
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+export_registry = ExportRegistry(settings.export_chunk_seconds, settings.export_concurrency)
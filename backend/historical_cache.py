@@ -0,0 +1,123 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+# A value, or a tuple of values for aligned multi-metric series
+Sample = Tuple[datetime, Any]
+
+# Rough footprint of one cached (datetime, float) sample: tuple, datetime,
+# float and the list slot pointing at it.
+SAMPLE_BYTES = 136
+# Each further value of a multi-metric sample, held in a tuple: float plus tuple slot
+VALUE_BYTES = 32
+ENTRY_BYTES = 512
+
+
+@dataclass
+class _Entry:
+    samples: List[Sample]
+    fetched_at: float
+    width: int = 1
+
+    @property
+    def size(self) -> int:
+        return ENTRY_BYTES + (SAMPLE_BYTES + VALUE_BYTES * (self.width - 1)) * len(self.samples)
+
+
+class HistoricalCache:
+    """Size-bounded LRU of historical series with incremental tail refresh.
+
+    A repeat request within ``min_refresh`` seconds is served as is (hit).
+    Later repeats only fetch samples from the last cached timestamp onwards
+    (refresh): the last cached bucket is replaced since it may have been
+    partial, new samples are appended and anything older than the window is
+    trimmed from the front. Unknown keys fetch the whole window (miss).
+    """
+
+    def __init__(self, max_bytes: int, min_refresh: float = 1.0) -> None:
+        self._max_bytes = max_bytes
+        self._min_refresh = min_refresh
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._refreshes = 0
+        self._evictions = 0
+
+    async def get(
+        self,
+        key: Hashable,
+        window_seconds: int,
+        fetch: Callable[[Optional[datetime]], Awaitable[List[Sample]]],
+        width: int = 1,
+    ) -> List[Sample]:
+        """Return the series for ``key``; ``fetch(start)`` loads samples from ``start`` (None = whole window).
+
+        ``width`` is the number of values per sample, for sizing aligned multi-metric series.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if now - entry.fetched_at < self._min_refresh:
+                    self._hits += 1
+                    return entry.samples
+
+        if entry is not None and entry.samples:
+            tail_start = entry.samples[-1][0]
+            samples = entry.samples[:-1] + await fetch(tail_start)
+            refreshed = True
+        else:
+            samples = await fetch(None)
+            refreshed = False
+
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=window_seconds)
+        start = bisect_left(samples, cutoff, key=lambda s: s[0])
+        if start:
+            samples = samples[start:]
+
+        with self._lock:
+            if refreshed:
+                self._refreshes += 1
+            else:
+                self._misses += 1
+            self._store(key, _Entry(samples=samples, fetched_at=now, width=width))
+        return samples
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses + self._refreshes
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self._max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "refreshes": self._refreshes,
+                "evictions": self._evictions,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else None,
+            }
+
+    def _store(self, key: Hashable, entry: _Entry) -> None:
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous.size
+        if entry.size > self._max_bytes:
+            return
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._bytes > self._max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self._evictions += 1
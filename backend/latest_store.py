@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .config import settings
+from .rollups import combine_devices
+
+# Readings ingested within the same slot of this many seconds are tracked together on their way to Influx
+SETTLE_SLOT_SECONDS = 0.25
+
+
+@dataclass
+class Snapshot:
+    values: Dict[str, float]
+    timestamp: datetime
+    received_at: float = field(default_factory=time.time)
+
+    def as_response(self, source: str) -> Dict:
+        age = (datetime.now(timezone.utc) - self.timestamp).total_seconds()
+        return {
+            **self.values,
+            "as_of": self.timestamp.isoformat(),
+            "age_seconds": round(max(age, 0.0), 3),
+            "source": source,
+        }
+
+
+def _combine(devices: Dict[str, Snapshot], offline_after: float) -> Snapshot:
+    # Drops devices whose latest reading is offline_after seconds older than the newest one
+    newest = max(snapshot.timestamp for snapshot in devices.values())
+    for device_id in [d for d, s in devices.items() if (newest - s.timestamp).total_seconds() > offline_after]:
+        del devices[device_id]
+    values: Dict[str, List[float]] = {}
+    for snapshot in devices.values():
+        for name, value in snapshot.values.items():
+            values.setdefault(name, []).append(value)
+    return Snapshot(
+        values={name: combine_devices(name, device_values) for name, device_values in values.items()},
+        timestamp=newest,
+    )
+
+
+class LatestStore:
+    """Latest reading per device, and per grid their combination, updated by the MQTT ingest threads.
+
+    A grid's values combine the latest reading of each of its devices the way
+    historical series combine device windows (``GRID_AGGREGATION``): power is
+    summed, state of charge averaged. Its timestamp is the newest device's.
+    A device whose latest reading is more than ``offline_after`` seconds
+    older than that is considered offline and dropped until it reports again.
+
+    Each grid also has a version: a counter bumped on every reading,
+    including out-of-order ones that do not change the snapshot, and the
+    monotonic time of that reading. Realtime validators are built from it.
+
+    Readings reach Influx about ``settle_delay`` seconds after ingest, so
+    for validators of responses read from Influx each grid also tracks its
+    newest reading time that was ingested at least that long ago.
+    """
+
+    def __init__(self, miss_ttl: float = 5.0, settle_delay: float = 2.0, offline_after: float = 300.0) -> None:
+        self._lock = threading.Lock()
+        self._grids: Dict[str, Snapshot] = {}
+        # grid_id -> device_id -> latest snapshot
+        self._devices: Dict[str, Dict[str, Snapshot]] = {}
+        self._misses: Dict[str, float] = {}
+        self._versions: Dict[str, Tuple[int, float]] = {}
+        self._miss_ttl = miss_ttl
+        self._settle_delay = settle_delay
+        self._offline_after = offline_after
+        # grid_id -> [monotonic start of slot, newest reading time in it], oldest slot first
+        self._settling: Dict[str, Deque[List[float]]] = {}
+        # grid_id -> newest reading time (epoch seconds) from slots that have settled
+        self._settled: Dict[str, float] = {}
+
+    def update(self, grid_id: str, device_id: str, values: Dict[str, float], timestamp: datetime) -> None:
+        with self._lock:
+            devices = self._devices.setdefault(grid_id, {})
+            device = devices.get(device_id)
+            # Out-of-order readings must not overwrite a newer snapshot
+            if device is None or timestamp >= device.timestamp:
+                devices[device_id] = Snapshot(values=dict(values), timestamp=timestamp)
+                self._grids[grid_id] = _combine(devices, self._offline_after)
+            self._misses.pop(grid_id, None)
+            now = time.monotonic()
+            self._versions[grid_id] = (self._versions.get(grid_id, (0, 0.0))[0] + 1, now)
+            ts = timestamp.timestamp()
+            slots = self._settling.setdefault(grid_id, deque())
+            if slots and now - slots[-1][0] < SETTLE_SLOT_SECONDS:
+                slots[-1][1] = max(slots[-1][1], ts)
+            else:
+                self._settle(grid_id, slots, now)
+                slots.append([now, ts])
+
+    def _settle(self, grid_id: str, slots: Deque[List[float]], now: float) -> Optional[float]:
+        # Caller holds _lock; folds slots old enough to be in Influx into the settled time
+        settled = self._settled.get(grid_id)
+        cutoff = now - self._settle_delay - SETTLE_SLOT_SECONDS
+        while slots and slots[0][0] <= cutoff:
+            ts = slots.popleft()[1]
+            settled = ts if settled is None else max(settled, ts)
+        if settled is not None:
+            self._settled[grid_id] = settled
+        return settled
+
+    def settled(self, grid_id: str) -> Optional[float]:
+        """Newest reading time (epoch seconds) of the grid that has had time to reach Influx, if any."""
+        with self._lock:
+            slots = self._settling.get(grid_id)
+            if slots is None:
+                return self._settled.get(grid_id)
+            return self._settle(grid_id, slots, time.monotonic())
+
+    def seed(self, grid_id: str, devices: Dict[str, Tuple[Dict[str, float], datetime]]) -> Snapshot:
+        """Populate a grid from a cold-start query of its devices' latest values unless ingest got there first."""
+        with self._lock:
+            current = self._grids.get(grid_id)
+            if current is None:
+                known = self._devices.setdefault(grid_id, {})
+                for device_id, (values, timestamp) in devices.items():
+                    known.setdefault(device_id, Snapshot(values=dict(values), timestamp=timestamp))
+                current = self._grids[grid_id] = _combine(known, self._offline_after)
+            return current
+
+    def get_grid(self, grid_id: str) -> Optional[Snapshot]:
+        with self._lock:
+            return self._grids.get(grid_id)
+
+    def version(self, grid_id: str) -> Tuple[int, float]:
+        """(readings ingested for the grid, monotonic time of the last one); (0, 0.0) if none yet."""
+        # A plain dict read of an immutable tuple; no lock needed
+        return self._versions.get(grid_id, (0, 0.0))
+
+    def get_device(self, grid_id: str, device_id: str) -> Optional[Snapshot]:
+        with self._lock:
+            return self._devices.get(grid_id, {}).get(device_id)
+
+    def mark_miss(self, grid_id: str) -> None:
+        with self._lock:
+            self._misses[grid_id] = time.monotonic()
+
+    def recently_missed(self, grid_id: str) -> bool:
+        """True if a cold-start lookup for this grid found nothing a moment ago."""
+        with self._lock:
+            missed_at = self._misses.get(grid_id)
+        return missed_at is not None and time.monotonic() - missed_at < self._miss_ttl
+
+
+latest_store = LatestStore(
+    settle_delay=settings.influx_flush_interval + 1.0,
+    offline_after=settings.device_offline_seconds,
+)
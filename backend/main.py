@@ -1,15 +1,95 @@
-from fastapi import FastAPI, HTTPException, Depends, Header, Request
+import asyncio
+import re
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import orjson
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
 from typing import Optional, List, Dict
 
+from .compression import StreamingGZipMiddleware
+from .conditional import etag, matches, not_modified, validated
 from .config import settings
-from .db import query_latest, query_historical
-from .alerts_store import alerts_store
-from .mqtt_client import ingest
+from .downsample import AGGREGATES, PERIOD_SECONDS, window_seconds
+from .db import (
+    batch_writer,
+    close_query_client,
+    historical_cache,
+    open_query_client,
+    query_aligned,
+    query_historical,
+    query_latest,
+    query_series,
+    query_stats,
+    rollup_aggregator,
+    rollup_coverage,
+    spool,
+    stream_series,
+)
+from .encoding import (
+    BINARY,
+    BINARY_MEDIA_TYPE,
+    COLUMNAR,
+    COLUMNAR_MEDIA_TYPE,
+    FORMATS,
+    JSON,
+    iter_json_points,
+    negotiate,
+    pack_series,
+    to_aligned,
+    to_aligned_columnar,
+    to_columnar,
+)
+from .alerts_store import SEVERITIES, STATUSES, alerts_store
+from .anomaly import anomaly_detector
+from .export import (
+    CSV,
+    FORMATS as EXPORT_FORMATS,
+    MEDIA_TYPES as EXPORT_MEDIA_TYPES,
+    PARQUET,
+    export_registry,
+    parquet_available,
+    parse_time,
+)
+from .events import event_hub
+from .latest_store import latest_store
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, counter, encode_seconds, gauge, registry
+from .mqtt_client import ID_PATTERN, ingest
+from .rollups import METRICS
+from .rules import rule_engine
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    event_hub.bind(asyncio.get_running_loop())
+    await open_query_client()
+    spool.start()
+    batch_writer.start()
+    # Readings ingested from now on are rolled up; older raw data only once backfilled
+    if settings.rollups_enabled:
+        rollup_coverage.extend(datetime.now(timezone.utc))
+    else:
+        rollup_coverage.reset()
+    rollup_aggregator.start()
+    alerts_store.start()
+    ingest.start()
+    try:
+        yield
+    finally:
+        ingest.stop()
+        alerts_store.stop()
+        # Open rollup buckets are emitted into the writer before it drains
+        rollup_aggregator.stop()
+        batch_writer.stop()
+        spool.stop()
+        await close_query_client()
 
-app = FastAPI(title="SOLNOVA Prototype API")
+
+app = FastAPI(title="SOLNOVA Prototype API", lifespan=lifespan)
 
 
 # Global exception handler to surface errors during development
@@ -24,9 +104,17 @@ app.add_middleware(
     allow_origin_regex=r"^https?://(localhost|127\.0\.0\.1)(:\d+)?$",
     allow_credentials=False,  # No cookies; simplifies CORS for web
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    # Lets web clients read validators for conditional polling
+    expose_headers=["ETag", "X-Export-Id"],
 )
 
+# Compress larger bodies (historical series in particular) for clients that accept gzip;
+# event streams are left alone and streamed bodies are flushed chunk by chunk
+app.add_middleware(StreamingGZipMiddleware, minimum_size=settings.compress_min_bytes, compresslevel=settings.compress_level)
+# Outermost, so request timings include compression
+app.add_middleware(MetricsMiddleware, periods=PERIOD_SECONDS)
+
 
 class LoginRequest(BaseModel):
     username: str
@@ -37,11 +125,6 @@ class TokenResponse(BaseModel):
     token: str
 
 
-@app.on_event("startup")
-def startup_event():
-    ingest.start()
-
-
 @app.post("/api/login", response_model=TokenResponse)
 def login(body: LoginRequest):
     # Basic input validation
@@ -62,34 +145,562 @@ def require_token(authorization: Optional[str] = Header(default=None)):
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
+def require_stream_token(token: Optional[str] = None, authorization: Optional[str] = Header(default=None)):
+    # Browsers cannot set headers on EventSource/WebSocket, so the token may come as a query parameter
+    if token is not None:
+        authorization = f"Bearer {token}"
+    require_token(authorization)
+
+
+def resolve_grid(grid_id: Optional[str]) -> str:
+    if grid_id is None:
+        return settings.default_grid_id
+    if not ID_PATTERN.match(grid_id):
+        raise HTTPException(status_code=400, detail="Invalid grid_id")
+    return grid_id
+
+
+def _series_etag(grid_id: str, every: int, *parts) -> str:
+    """Validator for a series of ``every``-second windows read from Influx.
+
+    Built from the window the current time falls in, which covers the range
+    sliding forward, and the window of the grid's newest reading that has had
+    time to reach Influx. Readings still on their way there, or filling a
+    window already served, do not change it.
+    """
+    settled = latest_store.settled(grid_id)
+    newest = int(settled // every) if settled is not None else None
+    return etag(grid_id, int(time.time() // every), newest, *parts)
+
+
 @app.get("/api/dashboard/realtime")
-def get_realtime(_: None = Depends(require_token)):
+async def get_realtime(
+    grid_id: Optional[str] = None,
+    if_none_match: Optional[str] = Header(default=None),
+    _: None = Depends(require_token),
+):
+    grid_id = resolve_grid(grid_id)
+    version, _updated = latest_store.version(grid_id)
+    # Cold-start responses (nothing ingested yet) carry no validator
+    tag = etag("realtime", grid_id, version) if version else None
+    if tag is not None and matches(if_none_match, tag):
+        return not_modified(tag)
+    body = await _realtime(grid_id)
+    return validated(JSONResponse(body), tag) if tag is not None else body
+
+
+async def _realtime(grid_id: str) -> Dict:
+    snapshot = latest_store.get_grid(grid_id)
+    if snapshot is not None:
+        return snapshot.as_response(source="live")
+
+    # Cold start: nothing ingested for this grid since the process started
+    if latest_store.recently_missed(grid_id):
+        raise HTTPException(status_code=404, detail="No data available")
     try:
-        latest = query_latest()
+        devices = await query_latest(grid_id)
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Realtime data unavailable: {type(e).__name__}: {e}")
-    if not latest:
+    if not devices:
+        latest_store.mark_miss(grid_id)
         raise HTTPException(status_code=404, detail="No data available")
-    return latest
+    return latest_store.seed(grid_id, devices).as_response(source="influx")
+
+
+async def _alerts_page(
+    response: Response,
+    grid_id: Optional[str],
+    status: Optional[str],
+    severity: Optional[str],
+    limit: int,
+    cursor: Optional[str],
+    if_none_match: Optional[str],
+):
+    if status is not None and status not in STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {list(STATUSES)}")
+    if severity is not None and severity not in SEVERITIES:
+        raise HTTPException(status_code=400, detail=f"Invalid severity. Must be one of: {list(SEVERITIES)}")
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="Invalid limit. Must be between 1 and 1000")
+    tag = etag("alerts", alerts_store.version, grid_id, status, severity, limit, cursor)
+    if matches(if_none_match, tag):
+        return not_modified(tag)
+    validated(response, tag)
+    try:
+        alerts, next_cursor = await asyncio.to_thread(
+            alerts_store.list, grid_id=grid_id, status=status, severity=severity, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return alerts
 
 
 @app.get("/api/dashboard/alerts")
-def get_alerts(_: None = Depends(require_token)) -> List[Dict]:
-    return alerts_store.list()
+async def get_alerts(
+    response: Response,
+    grid_id: Optional[str] = None,
+    status: Optional[str] = None,
+    severity: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(default=None),
+    _: None = Depends(require_token),
+) -> List[Dict]:
+    grid_id = resolve_grid(grid_id) if grid_id is not None else None
+    return await _alerts_page(response, grid_id, status, severity, limit, cursor, if_none_match)
 
 
-@app.get("/api/dashboard/historical")
-def get_historical(metric: str, period: str, _: None = Depends(require_token)):
+@app.get("/api/alerts/{grid_id}")
+async def get_grid_alerts(
+    grid_id: str,
+    response: Response,
+    status: Optional[str] = None,
+    severity: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(default=None),
+    _: None = Depends(require_token),
+) -> List[Dict]:
+    return await _alerts_page(response, resolve_grid(grid_id), status, severity, limit, cursor, if_none_match)
+
+
+SPARKLINE_METRICS = ("consumption_kW", "generation_kW", "battery_soc")
+
+
+async def _sparkline(grid_id: str, metric: str, period: str, points: int) -> Optional[Dict]:
+    # A sparkline is decoration; an Influx hiccup should not fail the whole summary
+    try:
+        return to_columnar(await query_series(grid_id, metric, period, points))
+    except Exception:
+        return None
+
+
+async def _summary_realtime(grid_id: str) -> Optional[Dict]:
+    # A grid without a reading yet (or an Influx outage on cold start) still has alerts and sparklines to show
+    try:
+        return await _realtime(grid_id)
+    except HTTPException:
+        return None
+
+
+@app.get("/api/dashboard/summary/{grid_id}")
+async def get_dashboard_summary(
+    grid_id: str,
+    period: str = "24h",
+    points: int = 48,
+    alerts_limit: int = 20,
+    if_none_match: Optional[str] = Header(default=None),
+    _: None = Depends(require_token),
+):
+    """Realtime KPIs, active alerts and a columnar sparkline per metric in one response.
+
+    The KPI fields sit at the top level, in the same shape as
+    ``/api/dashboard/realtime``, so clients can parse the summary wherever they
+    parse a realtime reading. Without a reading to show they are left out
+    and ``source`` is null.
+    """
+    grid_id = resolve_grid(grid_id)
+    if period not in PERIOD_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Invalid period. Must be one of: {list(PERIOD_SECONDS)}")
+    if not 10 <= points <= 500:
+        raise HTTPException(status_code=400, detail="Invalid points. Must be between 10 and 500")
+    if not 1 <= alerts_limit <= 100:
+        raise HTTPException(status_code=400, detail="Invalid alerts_limit. Must be between 1 and 100")
+    # The KPIs at the top level change with every reading, so the realtime version is part of the tag
+    version, _updated = latest_store.version(grid_id)
+    tag = _series_etag(
+        grid_id, window_seconds(period, points), "summary", version, alerts_store.version, period, points, alerts_limit
+    )
+    if matches(if_none_match, tag):
+        return not_modified(tag)
+
+    realtime, (alerts, _cursor), *sparklines = await asyncio.gather(
+        _summary_realtime(grid_id),
+        asyncio.to_thread(alerts_store.list, grid_id=grid_id, status="active", limit=alerts_limit),
+        *(_sparkline(grid_id, metric, period, points) for metric in SPARKLINE_METRICS),
+    )
+    body = {
+        **(realtime if realtime is not None else {"source": None}),
+        "grid_id": grid_id,
+        "alerts": alerts,
+        "sparkline_period": period,
+        "sparklines": dict(zip(SPARKLINE_METRICS, sparklines)),
+    }
+    # A summary with missing KPIs or a missing sparkline is not worth validating against
+    if realtime is None or None in sparklines:
+        return body
+    return validated(Response(orjson.dumps(body), media_type="application/json"), tag)
+
+
+class AcknowledgeRequest(BaseModel):
+    operator: Optional[str] = None
+
+
+@app.put("/api/alerts/{alert_id}/acknowledge")
+async def acknowledge_alert(
+    alert_id: str,
+    body: Optional[AcknowledgeRequest] = None,
+    _: None = Depends(require_token),
+):
+    alert = await asyncio.to_thread(alerts_store.acknowledge, alert_id, operator=body.operator if body else None)
+    if alert is None:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    return alert.__dict__
+
+
+async def _historical_response(
+    grid_id: str,
+    metric: str,
+    period: str,
+    max_points: Optional[int],
+    agg: str,
+    stream: bool,
+    fmt: str,
+    if_none_match: Optional[str],
+):
     # Input validation
     valid_metrics = ["consumption_kW", "generation_kW", "battery_soc"]
     if metric not in valid_metrics:
         raise HTTPException(status_code=400, detail=f"Invalid metric. Must be one of: {valid_metrics}")
-    
+    _validate_series_params(period, max_points, agg, fmt)
+
+    points = max_points or settings.historical_max_points
+    tag = _series_etag(grid_id, window_seconds(period, points), "historical", metric, period, points, agg, fmt, stream)
+    if matches(if_none_match, tag):
+        return not_modified(tag)
+
+    if stream:
+        if agg == "lttb":
+            raise HTTPException(status_code=400, detail="agg=lttb cannot be streamed")
+        if fmt != JSON:
+            raise HTTPException(status_code=400, detail="Only the json format can be streamed")
+        try:
+            samples = await stream_series(grid_id, metric, period, max_points or settings.historical_max_points, agg)
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Historical data unavailable: {type(e).__name__}: {e}")
+        # The stream holds a query slot; close it even when the client goes away mid-body
+        response = StreamingResponse(
+            iter_json_points(samples), media_type="application/json", background=BackgroundTask(samples.aclose)
+        )
+        return validated(response, tag)
+
+    try:
+        if fmt == JSON:
+            rows = await query_historical(grid_id=grid_id, metric=metric, period=period, max_points=max_points, agg=agg)
+        else:
+            samples = await query_series(grid_id, metric, period, max_points or settings.historical_max_points, agg)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Historical data unavailable: {type(e).__name__}: {e}")
+    started = time.perf_counter()
+    if fmt == JSON:
+        response = Response(orjson.dumps(rows), media_type="application/json")
+    elif fmt == COLUMNAR:
+        response = Response(orjson.dumps(to_columnar(samples)), media_type=COLUMNAR_MEDIA_TYPE, headers={"Vary": "Accept"})
+    else:
+        response = Response(pack_series(samples), media_type=BINARY_MEDIA_TYPE, headers={"Vary": "Accept"})
+    encode_seconds.labels(fmt).observe(time.perf_counter() - started)
+    return validated(response, tag)
+
+
+async def _aligned_response(
+    grid_id: str,
+    metrics: List[str],
+    period: str,
+    max_points: Optional[int],
+    agg: str,
+    fmt: str,
+    if_none_match: Optional[str],
+):
+    """Several metrics on shared time windows from one Influx query, as aligned arrays."""
+    if not metrics or any(m not in METRICS for m in metrics):
+        raise HTTPException(status_code=400, detail=f"Invalid metrics. Must be among: {list(METRICS)}")
+    _validate_series_params(period, max_points, agg, fmt)
+    if agg == "lttb":
+        raise HTTPException(status_code=400, detail="agg=lttb picks different points per metric; use mean, min or max")
+    if fmt == BINARY:
+        raise HTTPException(status_code=400, detail="The binary format carries one metric; use json or columnar")
+
+    points = max_points or settings.historical_max_points
+    tag = _series_etag(grid_id, window_seconds(period, points), "aligned", ",".join(metrics), period, points, agg, fmt)
+    if matches(if_none_match, tag):
+        return not_modified(tag)
+
+    try:
+        samples = await query_aligned(grid_id, metrics, period, points, agg)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Historical data unavailable: {type(e).__name__}: {e}")
+    started = time.perf_counter()
+    if fmt == JSON:
+        response = Response(orjson.dumps(to_aligned(samples, metrics)), media_type="application/json")
+    else:
+        body = orjson.dumps(to_aligned_columnar(samples, metrics))
+        response = Response(body, media_type=COLUMNAR_MEDIA_TYPE, headers={"Vary": "Accept"})
+    encode_seconds.labels(fmt).observe(time.perf_counter() - started)
+    return validated(response, tag)
+
+
+def _validate_series_params(period: str, max_points: Optional[int], agg: str, fmt: str) -> None:
     valid_periods = ["1h", "24h", "7d", "30d"]
     if period not in valid_periods:
         raise HTTPException(status_code=400, detail=f"Invalid period. Must be one of: {valid_periods}")
-    
+
+    if max_points is not None and not 10 <= max_points <= 5000:
+        raise HTTPException(status_code=400, detail="Invalid max_points. Must be between 10 and 5000")
+
+    if agg not in AGGREGATES:
+        raise HTTPException(status_code=400, detail=f"Invalid agg. Must be one of: {list(AGGREGATES)}")
+
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {list(FORMATS)}")
+
+
+def _duration_seconds(value: str, name: str) -> int:
+    """Parse a width such as ``30s``, ``5m``, ``1h`` or ``1d``."""
+    match = re.fullmatch(r"(\d{1,4})([smhd])", value)
+    if not match:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}. Expected e.g. 30s, 5m, 1h or 1d")
+    width = int(match.group(1)) * {"s": 1, "m": 60, "h": 3600, "d": 86400}[match.group(2)]
+    if width == 0:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}. Must be greater than zero")
+    return width
+
+
+def _granularity_points(period: str, granularity: Optional[str]) -> Optional[int]:
+    """Translate a bucket width such as ``5m`` into a max_points budget for ``period``."""
+    if granularity is None:
+        return None
+    if period not in PERIOD_SECONDS:
+        raise HTTPException(status_code=400, detail="Invalid granularity. Expected e.g. 30s, 5m, 1h or 1d")
+    width = _duration_seconds(granularity, "granularity")
+    return min(max(PERIOD_SECONDS[period] // width, 10), 5000)
+
+
+@app.get("/api/export")
+async def export_data(
+    start: datetime,
+    end: datetime,
+    grids: str,
+    metrics: Optional[str] = None,
+    format: str = CSV,
+    every: Optional[str] = None,
+    _: None = Depends(require_token),
+):
+    """Stream raw readings (or ``every``-wide means) per device for a time range as CSV or Parquet."""
+    start, end = parse_time(start), parse_time(end)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    grid_ids = sorted({g.strip() for g in grids.split(",") if g.strip()})
+    if not grid_ids or len(grid_ids) > settings.export_max_grids:
+        raise HTTPException(status_code=400, detail=f"grids must list between 1 and {settings.export_max_grids} grid ids")
+    if not all(ID_PATTERN.match(g) for g in grid_ids):
+        raise HTTPException(status_code=400, detail="Invalid grid_id")
+    selected = [m.strip() for m in metrics.split(",") if m.strip()] if metrics else list(METRICS)
+    if not selected or any(m not in METRICS for m in selected):
+        raise HTTPException(status_code=400, detail=f"Invalid metrics. Must be among: {list(METRICS)}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {list(EXPORT_FORMATS)}")
+    if format == PARQUET and not parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export needs pyarrow installed on the server")
+    width = _duration_seconds(every, "every") if every else None
+
+    export = export_registry.create(grid_ids, list(dict.fromkeys(selected)), start, end, width, format)
+    filename = f"solnova-{start:%Y%m%dT%H%M%SZ}-{end:%Y%m%dT%H%M%SZ}.{format}"
+    return StreamingResponse(
+        export_registry.stream(export),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Export-Id": export.id},
+    )
+
+
+@app.delete("/api/export/{export_id}")
+async def cancel_export(export_id: str, _: None = Depends(require_token)):
+    if not export_registry.cancel(export_id):
+        raise HTTPException(status_code=404, detail="No running export with this id")
+    return {"id": export_id, "status": "cancelled"}
+
+
+@app.get("/api/dashboard/historical")
+async def get_historical(
+    period: str,
+    metric: Optional[str] = None,
+    metrics: Optional[str] = None,
+    max_points: Optional[int] = None,
+    agg: str = "mean",
+    stream: bool = False,
+    grid_id: Optional[str] = None,
+    format: Optional[str] = None,
+    accept: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+    _: None = Depends(require_token),
+):
+    if (metric is None) == (metrics is None):
+        raise HTTPException(status_code=400, detail="Pass either metric or a comma-separated metrics list")
+    if metrics is not None:
+        if stream:
+            raise HTTPException(status_code=400, detail="Only a single metric can be streamed")
+        selected = list(dict.fromkeys(m.strip() for m in metrics.split(",") if m.strip()))
+        return await _aligned_response(
+            resolve_grid(grid_id), selected, period, max_points, agg, negotiate(accept, format), if_none_match
+        )
+    return await _historical_response(
+        resolve_grid(grid_id), metric, period, max_points, agg, stream, negotiate(accept, format), if_none_match
+    )
+
+
+@app.get("/api/historical/{grid_id}/{metric}")
+async def get_grid_historical(
+    grid_id: str,
+    metric: str,
+    period: str = "24h",
+    granularity: Optional[str] = None,
+    max_points: Optional[int] = None,
+    agg: str = "mean",
+    format: Optional[str] = None,
+    accept: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+    _: None = Depends(require_token),
+):
+    grid_id = resolve_grid(grid_id)
+    if max_points is None:
+        max_points = _granularity_points(period, granularity)
+    return await _historical_response(
+        grid_id, metric, period, max_points, agg, False, negotiate(accept, format), if_none_match
+    )
+
+
+def _parse_grids(grids: Optional[str]) -> Optional[frozenset]:
+    """``None`` subscribes to every grid; otherwise a comma-separated list of grid ids."""
+    if not grids:
+        return None
+    parsed = frozenset(g.strip() for g in grids.split(",") if g.strip())
+    if not parsed or len(parsed) > settings.push_max_grids:
+        raise HTTPException(status_code=400, detail=f"grids must list between 1 and {settings.push_max_grids} grid ids")
+    return parsed
+
+
+async def _sse_events(grids: Optional[frozenset]):
+    # Subscribed only once the response starts streaming, right before the try, so a client
+    # that disconnects before that never leaves a subscription behind
+    sub = event_hub.subscribe(grids)
     try:
-        return query_historical(metric=metric, period=period)
-    except Exception as e:
-        raise HTTPException(status_code=503, detail=f"Historical data unavailable: {type(e).__name__}: {e}")
+        yield b"retry: 5000\n\n"
+        while True:
+            events = await sub.next_batch(settings.push_heartbeat_seconds)
+            if not events:
+                yield b": heartbeat\n\n"
+                continue
+            yield b"".join(b"event: " + e["type"].encode() + b"\ndata: " + orjson.dumps(e) + b"\n\n" for e in events)
+    finally:
+        event_hub.unsubscribe(sub)
+
+
+@app.get("/api/stream")
+async def stream_events(grids: Optional[str] = None, _: None = Depends(require_stream_token)):
+    return StreamingResponse(
+        _sse_events(_parse_grids(grids)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/ws")
+async def websocket_events(websocket: WebSocket, grids: Optional[str] = None, token: Optional[str] = None):
+    if token != settings.api_token:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    try:
+        subscribed = _parse_grids(grids)
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+        return
+    await websocket.accept()
+    sub = event_hub.subscribe(subscribed)
+    try:
+        while True:
+            events = await sub.next_batch(settings.push_heartbeat_seconds)
+            if not events:
+                await websocket.send_text('{"type":"heartbeat"}')
+                continue
+            await websocket.send_text(orjson.dumps(events).decode())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        event_hub.unsubscribe(sub)
+
+
+@app.get("/api/anomaly/{grid_id}/{device_id}")
+async def get_device_baseline(grid_id: str, device_id: str, _: None = Depends(require_token)):
+    """Streaming baseline of one device: EWMA mean/std, rolling min/max and anomaly state per metric."""
+    grid_id = resolve_grid(grid_id)
+    if not ID_PATTERN.match(device_id):
+        raise HTTPException(status_code=400, detail="Invalid device_id")
+    snapshot = anomaly_detector.snapshot(grid_id, device_id, time.time())
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="No statistics for this device")
+    return snapshot
+
+
+@app.get("/api/stats")
+async def get_stats(_: None = Depends(require_token)):
+    return {
+        "ingest": ingest.stats(),
+        "influx_writer": batch_writer.stats(),
+        "spool": spool.stats(),
+        "alerts": alerts_store.stats(),
+        "rules": rule_engine.stats(),
+        "anomaly": anomaly_detector.stats(),
+        "historical_cache": historical_cache.stats(),
+        "influx_queries": query_stats(),
+        "rollups": rollup_aggregator.stats(),
+        "exports": export_registry.stats(),
+        "push": event_hub.stats(),
+    }
+
+
+def _collect_stats():
+    # Component figures that already live in stats(): cumulative counts as counters, levels as gauges
+    writer = batch_writer.stats()
+    spooled = spool.stats()
+    alerts = alerts_store.stats()
+    cache = historical_cache.stats()
+    queries = query_stats()["async"]
+    anomaly = anomaly_detector.stats()
+    return [
+        gauge("solnova_influx_writer_queued", "Points waiting in the Influx write queue.", writer["queued"]),
+        counter("solnova_influx_writer_written_total", "Points handed to Influx or the spool since start.", writer["written"]),
+        counter("solnova_influx_writer_dropped_total", "Points dropped because the write queue was full.", writer["dropped"]),
+        counter("solnova_influx_writer_failed_total", "Points in batches that failed to be written or spooled.", writer["failed"]),
+        gauge("solnova_spool_bytes", "Bytes of line protocol spooled on disk.", spooled["bytes"]),
+        gauge("solnova_spool_pending_lines", "Lines spooled on disk awaiting replay.", spooled["pending_lines"]),
+        counter("solnova_spool_spooled_lines_total", "Lines written to the spool since start.", spooled["spooled"]),
+        counter("solnova_spool_replayed_lines_total", "Spooled lines replayed into Influx since start.", spooled["replayed"]),
+        counter("solnova_spool_dropped_lines_total", "Spooled lines deleted to stay under the disk cap.", spooled["dropped"]),
+        counter("solnova_spool_rejected_lines_total", "Spooled lines Influx refused as invalid.", spooled["rejected"]),
+        gauge("solnova_spool_replay_lines_per_second", "Current spool replay rate.", spooled["replay_lines_per_second"]),
+        gauge("solnova_spool_outage", "1 while Influx writes are being spooled instead of sent.", int(spooled["outage"])),
+        gauge("solnova_alerts_stored", "Alerts in the alerts store.", alerts["stored"]),
+        gauge("solnova_alerts_open", "Open (unresolved) coalesced alerts.", alerts["open"]),
+        counter("solnova_alerts_coalesced_total", "Alert repeats folded into an open alert since start.", alerts["coalesced"]),
+        gauge("solnova_historical_cache_bytes", "Bytes held by the historical series cache.", cache["bytes"]),
+        counter("solnova_historical_cache_hits_total", "Historical cache hits since start.", cache["hits"]),
+        counter("solnova_historical_cache_misses_total", "Historical cache misses since start.", cache["misses"]),
+        gauge("solnova_historical_cache_hit_ratio", "Historical cache hits over all lookups.", cache["hit_ratio"]),
+        counter("solnova_influx_queries_sent_total", "Flux queries sent to Influx by API handlers.", queries["calls"]),
+        counter("solnova_influx_queries_shared_total", "API queries answered by an identical query already in flight.", queries["shared"]),
+        gauge("solnova_anomaly_devices", "Devices with streaming anomaly statistics.", anomaly["devices"]),
+        gauge("solnova_anomaly_state_bytes", "Bytes allocated for anomaly detector state.", anomaly["state_bytes"]),
+        counter("solnova_anomaly_fired_total", "Anomalies flagged since start.", anomaly["fired"]),
+        gauge("solnova_push_subscribers", "Connected SSE/WebSocket subscribers.", event_hub.stats()["subscribers"]),
+    ]
+
+
+registry.add_collector(_collect_stats)
+
+
+@app.get("/metrics")
+async def get_metrics(_: None = Depends(require_token)):
+    # The alerts count is a SQLite query, so render off the event loop
+    body = await asyncio.to_thread(registry.render)
+    return Response(body, media_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,294 @@
+import threading
+import time
+from bisect import bisect_left
+from urllib.parse import parse_qs
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers in-process work (sub-millisecond) up to Influx timeouts
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# A collected family: (name, type, help, [(name suffix, labels, value)])
+Sample = Tuple[str, Dict[str, str], float]
+Family = Tuple[str, str, str, List[Sample]]
+
+
+class _Sharded:
+    """Per-thread slots that only their owning thread writes to.
+
+    The hot path touches a thread-local list and never takes a lock; the
+    registry lock is taken once per thread, when its shard is created, and
+    when a scrape sums the shards.
+    """
+
+    __slots__ = ("_width", "_local", "_shards", "_lock")
+
+    def __init__(self, width: int) -> None:
+        self._width = width
+        self._local = threading.local()
+        self._shards: List[List[float]] = []
+        self._lock = threading.Lock()
+
+    def shard(self) -> List[float]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = [0.0] * self._width
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def total(self) -> List[float]:
+        with self._lock:
+            shards = list(self._shards)
+        total = [0.0] * self._width
+        for shard in shards:
+            for i, value in enumerate(shard):
+                total[i] += value
+        return total
+
+
+class _CounterChild:
+    __slots__ = ("_cells",)
+
+    def __init__(self) -> None:
+        self._cells = _Sharded(1)
+
+    def inc(self, amount: float = 1) -> None:
+        self._cells.shard()[0] += amount
+
+    def value(self) -> float:
+        return self._cells.total()[0]
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_cells")
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self._bounds = bounds
+        # One cell per bucket plus +Inf, then sum and count
+        self._cells = _Sharded(len(bounds) + 3)
+
+    def observe(self, value: float) -> None:
+        shard = self._cells.shard()
+        shard[bisect_left(self._bounds, value)] += 1
+        shard[-2] += value
+        shard[-1] += 1
+
+    def snapshot(self) -> List[float]:
+        return self._cells.total()
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.label_names:
+            self._default = self.labels()
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _items(self) -> List[Tuple[Dict[str, str], object]]:
+        with self._lock:
+            children = list(self._children.items())
+        return [(dict(zip(self.label_names, values)), child) for values, child in children]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self._default.inc(amount)
+
+    def value(self) -> float:
+        return self._default.value()
+
+    def collect(self) -> Family:
+        return self.name, self.kind, self.help, [("", labels, child.value()) for labels, child in self._items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def collect(self) -> Family:
+        samples = []
+        for labels, child in self._items():
+            cells = child.snapshot()
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), cells):
+                cumulative += count
+                samples.append(("_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append(("_sum", labels, cells[-2]))
+            samples.append(("_count", labels, cells[-1]))
+        return self.name, self.kind, self.help, samples
+
+
+class Registry:
+    """Metrics plus collectors that turn component ``stats()`` into gauges and counters at scrape time."""
+
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        families = [metric.collect() for metric in self._metrics]
+        for collector in self._collectors:
+            families.extend(collector())
+        lines = []
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def gauge(name: str, help: str, value: Optional[float], labels: Optional[Dict[str, str]] = None) -> Family:
+    """A single-sample gauge family for collectors; None values are left out."""
+    return name, "gauge", help, [] if value is None else [("", labels or {}, value)]
+
+
+def counter(name: str, help: str, value: Optional[float], labels: Optional[Dict[str, str]] = None) -> Family:
+    """A single-sample counter family for collectors exporting a component's cumulative count; name it ``*_total``."""
+    return name, "counter", help, [] if value is None else [("", labels or {}, value)]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+registry = Registry()
+
+ingest_messages = registry.counter(
+    "solnova_ingest_messages_total", "MQTT messages received, by subscription topic filter.", ["topic"]
+)
+ingest_decode_failures = registry.counter(
+    "solnova_ingest_decode_failures_total", "MQTT payloads that were not a JSON object or had unusable fields.", ["topic"]
+)
+ingest_dropped = registry.counter(
+    "solnova_ingest_dropped_total", "MQTT messages dropped because their grid's worker queue was full."
+)
+ingest_errors = registry.counter(
+    "solnova_ingest_errors_total",
+    "Messages (stage=message) or anomaly batches (stage=anomaly) whose processing raised; the worker carries on.",
+    ["stage"],
+)
+mqtt_connects = registry.counter("solnova_mqtt_connects_total", "Successful MQTT broker connections.")
+mqtt_reconnects = registry.counter(
+    "solnova_mqtt_reconnects_total", "MQTT connections made after the first one (i.e. reconnects)."
+)
+mqtt_disconnects = registry.counter("solnova_mqtt_disconnects_total", "MQTT broker disconnections.")
+influx_write_seconds = registry.histogram(
+    "solnova_influx_write_seconds", "Influx write request latency, by outcome.", ["outcome"]
+)
+influx_write_batch = registry.histogram(
+    "solnova_influx_write_batch_lines", "Lines per Influx write request.", buckets=SIZE_BUCKETS
+)
+influx_query_seconds = registry.histogram(
+    "solnova_influx_query_seconds", "Flux query latency including the wait for a query slot, by outcome.", ["outcome"]
+)
+http_request_seconds = registry.histogram(
+    "solnova_http_request_seconds", "API request latency, by route template, period and status.", ["route", "period", "status"]
+)
+encode_seconds = registry.histogram(
+    "solnova_encode_seconds", "Time spent serialising historical responses, by format.", ["format"]
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each HTTP request into ``http_request_seconds``.
+
+    Requests are labelled with the matched route template rather than the raw
+    path, and with ``period`` when it is one of ``periods``, so label sets stay
+    bounded. Event streams are not timed; they last as long as the client stays.
+    """
+
+    def __init__(self, app, periods: Iterable[str] = ()) -> None:
+        self.app = app
+        self.periods = frozenset(periods)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        response = {"status": 500, "stream": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                for key, value in message.get("headers", ()):
+                    if key == b"content-type" and value.startswith(b"text/event-stream"):
+                        response["stream"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not response["stream"]:
+                route = scope.get("route")
+                path = getattr(route, "path", "unmatched")
+                period = ""
+                if b"period=" in scope.get("query_string", b""):
+                    period = parse_qs(scope["query_string"].decode("latin-1")).get("period", [""])[0]
+                    if period not in self.periods:
+                        period = ""
+                http_request_seconds.labels(path, period, str(response["status"])).observe(time.perf_counter() - started)
@@ -1,46 +1,239 @@
 import json
+import logging
+import queue
+import re
 import threading
-from typing import Optional
+from typing import List, Optional, Tuple
 
 import paho.mqtt.client as mqtt
 
 from .alerts_store import alerts_store
+from .anomaly import Reading, anomaly_detector
 from .config import settings
-from .db import write_measurement
+from .db import measurement_fields, payload_time, write_measurement
+from .events import event_hub
+from .latest_store import latest_store
+from .metrics import (
+    ingest_decode_failures,
+    ingest_dropped,
+    ingest_errors,
+    ingest_messages,
+    mqtt_connects,
+    mqtt_disconnects,
+    mqtt_reconnects,
+)
+from .rules import rule_engine
+
+# Flat single-site topics from the original simulator; readings on them belong to the default grid
+LEGACY_DATA_TOPIC = "microgrid/data"
+LEGACY_ALERTS_TOPIC = "microgrid/alerts"
+# Device of legacy readings whose payload names none
+LEGACY_DEVICE_ID = "legacy"
+
+TELEMETRY_TOPIC = "microgrid/+/device/+/telemetry"
+ALERTS_TOPIC = "microgrid/+/alerts"
+
+# Grid and device ids end up in Influx tags and Flux filters, so keep them to a safe alphabet
+ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+TELEMETRY = "telemetry"
+ALERT = "alert"
+
+# Most messages a worker takes off its queue at once
+WORKER_BATCH_SIZE = 256
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+def topic_filter(topic: str, kind: str) -> str:
+    """Subscription filter a routed topic matched; keeps metric labels to a fixed set."""
+    if topic in (LEGACY_DATA_TOPIC, LEGACY_ALERTS_TOPIC):
+        return topic
+    return TELEMETRY_TOPIC if kind == TELEMETRY else ALERTS_TOPIC
+
+
+def parse_topic(topic: str) -> Optional[Tuple[str, str, Optional[str]]]:
+    """Map a topic to ``(kind, grid_id, device_id)``, or None if it is not ours.
+
+    The device of a legacy reading is not in its topic; it is taken from the payload.
+    """
+    if topic == LEGACY_DATA_TOPIC:
+        return TELEMETRY, settings.default_grid_id, None
+    if topic == LEGACY_ALERTS_TOPIC:
+        return ALERT, settings.default_grid_id, None
+    parts = topic.split("/")
+    if len(parts) == 5 and parts[0] == "microgrid" and parts[2] == "device" and parts[4] == "telemetry":
+        grid_id, device_id = parts[1], parts[3]
+        if ID_PATTERN.match(grid_id) and ID_PATTERN.match(device_id):
+            return TELEMETRY, grid_id, device_id
+    elif len(parts) == 3 and parts[0] == "microgrid" and parts[2] == "alerts":
+        if ID_PATTERN.match(parts[1]):
+            return ALERT, parts[1], None
+    return None
+
+
+def payload_device(payload: dict) -> Optional[str]:
+    """The payload's ``device_id`` if it is a usable id."""
+    device_id = payload.get("device_id")
+    return device_id if isinstance(device_id, str) and ID_PATTERN.match(device_id) else None
 
 
 class MQTTIngest:
-    def __init__(self) -> None:
+    """Subscribes to the microgrid topic tree and processes messages on per-grid workers.
+
+    The paho network thread only parses the topic and hands the raw payload
+    to the worker owning that grid, so a slow grid cannot stall the
+    subscription and messages from one device are always handled in order.
+    """
+
+    def __init__(self, workers: int = 4, queue_size: int = 10000) -> None:
         self._client: Optional[mqtt.Client] = None
         self._thread: Optional[threading.Thread] = None
+        self._worker_count = max(1, workers)
+        self._queue_size = queue_size
+        self._queues: List["queue.Queue"] = []
+        self._workers: List[threading.Thread] = []
+        self._connected_before = False
 
     def _on_connect(self, client, userdata, flags, reason_code, properties=None):
-        client.subscribe("microgrid/data")
-        client.subscribe("microgrid/alerts")
+        if reason_code.is_failure:
+            return
+        mqtt_connects.inc()
+        if self._connected_before:
+            mqtt_reconnects.inc()
+        self._connected_before = True
+        client.subscribe([(TELEMETRY_TOPIC, 0), (ALERTS_TOPIC, 0), (LEGACY_DATA_TOPIC, 0), (LEGACY_ALERTS_TOPIC, 0)])
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        mqtt_disconnects.inc()
 
     def _on_message(self, client, userdata, msg):
-        topic = msg.topic
+        route = parse_topic(msg.topic)
+        if route is None or not self._queues:
+            return
+        kind, grid_id, device_id = route
+        topic = topic_filter(msg.topic, kind)
+        ingest_messages.labels(topic).inc()
+        partition = self._queues[hash(grid_id) % len(self._queues)]
+        try:
+            partition.put_nowait((kind, topic, grid_id, device_id, msg.payload))
+        except queue.Full:
+            ingest_dropped.inc()
+
+    def _work(self, partition: "queue.Queue") -> None:
+        while True:
+            # Take whatever has queued up behind the first message, so readings can be
+            # scored for anomalies as one vectorized batch
+            items = [partition.get()]
+            while len(items) < WORKER_BATCH_SIZE and items[-1] is not _STOP:
+                try:
+                    items.append(partition.get_nowait())
+                except queue.Empty:
+                    break
+            readings: List[Reading] = []
+            # A message that cannot be processed is logged and counted, never allowed to end the worker
+            for item in items:
+                if item is _STOP:
+                    break
+                try:
+                    self._handle(item, readings)
+                except Exception:
+                    ingest_errors.labels("message").inc()
+                    logger.exception("Failed to process message for grid %s", item[2])
+            if readings:
+                try:
+                    for anomaly in anomaly_detector.observe(readings):
+                        self._record_alert(
+                            anomaly.grid_id, anomaly.device_id, anomaly.message, anomaly.timestamp.isoformat(), anomaly.severity
+                        )
+                except Exception:
+                    ingest_errors.labels("anomaly").inc()
+                    logger.exception("Failed to score %d readings for anomalies", len(readings))
+            if items[-1] is _STOP:
+                return
+
+    def _handle(self, item: tuple, readings: List[Reading]) -> None:
+        kind, topic, grid_id, device_id, raw = item
         try:
-            payload = json.loads(msg.payload.decode("utf-8"))
+            payload = json.loads(raw.decode("utf-8"))
         except Exception:
+            payload = None
+        if not isinstance(payload, dict):
+            ingest_decode_failures.labels(topic).inc()
             return
-        if topic == "microgrid/data":
-            try:
-                write_measurement(payload)
-            except Exception:
-                pass
-        elif topic == "microgrid/alerts":
-            message = payload.get("message")
-            timestamp = payload.get("timestamp")
-            if message and timestamp:
-                alerts_store.add(message=message, timestamp=timestamp)
+        if kind == TELEMETRY:
+            self._handle_telemetry(topic, grid_id, device_id, payload, readings)
+        else:
+            self._handle_alert(topic, grid_id, payload)
+
+    def _handle_telemetry(
+        self, topic: str, grid_id: str, device_id: Optional[str], payload: dict, readings: List[Reading]
+    ) -> None:
+        if device_id is None:
+            device_id = payload_device(payload) or LEGACY_DEVICE_ID
+        try:
+            fields = measurement_fields(payload)
+            timestamp = payload_time(payload)
+        except (TypeError, ValueError):
+            ingest_decode_failures.labels(topic).inc()
+            return
+        latest_store.update(grid_id, device_id, fields, timestamp)
+        event_hub.publish({
+            "type": "measurement",
+            "grid_id": grid_id,
+            "device_id": device_id,
+            **fields,
+            "timestamp": timestamp.isoformat(),
+        })
+        # A reading that does not fit in the write queue is counted as dropped by the batch writer
+        write_measurement(fields, timestamp, grid_id, device_id)
+        # Rules see the raw reading, which carries metrics (temperature, irradiance) not written to Influx
+        for firing in rule_engine.evaluate(grid_id, device_id, payload, timestamp):
+            self._record_alert(grid_id, device_id, firing.message, timestamp.isoformat(), firing.severity)
+        if settings.anomaly_enabled:
+            readings.append((grid_id, device_id, timestamp, payload))
+
+    def _handle_alert(self, topic: str, grid_id: str, payload: dict) -> None:
+        message = payload.get("message")
+        timestamp = payload.get("timestamp")
+        if not (isinstance(message, str) and message and isinstance(timestamp, str) and timestamp):
+            ingest_decode_failures.labels(topic).inc()
+            return
+        self._record_alert(grid_id, payload_device(payload), message, timestamp, str(payload.get("severity", "warning")))
+
+    def _record_alert(
+        self, grid_id: str, device_id: Optional[str], message: str, timestamp: str, severity: str
+    ) -> None:
+        try:
+            alert = alerts_store.add(
+                message=message,
+                timestamp=timestamp,
+                grid_id=grid_id,
+                device_id=device_id,
+                severity=severity,
+            )
+        except ValueError:
+            return
+        # Repeats of an open alert only bump its count; subscribers hear about new ones
+        if alert.count == 1:
+            event_hub.publish({"type": "alert", **alert.__dict__})
 
     def start(self) -> None:
         if self._client is not None:
             return
+        self._queues = [queue.Queue(maxsize=self._queue_size) for _ in range(self._worker_count)]
+        self._workers = [
+            threading.Thread(target=self._work, args=(q,), name=f"ingest-worker-{i}", daemon=True)
+            for i, q in enumerate(self._queues)
+        ]
+        for worker in self._workers:
+            worker.start()
         self._client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
         self._client.on_connect = self._on_connect
         self._client.on_message = self._on_message
+        self._client.on_disconnect = self._on_disconnect
         self._client.connect(settings.mqtt_host, settings.mqtt_port, keepalive=60)
         self._thread = threading.Thread(target=self._client.loop_forever, daemon=True)
         self._thread.start()
@@ -49,6 +242,19 @@ class MQTTIngest:
         if self._client is not None:
             self._client.disconnect()
             self._client = None
+        for partition in self._queues:
+            partition.put(_STOP)
+        for worker in self._workers:
+            worker.join(timeout=5)
+        self._queues = []
+        self._workers = []
+
+    def stats(self) -> dict:
+        return {
+            "workers": self._worker_count,
+            "queued": [q.qsize() for q in self._queues],
+            "dropped": int(ingest_dropped.value()),
+        }
 
 
-ingest = MQTTIngest()
+ingest = MQTTIngest(workers=settings.ingest_workers, queue_size=settings.ingest_queue_size)
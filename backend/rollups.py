@@ -0,0 +1,284 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROLLUP_MEASUREMENT = "microgrid_rollup"
+METRICS = ("consumption_kW", "generation_kW", "battery_soc")
+
+# How a grid's value of a metric combines its devices' values, in realtime KPIs, raw series and
+# rollups alike: power adds up across devices, state of charge is averaged
+GRID_AGGREGATION = {"consumption_kW": "sum", "generation_kW": "sum", "battery_soc": "mean"}
+
+
+@dataclass(frozen=True)
+class Tier:
+    name: str
+    seconds: int
+
+
+TIERS = (Tier("1m", 60), Tier("5m", 300), Tier("1h", 3600))
+
+# A tier serves a query only when each output window spans at least this many
+# of its buckets, so rounding the window up to whole buckets costs at most 1/N
+# of the point budget.
+MIN_BUCKETS_PER_WINDOW = 4
+
+# Emitted per finished bucket: tier, grid, bucket start, metric -> (min, mean, max)
+Emit = Callable[[Tier, str, datetime, Dict[str, Tuple[float, float, float]]], None]
+
+
+def plan_tier(every: int) -> Optional[Tier]:
+    """Coarsest rollup tier able to serve windows of ``every`` seconds, or None for raw data."""
+    chosen = None
+    for tier in TIERS:
+        if tier.seconds * MIN_BUCKETS_PER_WINDOW <= every:
+            chosen = tier
+    return chosen
+
+
+def tier_window(every: int, tier: Tier) -> int:
+    # Windows are whole multiples of the tier so no bucket straddles two windows
+    return math.ceil(every / tier.seconds) * tier.seconds
+
+
+def combine_devices(metric: str, values: List[float]) -> float:
+    """A grid's value of ``metric`` from one value per device (see ``GRID_AGGREGATION``)."""
+    total = sum(values)
+    return total if GRID_AGGREGATION.get(metric) == "sum" else total / len(values)
+
+
+class _Bucket:
+    __slots__ = ("stats",)
+
+    def __init__(self) -> None:
+        # device -> metric -> [min, max, sum, count]
+        self.stats: Dict[str, Dict[str, List[float]]] = {}
+
+    def add(self, device_id: str, fields: Dict[str, float]) -> None:
+        stats = self.stats.get(device_id)
+        if stats is None:
+            stats = self.stats[device_id] = {}
+        for metric, value in fields.items():
+            acc = stats.get(metric)
+            if acc is None:
+                stats[metric] = [value, value, value, 1]
+            else:
+                if value < acc[0]:
+                    acc[0] = value
+                if value > acc[1]:
+                    acc[1] = value
+                acc[2] += value
+                acc[3] += 1
+
+    def values(self) -> Dict[str, Tuple[float, float, float]]:
+        """Grid-level (min, mean, max) per metric, combining each device's own min, mean and max."""
+        per_metric: Dict[str, List[List[float]]] = {}
+        for stats in self.stats.values():
+            for metric, acc in stats.items():
+                per_metric.setdefault(metric, []).append(acc)
+        return {
+            metric: (
+                combine_devices(metric, [acc[0] for acc in accs]),
+                combine_devices(metric, [acc[2] / acc[3] for acc in accs]),
+                combine_devices(metric, [acc[1] for acc in accs]),
+            )
+            for metric, accs in per_metric.items()
+        }
+
+
+class _GridState:
+    __slots__ = ("open", "max_seen", "touched", "rolled_until")
+
+    def __init__(self) -> None:
+        # tier name -> bucket start (epoch seconds) -> bucket
+        self.open: Dict[str, Dict[int, _Bucket]] = {tier.name: {} for tier in TIERS}
+        self.max_seen = 0.0
+        self.touched = 0.0
+        # tier name -> end of the last bucket emitted (epoch seconds)
+        self.rolled_until: Dict[str, float] = {}
+
+
+class RollupAggregator:
+    """Incrementally rolls ingested readings up into per-grid min/mean/max buckets.
+
+    Every reading updates the open bucket of each tier for its grid. Buckets
+    keep statistics per device and combine them when emitted, so a grid's
+    bucket mean is the sum (or, for state of charge, the average) of its
+    devices' means, and its min and max combine the devices' minimums and
+    maximums the same way. A bucket
+    is finished once readings ``grace`` seconds past its end have arrived for
+    that grid, or once the grid has been silent for a bucket length plus
+    ``grace``. Finished buckets are handed to ``emit`` and the grid's
+    rolled-up watermark for the tier advances; readings older than the
+    watermark arrive too late and only count towards ``late``.
+    """
+
+    def __init__(self, emit: Emit, grace: float = 10.0, sweep_interval: float = 1.0) -> None:
+        self._emit = emit
+        self._grace = grace
+        self._sweep_interval = sweep_interval
+        self._grids: Dict[str, _GridState] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self.late = 0
+        self.emitted = 0
+
+    def add(self, grid_id: str, device_id: str, fields: Dict[str, float], timestamp: datetime) -> None:
+        ts = timestamp.timestamp()
+        with self._lock:
+            state = self._grids.get(grid_id)
+            if state is None:
+                state = self._grids[grid_id] = _GridState()
+            state.touched = time.monotonic()
+            if ts > state.max_seen:
+                state.max_seen = ts
+            for tier in TIERS:
+                if ts < state.rolled_until.get(tier.name, 0.0):
+                    self.late += 1
+                    continue
+                start = int(ts // tier.seconds) * tier.seconds
+                buckets = state.open[tier.name]
+                bucket = buckets.get(start)
+                if bucket is None:
+                    bucket = buckets[start] = _Bucket()
+                bucket.add(device_id, fields)
+
+    def rolled_until(self, tier: Tier, grid_id: str) -> Optional[datetime]:
+        """End of the newest bucket of ``tier`` emitted for ``grid_id`` by this process."""
+        with self._lock:
+            state = self._grids.get(grid_id)
+            until = state.rolled_until.get(tier.name) if state is not None else None
+        return datetime.fromtimestamp(until, timezone.utc) if until is not None else None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="rollup-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sweeping and emit every open bucket, including partial ones."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.sweep(final=True)
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self._sweep_interval):
+            self.sweep()
+
+    def sweep(self, final: bool = False) -> None:
+        now = time.monotonic()
+        finished = []
+        with self._lock:
+            for grid_id, state in self._grids.items():
+                for tier in TIERS:
+                    buckets = state.open[tier.name]
+                    if not buckets:
+                        continue
+                    idle = now - state.touched >= tier.seconds + self._grace
+                    watermark = state.max_seen - self._grace
+                    for start in sorted(buckets):
+                        end = start + tier.seconds
+                        if not (final or idle or end <= watermark):
+                            break
+                        finished.append((tier, grid_id, start, buckets.pop(start)))
+                        state.rolled_until[tier.name] = end
+        for tier, grid_id, start, bucket in finished:
+            self._emit(tier, grid_id, datetime.fromtimestamp(start, timezone.utc), bucket.values())
+        self.emitted += len(finished)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            open_buckets = sum(len(b) for state in self._grids.values() for b in state.open.values())
+            grids = len(self._grids)
+        return {"grids": grids, "open_buckets": open_buckets, "emitted": self.emitted, "late": self.late}
+
+
+class RollupCoverage:
+    """Persisted start of the time range rollups cover.
+
+    Raw data older than this was written before rollups existed (or while
+    they were disabled), so queries read raw data for that part of a range
+    until a backfill extends the coverage. The file holds
+    ``{"since": <epoch seconds>}``; a missing or unreadable file means no
+    coverage. It is re-read when it changes, since backfills run as a
+    separate process.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._since: Optional[float] = None
+
+    def since(self) -> Optional[datetime]:
+        try:
+            mtime = os.path.getmtime(self._path)
+        except OSError:
+            return None
+        with self._lock:
+            if mtime != self._mtime:
+                self._since = self._read()
+                self._mtime = mtime
+            since = self._since
+        return datetime.fromtimestamp(since, timezone.utc) if since is not None else None
+
+    def _read(self) -> Optional[float]:
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                return float(json.load(f)["since"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def extend(self, since: datetime) -> None:
+        """Record that rollups exist from ``since`` on, unless they already reach further back."""
+        ts = since.timestamp()
+        with self._lock:
+            current = self._read()
+            if current is not None and current <= ts:
+                return
+            tmp = f"{self._path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"since": ts}, f)
+            os.replace(tmp, self._path)
+
+    def reset(self) -> None:
+        """Forget the coverage, e.g. while ingest is not rolling readings up."""
+        with self._lock:
+            try:
+                os.remove(self._path)
+            except FileNotFoundError:
+                pass
+
+
+def _period(value: str) -> int:
+    match = re.fullmatch(r"(\d+)([smhd])", value)
+    if not match:
+        raise ValueError(value)
+    return int(match.group(1)) * {"s": 1, "m": 60, "h": 3600, "d": 86400}[match.group(2)]
+
+
+def main() -> None:
+    import argparse
+
+    from .db import backfill_rollups
+
+    parser = argparse.ArgumentParser(description="Compute rollup tiers from raw data already in Influx.")
+    parser.add_argument("--period", default="30d", type=_period, help="how far back to backfill, e.g. 7d or 30d")
+    args = parser.parse_args()
+    queries = backfill_rollups(args.period)
+    print(f"Backfilled {', '.join(tier.name for tier in TIERS)} rollups over {args.period}s ({queries} queries)")
+
+
+if __name__ == "__main__":
+    main()
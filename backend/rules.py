@@ -0,0 +1,262 @@
+import json
+import operator
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import settings
+
+OPERATORS: Dict[str, Callable[[float, float], bool]] = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+SEVERITIES = ("info", "warning", "critical")
+
+# A compiled condition: (reading, per-device slots, timestamp in epoch seconds) -> bool
+Condition = Callable[[Dict[str, Any], List[Any], float], bool]
+
+
+class RuleError(ValueError):
+    pass
+
+
+@dataclass
+class Rule:
+    name: str
+    message: str
+    severity: str
+    condition: Condition
+    for_seconds: float
+    # Index of this rule's first slot in a device's state list
+    offset: int
+
+
+@dataclass
+class RuleSet:
+    rules: List[Rule]
+    size: int
+    version: int
+
+
+@dataclass
+class Firing:
+    rule: str
+    message: str
+    severity: str
+
+
+def _number(value: Any, where: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RuleError(f"{where}: expected a number, got {value!r}")
+    return float(value)
+
+
+def _compile(spec: Any, where: str, slots: List[int]) -> Condition:
+    """Compile one condition node; ``slots[0]`` is the next free state slot and is advanced."""
+    if not isinstance(spec, dict):
+        raise RuleError(f"{where}: condition must be an object")
+    if "all" in spec or "any" in spec:
+        combinator = "all" if "all" in spec else "any"
+        parts = spec[combinator]
+        if not isinstance(parts, list) or not parts:
+            raise RuleError(f"{where}: '{combinator}' needs a non-empty list")
+        children = [_compile(part, f"{where}.{combinator}[{i}]", slots) for i, part in enumerate(parts)]
+        if combinator == "all":
+            # Every child runs so rate-of-change state stays current
+            return lambda r, s, t: all([child(r, s, t) for child in children])
+        return lambda r, s, t: any([child(r, s, t) for child in children])
+
+    metric = spec.get("metric")
+    if not isinstance(metric, str) or not metric:
+        raise RuleError(f"{where}: 'metric' is required")
+    value = _number(spec.get("value"), f"{where}.value")
+
+    if "rate" in spec:
+        # Change per second against the previous sample of this metric
+        compare = OPERATORS.get(spec["rate"])
+        if compare is None:
+            raise RuleError(f"{where}: unknown operator {spec['rate']!r}")
+        slot = slots[0]
+        slots[0] += 1
+
+        def rate(r: Dict[str, Any], s: List[Any], t: float) -> bool:
+            current = r.get(metric)
+            if not isinstance(current, (int, float)):
+                return False
+            previous = s[slot]
+            s[slot] = (t, current)
+            if previous is None or t <= previous[0]:
+                return False
+            return compare((current - previous[1]) / (t - previous[0]), value)
+
+        return rate
+
+    compare = OPERATORS.get(spec.get("op"))
+    if compare is None:
+        raise RuleError(f"{where}: unknown operator {spec.get('op')!r}")
+
+    def threshold(r: Dict[str, Any], s: List[Any], t: float) -> bool:
+        current = r.get(metric)
+        return isinstance(current, (int, float)) and compare(current, value)
+
+    return threshold
+
+
+def compile_rules(specs: Any, version: int) -> RuleSet:
+    if not isinstance(specs, list):
+        raise RuleError("rules file must contain a list of rules")
+    rules: List[Rule] = []
+    slots = [0]
+    names = set()
+    for i, spec in enumerate(specs):
+        where = f"rules[{i}]"
+        if not isinstance(spec, dict):
+            raise RuleError(f"{where}: rule must be an object")
+        name = spec.get("name")
+        message = spec.get("message")
+        if not isinstance(name, str) or not name or name in names:
+            raise RuleError(f"{where}: 'name' is required and must be unique")
+        if not isinstance(message, str) or not message:
+            raise RuleError(f"{where}: 'message' is required")
+        severity = spec.get("severity", "warning")
+        if severity not in SEVERITIES:
+            raise RuleError(f"{where}: severity must be one of {list(SEVERITIES)}")
+        for_seconds = _number(spec.get("for_seconds", 0), f"{where}.for_seconds")
+        names.add(name)
+        offset = slots[0]
+        # Slot 0 of every rule tracks when its condition started holding and whether it fired
+        slots[0] += 1
+        condition = _compile(spec.get("when"), f"{where}.when", slots)
+        rules.append(Rule(name, message, severity, condition, for_seconds, offset))
+    return RuleSet(rules=rules, size=slots[0], version=version)
+
+
+class RuleEngine:
+    """Evaluates declarative alert rules against every telemetry reading.
+
+    Rules are compiled once into closures. Each device keeps a flat list of
+    state slots (a few per rule), so evaluation is O(1) per rule per reading.
+    The rules file is re-read when its mtime changes, checked at most every
+    ``reload_interval`` seconds; a file that fails to compile leaves the
+    previous rules in place. State for a device is reset when the rules change.
+    State is kept for at most ``max_devices`` devices; past that the device
+    seen least recently loses its state (its episodes start over).
+    """
+
+    def __init__(self, path: Optional[str], reload_interval: float = 5.0, max_devices: int = 10000) -> None:
+        self._path = path
+        self._reload_interval = reload_interval
+        self._max_devices = max(1, max_devices)
+        self._ruleset = RuleSet(rules=[], size=0, version=0)
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        # Guards the LRU order of _state, which ingest workers of different grids share
+        self._state_lock = threading.Lock()
+        # (grid_id, device_id) -> (ruleset version, state slots), least recently seen first
+        self._state: "OrderedDict[Tuple[str, str], Tuple[int, List[Any]]]" = OrderedDict()
+        self.error: Optional[str] = None
+        self.evaluated = 0
+        self.fired = 0
+        self.evicted = 0
+        if path:
+            self.reload()
+
+    def reload(self) -> bool:
+        """Re-read and compile the rules file. Returns False (keeping old rules) on error."""
+        if not self._path:
+            return False
+        with self._lock:
+            try:
+                mtime = os.path.getmtime(self._path)
+                with open(self._path, "r", encoding="utf-8") as f:
+                    specs = json.load(f)
+                self._ruleset = compile_rules(specs, self._ruleset.version + 1)
+            except (OSError, ValueError) as e:
+                self.error = f"{type(e).__name__}: {e}"
+                return False
+            self._mtime = mtime
+            self.error = None
+            return True
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self._reload_interval
+        try:
+            mtime = os.path.getmtime(self._path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.reload()
+
+    def evaluate(self, grid_id: str, device_id: str, reading: Dict[str, Any], timestamp: datetime) -> List[Firing]:
+        """Feed one reading for a device; returns the rules that fire on it.
+
+        A rule fires once when its condition has held for ``for_seconds`` and
+        re-arms when the condition stops holding. Readings of one device must be
+        fed in order from a single thread, which the grid-partitioned ingest
+        workers guarantee.
+        """
+        if self._path:
+            self._maybe_reload()
+        ruleset = self._ruleset
+        if not ruleset.rules:
+            return []
+        key = (grid_id, device_id)
+        with self._state_lock:
+            entry = self._state.get(key)
+            if entry is not None:
+                self._state.move_to_end(key)
+            if entry is None or entry[0] != ruleset.version:
+                entry = (ruleset.version, [None] * ruleset.size)
+                self._state[key] = entry
+                if len(self._state) > self._max_devices:
+                    self._state.popitem(last=False)
+                    self.evicted += 1
+        state = entry[1]
+        t = timestamp.timestamp()
+        firings: List[Firing] = []
+        for rule in ruleset.rules:
+            holds = rule.condition(reading, state, t)
+            # Rule slot: None while the condition does not hold, else [since, fired]
+            episode = state[rule.offset]
+            if not holds:
+                state[rule.offset] = None
+                continue
+            if episode is None:
+                episode = state[rule.offset] = [t, False]
+            if not episode[1] and t - episode[0] >= rule.for_seconds:
+                episode[1] = True
+                firings.append(Firing(rule.name, rule.message, rule.severity))
+        self.evaluated += 1
+        self.fired += len(firings)
+        return firings
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rules": len(self._ruleset.rules),
+            "version": self._ruleset.version,
+            "devices": len(self._state),
+            "evaluated": self.evaluated,
+            "fired": self.fired,
+            "evicted": self.evicted,
+            "error": self.error,
+        }
+
+
+rule_engine = RuleEngine(
+    settings.rules_path or None,
+    reload_interval=settings.rules_reload_interval,
+    max_devices=settings.rules_max_devices,
+)
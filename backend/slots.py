@@ -0,0 +1,83 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict
+
+
+class QuerySlots:
+    """Concurrency cap for Influx queries that serves interactive callers before background ones.
+
+    Behaves like a semaphore of ``size`` slots, except that a freed slot goes
+    to the longest-waiting interactive caller before any background caller,
+    and background callers (exports) never hold more than ``background_limit``
+    slots at once, so dashboards always have slots left to queue for.
+    Must be used from a single event loop.
+    """
+
+    def __init__(self, size: int, background_limit: int) -> None:
+        self.size = max(1, size)
+        self.background_limit = max(1, min(background_limit, self.size))
+        self._free = self.size
+        self._background = 0
+        # background flag -> futures of waiting callers, oldest first
+        self._waiters: Dict[bool, Deque[asyncio.Future]] = {False: deque(), True: deque()}
+
+    def _eligible(self, background: bool) -> bool:
+        return self._free > 0 and (not background or self._background < self.background_limit)
+
+    def _take(self, background: bool) -> None:
+        self._free -= 1
+        if background:
+            self._background += 1
+
+    async def acquire(self, background: bool = False) -> None:
+        queue = self._waiters[background]
+        # Interactive callers only queue behind each other; background callers behind everyone
+        ahead = queue or (background and self._waiters[False])
+        if not ahead and self._eligible(background):
+            self._take(background)
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        try:
+            await waiter
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # Granted a slot just as the caller was cancelled; pass it on
+                self.release(background)
+            elif waiter in queue:
+                queue.remove(waiter)
+            raise
+
+    def release(self, background: bool = False) -> None:
+        self._free += 1
+        if background:
+            self._background -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        for background in (False, True):
+            queue = self._waiters[background]
+            while queue and self._eligible(background):
+                waiter = queue.popleft()
+                if waiter.done():
+                    continue
+                self._take(background)
+                waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, background: bool = False) -> AsyncIterator[None]:
+        await self.acquire(background)
+        try:
+            yield
+        finally:
+            self.release(background)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": self.size,
+            "in_use": self.size - self._free,
+            "background": self._background,
+            "waiting": len(self._waiters[False]),
+            "background_waiting": len(self._waiters[True]),
+        }
@@ -0,0 +1,297 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_PREFIX = "segment-"
+_SUFFIX = ".lp"
+
+
+class RejectedError(Exception):
+    """Raised by ``send`` when the store refuses a batch outright (e.g. a malformed point).
+
+    Such batches are not spooled: replaying them would fail the same way.
+    """
+
+
+class Spool:
+    """Write-ahead buffer on local disk for line-protocol batches Influx cannot take.
+
+    ``write`` sends a batch straight to Influx through ``send``. If that fails
+    (store down, timeout), the batch is appended to the newest segment file
+    instead and the spool goes into outage mode: later batches are appended
+    without trying Influx, so ingest does not stall on timeouts. A segment is
+    sealed and a new one started once it reaches ``segment_bytes`` or is
+    ``segment_age`` seconds old. A background thread probes every
+    ``retry_interval`` seconds by replaying the oldest sealed segment, or by
+    sending the first lines of the open one without sealing it; once that
+    succeeds, live batches go to Influx again, the open segment is sealed and
+    the backlog is replayed oldest first in batches of ``replay_batch`` lines,
+    at most ``replay_rate`` lines per second.
+
+    Lines carry their original timestamps, so replay is idempotent: a segment
+    that was partly replayed before a restart is sent again in full. When the
+    segments would exceed ``max_bytes``, the oldest are deleted and counted as
+    ``dropped``. Batches ``send`` rejects with ``RejectedError`` are counted
+    as ``rejected`` instead of being spooled. An empty ``directory`` disables spooling and ``write`` raises
+    whatever ``send`` raises.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        send: Callable[[List[str]], None],
+        max_bytes: int = 1024 * 1024 * 1024,
+        segment_bytes: int = 16 * 1024 * 1024,
+        segment_age: float = 300.0,
+        replay_batch: int = 5000,
+        replay_rate: float = 20000.0,
+        retry_interval: float = 5.0,
+    ) -> None:
+        self._directory = directory
+        self._send = send
+        self._max_bytes = max_bytes
+        self._segment_bytes = max(1, min(segment_bytes, max_bytes))
+        self._segment_age = segment_age
+        self._replay_batch = max(1, replay_batch)
+        self._replay_rate = replay_rate
+        self._retry_interval = retry_interval
+        self._lock = threading.Lock()
+        # Segment sequence number -> [bytes, lines], oldest first; the last one is open for appends
+        self._segments: Dict[int, List[int]] = {}
+        self._next_seq = 0
+        self._file = None
+        # Monotonic time the open segment was started
+        self._opened = 0.0
+        self._outage = False
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.spooled = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.replay_rate = 0.0
+        self.last_error: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._directory)
+
+    def write(self, lines: List[str]) -> None:
+        if not self.enabled:
+            self._send(lines)
+            return
+        if not self._outage:
+            try:
+                self._send(lines)
+                return
+            except RejectedError:
+                self.rejected += len(lines)
+                raise
+            except Exception as e:
+                self._enter_outage(e)
+        self._append(lines)
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        os.makedirs(self._directory, exist_ok=True)
+        self._load_segments()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="influx-spool-replay", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop replaying; whatever is still spooled is replayed after the next start."""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._lock:
+            self._close_segment()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            segments = len(self._segments)
+            pending_bytes = sum(size for size, _ in self._segments.values())
+            pending_lines = sum(lines for _, lines in self._segments.values())
+        return {
+            "enabled": self.enabled,
+            "outage": self._outage,
+            "segments": segments,
+            "bytes": pending_bytes,
+            "max_bytes": self._max_bytes,
+            "pending_lines": pending_lines,
+            "spooled": self.spooled,
+            "replayed": self.replayed,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "replay_lines_per_second": round(self.replay_rate, 1),
+            "last_error": self.last_error,
+        }
+
+    def _enter_outage(self, error: Exception) -> None:
+        self._outage = True
+        self.last_error = f"{type(error).__name__}: {error}"
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self._directory, f"{_PREFIX}{seq:012d}{_SUFFIX}")
+
+    def _load_segments(self) -> None:
+        # Segments left by a previous run are replayed like any other backlog
+        found = []
+        for name in os.listdir(self._directory):
+            if name.startswith(_PREFIX) and name.endswith(_SUFFIX):
+                try:
+                    found.append(int(name[len(_PREFIX):-len(_SUFFIX)]))
+                except ValueError:
+                    continue
+        with self._lock:
+            for seq in sorted(found):
+                path = self._path(seq)
+                with open(path, "rb") as f:
+                    lines = sum(1 for _ in f)
+                self._segments[seq] = [os.path.getsize(path), lines]
+                self._next_seq = max(self._next_seq, seq + 1)
+        if found:
+            self._wake.set()
+
+    def _append(self, lines: List[str]) -> None:
+        data = ("\n".join(lines) + "\n").encode()
+        with self._lock:
+            if (
+                self._file is None
+                or self._segments[self._next_seq - 1][0] + len(data) > self._segment_bytes
+                or time.monotonic() - self._opened >= self._segment_age
+            ):
+                self._close_segment()
+                self._enforce_cap(len(data))
+                seq = self._next_seq
+                self._next_seq += 1
+                os.makedirs(self._directory, exist_ok=True)
+                self._file = open(self._path(seq), "ab")
+                self._opened = time.monotonic()
+                self._segments[seq] = [0, 0]
+            else:
+                self._enforce_cap(len(data))
+            self._file.write(data)
+            self._file.flush()
+            segment = self._segments[self._next_seq - 1]
+            segment[0] += len(data)
+            segment[1] += len(lines)
+            self.spooled += len(lines)
+        self._wake.set()
+
+    def _close_segment(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _enforce_cap(self, incoming: int) -> None:
+        # Delete the oldest closed segments until the incoming data fits under the cap
+        total = sum(size for size, _ in self._segments.values())
+        for seq in list(self._segments):
+            if total + incoming <= self._max_bytes:
+                break
+            if self._file is not None and seq == self._next_seq - 1:
+                break
+            size, lines = self._segments.pop(seq)
+            self._unlink(seq)
+            total -= size
+            self.dropped += lines
+
+    def _unlink(self, seq: int) -> None:
+        try:
+            os.remove(self._path(seq))
+        except FileNotFoundError:
+            pass
+
+    def _oldest_segment(self) -> Optional[Tuple[int, bool]]:
+        """The oldest segment and whether it is sealed (ready to replay)."""
+        with self._lock:
+            if not self._segments:
+                return None
+            seq = next(iter(self._segments))
+            if self._file is not None and seq == self._next_seq - 1:
+                if self._outage:
+                    return seq, False
+                # Influx is back and nothing older is left: seal the segment being appended to
+                self._close_segment()
+            return seq, True
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            oldest = self._oldest_segment()
+            if oldest is None:
+                self.replay_rate = 0.0
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            seq, sealed = oldest
+            # Replaying the oldest segment (or probing with the open one) doubles as the health check
+            if not (self._replay(seq) if sealed else self._probe(seq)):
+                self._stopping.wait(self._retry_interval)
+
+    def _probe(self, seq: int) -> bool:
+        """Send the first lines of the open segment, leaving it open; success ends the outage.
+
+        They are sent again when the segment is replayed, which is harmless
+        since lines carry their timestamps.
+        """
+        lines: List[str] = []
+        try:
+            with open(self._path(seq), "rb") as f:
+                for line in f:
+                    if len(lines) >= self._replay_batch or not line.endswith(b"\n"):
+                        break
+                    if line.strip():
+                        lines.append(line[:-1].decode())
+        except FileNotFoundError:
+            pass
+        if lines:
+            try:
+                self._send(lines)
+            except RejectedError:
+                pass
+            except Exception as e:
+                self._enter_outage(e)
+                return False
+        self._outage = False
+        return True
+
+    def _replay(self, seq: int) -> bool:
+        """Replay one segment; on success delete it and end any outage."""
+        try:
+            with open(self._path(seq), "rb") as f:
+                # A crash can leave a torn last line; only complete lines are replayed
+                lines = [line.decode() for line in f.read().split(b"\n")[:-1] if line]
+        except FileNotFoundError:
+            lines = []
+        for i in range(0, len(lines), self._replay_batch):
+            if self._stopping.is_set():
+                return True
+            batch = lines[i:i + self._replay_batch]
+            started = time.monotonic()
+            try:
+                self._send(batch)
+            except RejectedError:
+                self.rejected += len(batch)
+                continue
+            except Exception as e:
+                self._enter_outage(e)
+                return False
+            self._outage = False
+            self.replayed += len(batch)
+            # Pace to replay_rate so catching up does not starve live writes
+            pause = len(batch) / self._replay_rate - (time.monotonic() - started) if self._replay_rate > 0 else 0.0
+            if pause > 0:
+                self._stopping.wait(pause)
+            self.replay_rate = len(batch) / max(time.monotonic() - started, 1e-6)
+        with self._lock:
+            if seq in self._segments:
+                self._segments.pop(seq)
+                self._unlink(seq)
+        self._outage = False
+        return True
@@ -0,0 +1,215 @@
+"""Minimal in-process MQTT 3.1.1 broker for benchmarks.
+
+Supports what the simulator and backend use: CONNECT, PUBLISH at QoS 0/1,
+SUBSCRIBE with ``+``/``#`` wildcards, UNSUBSCRIBE, PINGREQ and DISCONNECT.
+Messages are delivered to subscribers at QoS 0; nothing is retained or
+persisted. A subscriber whose socket buffer is over ``max_buffer`` bytes has
+further messages dropped, and the drops are counted.
+"""
+
+import asyncio
+import struct
+from typing import Dict, List, Optional, Set
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    pattern_parts = pattern.split("/")
+    topic_parts = topic.split("/")
+    for i, part in enumerate(pattern_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+def _remaining_length(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = n % 128
+        n //= 128
+        out.append(byte | 0x80 if n else byte)
+        if not n:
+            return bytes(out)
+
+
+def _publish_packet(topic: bytes, payload: bytes) -> bytes:
+    body = struct.pack("!H", len(topic)) + topic + payload
+    return bytes([PUBLISH << 4]) + _remaining_length(len(body)) + body
+
+
+class _Session(asyncio.Protocol):
+    def __init__(self, broker: "Broker") -> None:
+        self.broker = broker
+        self.transport: Optional[asyncio.Transport] = None
+        self.buffer = bytearray()
+        self.filters: Set[str] = set()
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def connection_lost(self, exc) -> None:
+        self.broker._remove(self)
+
+    def data_received(self, data: bytes) -> None:
+        self.buffer += data
+        buf = self.buffer
+        pos = 0
+        while True:
+            # Fixed header: type/flags byte and a 1-4 byte remaining length
+            if len(buf) - pos < 2:
+                break
+            length = 0
+            multiplier = 1
+            i = pos + 1
+            while True:
+                if i >= len(buf):
+                    length = -1
+                    break
+                byte = buf[i]
+                length += (byte & 0x7F) * multiplier
+                multiplier *= 128
+                i += 1
+                if not byte & 0x80:
+                    break
+            if length < 0 or len(buf) - i < length:
+                break
+            self._handle(buf[pos] >> 4, buf[pos] & 0x0F, bytes(buf[i:i + length]))
+            pos = i + length
+        if pos:
+            del buf[:pos]
+
+    def _handle(self, kind: int, flags: int, body: bytes) -> None:
+        if kind == PUBLISH:
+            (topic_len,) = struct.unpack_from("!H", body)
+            topic = body[2:2 + topic_len]
+            offset = 2 + topic_len
+            qos = (flags >> 1) & 0x03
+            if qos:
+                self.transport.write(bytes([PUBACK << 4, 2]) + body[offset:offset + 2])
+                offset += 2
+            self.broker._route(topic, body[offset:])
+        elif kind == CONNECT:
+            self.transport.write(bytes([CONNACK << 4, 2, 0, 0]))
+        elif kind == SUBSCRIBE:
+            packet_id = body[:2]
+            pos = 2
+            granted = bytearray()
+            while pos < len(body):
+                (n,) = struct.unpack_from("!H", body, pos)
+                self.filters.add(body[pos + 2:pos + 2 + n].decode())
+                pos += 2 + n + 1
+                granted.append(0)
+            self.broker._invalidate()
+            self.transport.write(bytes([SUBACK << 4]) + _remaining_length(2 + len(granted)) + packet_id + granted)
+        elif kind == UNSUBSCRIBE:
+            packet_id = body[:2]
+            pos = 2
+            while pos < len(body):
+                (n,) = struct.unpack_from("!H", body, pos)
+                self.filters.discard(body[pos + 2:pos + 2 + n].decode())
+                pos += 2 + n
+            self.broker._invalidate()
+            self.transport.write(bytes([UNSUBACK << 4, 2]) + packet_id)
+        elif kind == PINGREQ:
+            self.transport.write(bytes([PINGRESP << 4, 0]))
+        elif kind == DISCONNECT:
+            self.transport.close()
+
+
+class Broker:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, max_buffer: int = 64 * 1024 * 1024) -> None:
+        self.host = host
+        self.port = port
+        self.max_buffer = max_buffer
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self._sessions: Set[_Session] = set()
+        # topic -> subscribed sessions, rebuilt lazily after (un)subscribes
+        self._routes: Dict[bytes, List[_Session]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> int:
+        loop = asyncio.get_running_loop()
+        self._server = await loop.create_server(self._session, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for session in list(self._sessions):
+                session.transport.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._sessions),
+            "received": self.received,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+    def _session(self) -> _Session:
+        session = _Session(self)
+        self._sessions.add(session)
+        return session
+
+    def _remove(self, session: _Session) -> None:
+        self._sessions.discard(session)
+        self._invalidate()
+
+    def _invalidate(self) -> None:
+        self._routes.clear()
+
+    def _subscribers(self, topic: bytes) -> List[_Session]:
+        subscribers = self._routes.get(topic)
+        if subscribers is None:
+            name = topic.decode()
+            subscribers = [s for s in self._sessions if any(topic_matches(f, name) for f in s.filters)]
+            self._routes[topic] = subscribers
+        return subscribers
+
+    def _route(self, topic: bytes, payload: bytes) -> None:
+        self.received += 1
+        subscribers = self._subscribers(topic)
+        if not subscribers:
+            return
+        packet = _publish_packet(topic, payload)
+        for session in subscribers:
+            transport = session.transport
+            if transport.get_write_buffer_size() > self.max_buffer:
+                self.dropped += 1
+                continue
+            transport.write(packet)
+            self.delivered += 1
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the benchmark MQTT broker on its own.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    args = parser.parse_args()
+
+    async def serve() -> None:
+        broker = Broker(args.host, args.port)
+        port = await broker.start()
+        print(f"MQTT broker listening on {args.host}:{port}", flush=True)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+"""In-memory stand-in for the InfluxDB 2.x HTTP API, for benchmarks.
+
+Accepts line-protocol writes on ``/api/v2/write`` and records how long each
+point took to arrive after its own timestamp. ``/api/v2/query`` answers the
+Flux shapes the backend issues (``last()`` and ``aggregateWindow`` over one
+grid's raw or rollup fields, with raw device windows combined per grid, and
+the per-device ``pivot`` of exports) in
+annotated CSV, so the API can be benchmarked without a real Influx.
+``/sink/stats`` reports point counts and write lag.
+"""
+
+import argparse
+import gzip
+import random
+import re
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from benchmarks.stats import percentiles
+
+_PRECISION = {"ns": 1, "us": 1_000, "ms": 1_000_000, "s": 1_000_000_000}
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+_RANGE = re.compile(r'range\(start:\s*(?:-(\d+)([smhd])|time\(v:\s*"([^"]+)"\))')
+_STOP = re.compile(r'stop:\s*time\(v:\s*"([^"]+)"\)')
+_MEASUREMENT = re.compile(r'r\._measurement\s*==\s*"([^"]+)"')
+_TIER = re.compile(r'r\.tier\s*==\s*"([^"]+)"')
+_GRID = re.compile(r'r\.grid_id\s*==\s*"([^"]+)"')
+_FIELD = re.compile(r'r\._field\s*==\s*"([^"]+)"')
+_WINDOW = re.compile(r"aggregateWindow\(every:\s*(\d+)s,\s*fn:\s*(\w+)")
+# A branch combining device windows of some fields: filter, regroup, then a second aggregateWindow
+_BRANCH = re.compile(r"filter\(fn: \(r\) => ([^\n]*)\)\n\s*\|> group\([^\n]*\)\n\s*\|> aggregateWindow\(every:\s*\d+s,\s*fn:\s*(\w+)")
+_LAST = re.compile(r"\|>\s*last\(\)")
+_PIVOT = re.compile(r"\|>\s*pivot\(")
+
+# Points whose write lag is kept for percentiles
+LAG_SAMPLES = 200_000
+
+
+class Series:
+    """Append-only columns (time, value, device index); sorted lazily when a write arrives out of order."""
+
+    __slots__ = ("times", "values", "devices", "ordered")
+
+    def __init__(self) -> None:
+        self.times = array("q")
+        self.values = array("d")
+        self.devices = array("I")
+        self.ordered = True
+
+    def append(self, ts: int, value: float, device: int) -> None:
+        if self.times and ts < self.times[-1]:
+            self.ordered = False
+        self.times.append(ts)
+        self.values.append(value)
+        self.devices.append(device)
+
+    def sorted_columns(self) -> Tuple[array, array]:
+        if not self.ordered:
+            order = sorted(range(len(self.times)), key=self.times.__getitem__)
+            self.times = array("q", (self.times[i] for i in order))
+            self.values = array("d", (self.values[i] for i in order))
+            self.devices = array("I", (self.devices[i] for i in order))
+            self.ordered = True
+        return self.times, self.values
+
+
+class Sink:
+    def __init__(self) -> None:
+        # (measurement, tier, grid_id, field) -> all points of the grid, and device -> latest (ts, value)
+        self.series: Dict[Tuple[str, str, str, str], Series] = {}
+        self.latest: Dict[Tuple[str, str, str, str], Dict[str, Tuple[int, float]]] = {}
+        self.integer_fields = set()
+        # Device ids are interned so each stored point carries a small index
+        self.device_ids: List[str] = []
+        self._device_index: Dict[str, int] = {}
+        self.points = 0
+        self.writes = 0
+        self.bytes = 0
+        self.queries = 0
+        self.lags: List[float] = []
+        self._seen_lags = 0
+
+    def write(self, body: bytes, precision: str) -> None:
+        arrival = time.time_ns()
+        scale = _PRECISION.get(precision, 1)
+        self.writes += 1
+        self.bytes += len(body)
+        for line in body.decode().splitlines():
+            if not line or line.startswith("#"):
+                continue
+            series_key, fields, ts = line.rsplit(" ", 2)
+            measurement, *tag_pairs = series_key.split(",")
+            tags = dict(part.split("=", 1) for part in tag_pairs)
+            tier = tags.get("tier", "")
+            grid_id = tags.get("grid_id", "")
+            device_id = tags.get("device_id", "")
+            device = self._device_index.get(device_id)
+            if device is None:
+                device = self._device_index[device_id] = len(self.device_ids)
+                self.device_ids.append(device_id)
+            t = int(ts) * scale
+            for pair in fields.split(","):
+                name, raw = pair.split("=", 1)
+                if raw.endswith("i"):
+                    value = float(raw[:-1])
+                    self.integer_fields.add(name)
+                elif raw.startswith('"'):
+                    continue
+                else:
+                    value = float(raw)
+                key = (measurement, tier, grid_id, name)
+                series = self.series.get(key)
+                if series is None:
+                    series = self.series[key] = Series()
+                series.append(t, value, device)
+                latest = self.latest.setdefault(key, {})
+                current = latest.get(device_id)
+                if current is None or t >= current[0]:
+                    latest[device_id] = (t, value)
+            self.points += 1
+            if not tier:
+                # Rollup points are stamped with their bucket start, so only raw points show ingest lag
+                self._record_lag((arrival - t) / 1e9)
+
+    def _record_lag(self, lag: float) -> None:
+        # Reservoir sample so long runs keep a bounded, uniform sample
+        self._seen_lags += 1
+        if len(self.lags) < LAG_SAMPLES:
+            self.lags.append(lag)
+        else:
+            slot = random.randrange(self._seen_lags)
+            if slot < LAG_SAMPLES:
+                self.lags[slot] = lag
+
+    def query(self, flux: str) -> str:
+        self.queries += 1
+        if _PIVOT.search(flux):
+            return self._pivot_devices(flux) if '"device_id"' in flux else self._pivot_windows(flux)
+        grid = _GRID.search(flux)
+        fields = list(dict.fromkeys(_FIELD.findall(flux)))
+        start = _range_start(flux)
+        if grid is None or not fields or start is None:
+            raise ValueError("unsupported query")
+        grid_id = grid.group(1)
+        measurement = _MEASUREMENT.search(flux)
+        tier = _TIER.search(flux)
+        prefix = (measurement.group(1) if measurement else "microgrid", tier.group(1) if tier else "", grid_id)
+        stop = _range_stop(flux)
+        if _LAST.search(flux):
+            tables = []
+            for field in fields:
+                for device_id, (t, value) in self.latest.get((*prefix, field), {}).items():
+                    if start <= t < stop:
+                        tables.append((field, device_id, [(t, value)]))
+            return _csv_last(tables, self.integer_fields)
+        every, fn, combine = _windows(flux, fields)
+        rows = []
+        for field in fields:
+            series = self.series.get((*prefix, field))
+            if series is None:
+                continue
+            rows.extend(_grid_windows(series, start, stop, every, fn, combine.get(field)))
+        return _csv_series(rows)
+
+    def _pivot_devices(self, flux: str) -> str:
+        """Per-device rows with one column per field, over any number of grids (export queries)."""
+        grids = _GRID.findall(flux)
+        fields = _FIELD.findall(flux)
+        start = _range_start(flux)
+        if not grids or not fields or start is None:
+            raise ValueError("unsupported query")
+        stop = _range_stop(flux)
+        window = _WINDOW.search(flux)
+        every = int(window.group(1)) * 1_000_000_000 if window else 0
+        # (time, grid, device) -> field -> values in that row (one raw value, or a window's values)
+        rows: Dict[Tuple[int, str, str], Dict[str, List[float]]] = {}
+        for grid_id in grids:
+            for field in fields:
+                series = self.series.get(("microgrid", "", grid_id, field))
+                if series is None:
+                    continue
+                times, values = series.sorted_columns()
+                devices = series.devices
+                for i in range(bisect_left(times, start), bisect_left(times, stop)):
+                    t = times[i] - times[i] % every if every else times[i]
+                    row = rows.setdefault((t, grid_id, self.device_ids[devices[i]]), {})
+                    row.setdefault(field, []).append(values[i])
+        integer = {f for f in fields if f in self.integer_fields and not every}
+        lines = [
+            "#datatype,string,long,dateTime:RFC3339,string,string,"
+            + ",".join("long" if f in integer else "double" for f in fields),
+            "#group,false,false,false,false,false," + ",".join("false" for _ in fields),
+            "#default,_result,,,,," + ",".join("" for _ in fields),
+            ",result,table,_time,grid_id,device_id," + ",".join(fields),
+        ]
+        for (t, grid_id, device_id), row in sorted(rows.items()):
+            cells = []
+            for f in fields:
+                values = row.get(f)
+                if not values:
+                    cells.append("")
+                elif f in integer:
+                    cells.append(str(int(values[-1])))
+                else:
+                    cells.append(repr(sum(values) / len(values)))
+            lines.append(f",,0,{_rfc3339(t)},{grid_id},{device_id}," + ",".join(cells))
+        return "\r\n".join(lines) + "\r\n\r\n"
+
+    def _pivot_windows(self, flux: str) -> str:
+        """One grid's aggregated windows with one column per field (multi-metric historical queries)."""
+        grid = _GRID.search(flux)
+        fields = list(dict.fromkeys(_FIELD.findall(flux)))
+        start = _range_start(flux)
+        if grid is None or not fields or start is None:
+            raise ValueError("unsupported query")
+        measurement = _MEASUREMENT.search(flux)
+        tier = _TIER.search(flux)
+        prefix = (measurement.group(1) if measurement else "microgrid", tier.group(1) if tier else "", grid.group(1))
+        stop = _range_stop(flux)
+        every, fn, combine = _windows(flux, fields)
+        rows: Dict[int, Dict[str, float]] = {}
+        for field in fields:
+            series = self.series.get((*prefix, field))
+            if series is None:
+                continue
+            for t, value in _grid_windows(series, start, stop, every, fn, combine.get(field)):
+                rows.setdefault(t, {})[field] = value
+        lines = [
+            "#datatype,string,long,dateTime:RFC3339," + ",".join("double" for _ in fields),
+            "#group,false,false,false," + ",".join("false" for _ in fields),
+            "#default,_result,,," + ",".join("" for _ in fields),
+            ",result,table,_time," + ",".join(fields),
+        ]
+        for t in sorted(rows):
+            row = rows[t]
+            lines.append(f",,0,{_rfc3339(t)}," + ",".join(repr(row[f]) if f in row else "" for f in fields))
+        return "\r\n".join(lines) + "\r\n\r\n"
+
+    def stats(self) -> Dict:
+        return {
+            "points": self.points,
+            "writes": self.writes,
+            "bytes": self.bytes,
+            "queries": self.queries,
+            "series": len(self.series),
+            "write_lag_seconds": percentiles(self.lags),
+        }
+
+
+def _range_start(flux: str) -> Optional[int]:
+    match = _RANGE.search(flux)
+    if match is None:
+        return None
+    if match.group(3):
+        parsed = datetime.fromisoformat(match.group(3).replace("Z", "+00:00"))
+        return int(parsed.timestamp() * 1_000_000) * 1000
+    return time.time_ns() - int(match.group(1)) * _UNITS[match.group(2)] * 1_000_000_000
+
+
+def _range_stop(flux: str) -> int:
+    match = _STOP.search(flux)
+    if match is None:
+        return time.time_ns() + 1
+    parsed = datetime.fromisoformat(match.group(1).replace("Z", "+00:00"))
+    return int(parsed.timestamp() * 1_000_000) * 1000
+
+
+def _windows(flux: str, fields: List[str]) -> Tuple[int, str, Dict[str, str]]:
+    """Window length (ns), per-device fn, and per field the fn combining device windows (raw queries only)."""
+    windows = _WINDOW.findall(flux)
+    if not windows:
+        raise ValueError("unsupported query")
+    combine: Dict[str, str] = {}
+    if len(windows) > 1:
+        for condition, combine_fn in _BRANCH.findall(flux):
+            for field in _FIELD.findall(condition):
+                combine[field] = combine_fn
+        for field in fields:
+            combine.setdefault(field, windows[-1][1])
+    return int(windows[0][0]) * 1_000_000_000, windows[0][1], combine
+
+
+def _grid_windows(series: Series, start: int, stop: int, every: int, fn: str, combine: Optional[str]) -> List[Tuple[int, float]]:
+    times, values = series.sorted_columns()
+    i, end = bisect_left(times, start), bisect_left(times, stop)
+    if combine is None:
+        return _aggregate(times, values, i, end, every, fn)
+    # Each device's windows first, then one value per window across the devices
+    per_device: Dict[int, Tuple[array, array]] = {}
+    devices = series.devices
+    for k in range(i, end):
+        device_times, device_values = per_device.setdefault(devices[k], (array("q"), array("d")))
+        device_times.append(times[k])
+        device_values.append(values[k])
+    windows: Dict[int, List[float]] = {}
+    for device_times, device_values in per_device.values():
+        for t, value in _aggregate(device_times, device_values, 0, len(device_times), every, fn):
+            windows.setdefault(t, []).append(value)
+    return [(t, sum(v) if combine == "sum" else sum(v) / len(v)) for t, v in sorted(windows.items())]
+
+
+def _aggregate(times: array, values: array, i: int, end: int, every: int, fn: str) -> List[Tuple[int, float]]:
+    rows = []
+    while i < end:
+        window_start = times[i] - times[i] % every
+        j = min(bisect_left(times, window_start + every, i), end)
+        chunk = values[i:j]
+        if fn == "min":
+            value = min(chunk)
+        elif fn == "max":
+            value = max(chunk)
+        else:
+            value = sum(chunk) / len(chunk)
+        rows.append((window_start, value))
+        i = j
+    return rows
+
+
+def _rfc3339(ns: int) -> str:
+    seconds, rest = divmod(ns, 1_000_000_000)
+    stamp = datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+    return f"{stamp}.{rest:09d}Z"
+
+
+def _csv_series(rows: List[Tuple[int, float]]) -> str:
+    lines = [
+        "#datatype,string,long,dateTime:RFC3339,double",
+        "#group,false,false,false,false",
+        "#default,_result,,,",
+        ",result,table,_time,_value",
+    ]
+    lines.extend(f",,0,{_rfc3339(t)},{value!r}" for t, value in rows)
+    return "\r\n".join(lines) + "\r\n\r\n"
+
+
+def _csv_last(tables: List[Tuple[str, str, List[Tuple[int, float]]]], integer_fields) -> str:
+    blocks = []
+    for table, (field, device_id, rows) in enumerate(tables):
+        value_type = "long" if field in integer_fields else "double"
+        lines = [
+            f"#datatype,string,long,dateTime:RFC3339,{value_type},string,string,string",
+            "#group,false,false,false,false,true,true,true",
+            "#default,_result,,,,,,",
+            ",result,table,_time,_value,_field,_measurement,device_id",
+        ]
+        for t, value in rows:
+            rendered = int(value) if value_type == "long" else repr(value)
+            lines.append(f",,{table},{_rfc3339(t)},{rendered},{field},microgrid,{device_id}")
+        blocks.append("\r\n".join(lines) + "\r\n")
+    return "\r\n".join(blocks) + "\r\n"
+
+
+def make_app(sink: Optional[Sink] = None) -> web.Application:
+    sink = sink or Sink()
+
+    async def write(request: web.Request) -> web.Response:
+        body = await request.read()
+        if request.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        try:
+            sink.write(body, request.query.get("precision", "ns"))
+        except ValueError as e:
+            return web.json_response({"code": "invalid", "message": str(e)}, status=400)
+        return web.Response(status=204)
+
+    async def query(request: web.Request) -> web.Response:
+        body = await request.json()
+        try:
+            csv = sink.query(body.get("query", ""))
+        except ValueError as e:
+            return web.json_response({"code": "invalid", "message": str(e)}, status=400)
+        return web.Response(text=csv, content_type="text/csv")
+
+    async def ping(request: web.Request) -> web.Response:
+        return web.Response(status=204)
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(sink.stats())
+
+    app = web.Application(client_max_size=256 * 1024 * 1024)
+    app.router.add_post("/api/v2/write", write)
+    app.router.add_post("/api/v2/query", query)
+    app.router.add_get("/ping", ping)
+    app.router.add_get("/health", ping)
+    app.router.add_get("/sink/stats", stats)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the in-memory Influx stand-in.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8086)
+    args = parser.parse_args()
+    web.run_app(make_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
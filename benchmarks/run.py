@@ -0,0 +1,427 @@
+"""End-to-end benchmark: ingest throughput, ingest-to-queryable lag and API latency.
+
+Starts the embedded MQTT broker, the in-memory Influx stand-in (or points the
+backend at a real Influx with ``--influx-url``) and the backend itself, then
+drives telemetry with the simulator's load generator while measuring:
+
+- messages/sec written through the ingest pipeline
+- lag from publishing a probe reading until the realtime endpoint and Influx
+  return it
+- p50/p95/p99 latency of the realtime, alerts and historical endpoints
+
+Results are written as JSON; ``--baseline`` compares against an earlier run.
+
+    python -m benchmarks.run --grids 500 --rate 1 --duration 60
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+import paho.mqtt.client as mqtt
+from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
+
+from benchmarks.stats import percentiles
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "simulator"))
+
+from load_generator import LoadConfig, grid_name, run_sharded  # noqa: E402
+
+TOKEN = "benchmark_token"
+PROBE_GRID = "bench-probe"
+PROBE_TOPIC = f"microgrid/{PROBE_GRID}/device/probe/telemetry"
+PROBE_QUERY = """
+from(bucket: "{bucket}")
+  |> range(start: -1h)
+  |> filter(fn: (r) => r._measurement == "microgrid")
+  |> filter(fn: (r) => r.grid_id == "{grid}")
+  |> filter(fn: (r) => r._field == "consumption_kW")
+  |> last()
+"""
+
+# Metrics compared against a baseline run, with whether higher is better
+COMPARED = {
+    "ingest.written_per_second": True,
+    "lag.realtime_seconds.p95": False,
+    "lag.queryable_seconds.p95": False,
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _spawn(args: List[str], env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args],
+        cwd=ROOT,
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def _wait_port(port: int, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"nothing listening on port {port}")
+            await asyncio.sleep(0.1)
+
+
+class Probe:
+    """Publishes marked readings and times how long until the API and Influx return them."""
+
+    def __init__(self, broker_port: int, api: httpx.AsyncClient, influx: InfluxDBClientAsync, bucket: str, org: str) -> None:
+        self._api = api
+        self._influx = influx
+        self._query = PROBE_QUERY.format(bucket=bucket, grid=PROBE_GRID)
+        self._org = org
+        self._client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        self._client.connect("127.0.0.1", broker_port)
+        self._client.loop_start()
+        self._seq = 0
+        self.realtime: List[float] = []
+        self.queryable: List[float] = []
+        self.timeouts = {"realtime": 0, "queryable": 0}
+
+    def close(self) -> None:
+        self._client.loop_stop()
+        self._client.disconnect()
+
+    async def _realtime_value(self) -> Optional[float]:
+        resp = await self._api.get("/api/dashboard/realtime", params={"grid_id": PROBE_GRID})
+        return resp.json().get("consumption_kW") if resp.status_code == 200 else None
+
+    async def _influx_value(self) -> Optional[float]:
+        tables = await self._influx.query_api().query(self._query, org=self._org)
+        for table in tables:
+            for record in table.records:
+                return record.get_value()
+        return None
+
+    async def _until(self, read, value: float, started: float, timeout: float) -> Optional[float]:
+        while time.perf_counter() - started < timeout:
+            try:
+                if await read() == value:
+                    return time.perf_counter() - started
+            except Exception:
+                pass
+            await asyncio.sleep(0.01)
+        return None
+
+    async def measure(self, timeout: float = 10.0) -> None:
+        self._seq += 1
+        value = 1000.0 + self._seq
+        payload = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "live_power_consumption": value,
+            "live_generation": 0.0,
+            "battery_soc": 50,
+        }
+        started = time.perf_counter()
+        self._client.publish(PROBE_TOPIC, json.dumps(payload), qos=1)
+        realtime, queryable = await asyncio.gather(
+            self._until(self._realtime_value, value, started, timeout),
+            self._until(self._influx_value, value, started, timeout),
+        )
+        for name, lag, samples in (("realtime", realtime, self.realtime), ("queryable", queryable, self.queryable)):
+            if lag is None:
+                self.timeouts[name] += 1
+            else:
+                samples.append(lag)
+
+    async def run(self, stop: asyncio.Event, interval: float) -> None:
+        while not stop.is_set():
+            await self.measure()
+            try:
+                await asyncio.wait_for(stop.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def _latency(api: httpx.AsyncClient, name: str, paths: List[str], concurrency: int) -> Dict:
+    """Issue ``paths`` with up to ``concurrency`` in flight; latency in milliseconds."""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    pending = iter(paths)
+
+    async def worker() -> None:
+        for path in pending:
+            started = time.perf_counter()
+            try:
+                resp = await api.get(path)
+                status = str(resp.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    summary = percentiles(latencies)
+    summary["statuses"] = statuses
+    summary["errors"] = sum(count for status, count in statuses.items() if not status.startswith("2"))
+    print(f"  {name}: p50={summary['p50']}ms p95={summary['p95']}ms p99={summary['p99']}ms errors={summary['errors']}")
+    return summary
+
+
+def _endpoint_paths(args, rng: random.Random) -> Dict[str, List[str]]:
+    def grid() -> str:
+        return grid_name(rng.randrange(args.grids))
+
+    n = args.requests
+    endpoints = {
+        "realtime": [f"/api/dashboard/realtime?grid_id={grid()}" for _ in range(n)],
+        "alerts": [f"/api/alerts/{grid()}?status=active&limit=50" for _ in range(n)],
+    }
+    for period in args.periods.split(","):
+        endpoints[f"historical_{period}"] = [
+            f"/api/dashboard/historical?grid_id={grid()}&metric=consumption_kW&period={period}" for _ in range(n)
+        ]
+    return endpoints
+
+
+async def _stats(api: httpx.AsyncClient) -> Dict:
+    resp = await api.get("/api/stats")
+    resp.raise_for_status()
+    return resp.json()
+
+
+def _backend_env(args, workdir: str, broker_port: int, influx_url: str, influx_token: str) -> Dict[str, str]:
+    # The backend runs from the repository root; every file it writes goes to workdir instead
+    return {
+        "MQTT_BROKER_HOST": "127.0.0.1",
+        "MQTT_BROKER_PORT": str(broker_port),
+        "INFLUX_URL": influx_url,
+        "INFLUX_TOKEN": influx_token,
+        "INFLUX_ORG": args.influx_org,
+        "INFLUX_BUCKET": args.influx_bucket,
+        "ALERTS_DB_PATH": os.path.join(workdir, "alerts.db"),
+        "ROLLUP_STATE_PATH": os.path.join(workdir, "rollup_state.json"),
+        "SPOOL_DIR": os.path.join(workdir, "spool"),
+        "API_TOKEN": TOKEN,
+    }
+
+
+async def run(args) -> Dict:
+    broker_port, api_port = _free_port(), _free_port()
+    processes = [_spawn(["-m", "benchmarks.broker", "--port", str(broker_port)])]
+    influx_url, influx_token = args.influx_url, args.influx_token
+    if influx_url is None:
+        sink_port = _free_port()
+        processes.append(_spawn(["-m", "benchmarks.influx_sink", "--port", str(sink_port)]))
+        influx_url, influx_token = f"http://127.0.0.1:{sink_port}", "benchmark"
+
+    workdir = tempfile.mkdtemp(prefix="solnova-bench-")
+    try:
+        await _wait_port(broker_port)
+        await _wait_port(int(influx_url.rsplit(":", 1)[1].split("/")[0]))
+        processes.append(_spawn(
+            ["-m", "uvicorn", "backend.main:app", "--port", str(api_port), "--log-level", "warning"],
+            env=_backend_env(args, workdir, broker_port, influx_url, influx_token),
+        ))
+        await _wait_port(api_port, timeout=30)
+        return await _measure(args, broker_port, api_port, influx_url, influx_token)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def _measure(args, broker_port: int, api_port: int, influx_url: str, influx_token: str) -> Dict:
+    limits = httpx.Limits(max_connections=args.concurrency + 4)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{api_port}",
+        headers={"Authorization": f"Bearer {TOKEN}"},
+        limits=limits,
+        timeout=30.0,
+    ) as api, InfluxDBClientAsync(url=influx_url, token=influx_token, org=args.influx_org) as influx:
+        before = await _stats(api)
+        probe = Probe(broker_port, api, influx, args.influx_bucket, args.influx_org)
+        config = LoadConfig(
+            host="127.0.0.1",
+            port=broker_port,
+            grids=args.grids,
+            devices_per_grid=args.devices_per_grid,
+            rate=args.rate,
+            qos=args.qos,
+            payload_bytes=args.payload_bytes,
+            seed=args.seed,
+            duration=args.duration,
+            connections=args.connections,
+        )
+        print(f"Load: {args.grids * args.devices_per_grid} devices at {args.rate}/s for {args.duration}s")
+        load = asyncio.create_task(asyncio.to_thread(run_sharded, config, args.processes))
+        stop_probe = asyncio.Event()
+        probing = asyncio.create_task(probe.run(stop_probe, args.probe_interval))
+
+        # Latencies are measured under load, once ingest has warmed up
+        await asyncio.sleep(min(args.warmup, args.duration))
+        print("Latency (under load):")
+        latency = {}
+        for name, paths in _endpoint_paths(args, random.Random(args.seed)).items():
+            latency[name] = await _latency(api, name, paths, args.concurrency)
+
+        published = await load
+        stop_probe.set()
+        await probing
+        probe.close()
+
+        # Let the write queue drain so throughput counts everything that made it through
+        drain_started = time.perf_counter()
+        while time.perf_counter() - drain_started < args.drain_timeout:
+            after = await _stats(api)
+            if after["influx_writer"]["queued"] == 0 and not any(after["ingest"]["queued"]):
+                break
+            await asyncio.sleep(0.2)
+        drain = time.perf_counter() - drain_started
+        after = await _stats(api)
+
+        written = after["influx_writer"]["written"] - before["influx_writer"]["written"]
+        # Rollup buckets share the writer; only count raw readings
+        written -= after.get("rollups", {}).get("emitted", 0) - before.get("rollups", {}).get("emitted", 0)
+        results = {
+            "ingest": {
+                "published": published["published"],
+                "published_per_second": published["msgs_per_second"],
+                "publish_dropped": published["dropped"],
+                "written": written,
+                "written_per_second": round(written / (published["elapsed_seconds"] + drain), 1),
+                "ingest_dropped": after["ingest"]["dropped"],
+                "writer_dropped": after["influx_writer"]["dropped"],
+                "writer_failed": after["influx_writer"]["failed"],
+                "drain_seconds": round(drain, 3),
+            },
+            "lag": {
+                "realtime_seconds": percentiles(probe.realtime),
+                "queryable_seconds": percentiles(probe.queryable),
+                "probe_timeouts": probe.timeouts,
+            },
+            "latency_ms": latency,
+            "backend_stats": after,
+        }
+        if args.influx_url is None:
+            async with httpx.AsyncClient(base_url=influx_url) as sink:
+                results["sink"] = (await sink.get("/sink/stats")).json()
+        return results
+
+
+def _metric(results: Dict, path: str) -> Optional[float]:
+    value = results
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value if isinstance(value, (int, float)) else None
+
+
+def compare(results: Dict, baseline: Dict) -> Dict[str, Dict]:
+    """Relative change of each compared metric against ``baseline``, flagging changes for the worse."""
+    paths = dict(COMPARED)
+    for name in results.get("latency_ms", {}):
+        for p in ("p50", "p95", "p99"):
+            paths[f"latency_ms.{name}.{p}"] = False
+    changes = {}
+    for path, higher_is_better in paths.items():
+        current, previous = _metric(results, path), _metric(baseline, path)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        changes[path] = {
+            "baseline": previous,
+            "current": current,
+            "change": round(change, 4),
+            "worse": change < 0 if higher_is_better else change > 0,
+        }
+    return changes
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ingest and API latency against local stand-ins.")
+    parser.add_argument("--grids", type=int, default=200)
+    parser.add_argument("--devices-per-grid", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=1.0, help="readings per second per device")
+    parser.add_argument("--qos", type=int, choices=(0, 1), default=0)
+    parser.add_argument("--payload-bytes", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--processes", type=int, default=1, help="load generator processes")
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds of load before measuring latency")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--periods", default="1h,24h,7d", help="historical periods to measure")
+    parser.add_argument("--probe-interval", type=float, default=1.0)
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    parser.add_argument("--influx-url", default=None, help="use this Influx instead of the in-memory sink")
+    parser.add_argument("--influx-token", default=os.getenv("INFLUX_TOKEN", ""))
+    parser.add_argument("--influx-org", default="solnova")
+    parser.add_argument("--influx-bucket", default="solnova")
+    parser.add_argument("--output", default=None, help="results file (default: benchmarks/results/<time>.json)")
+    parser.add_argument("--baseline", default=None, help="earlier results file to compare against")
+    return parser.parse_args(argv)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    started_at = datetime.now(timezone.utc)
+    results = {
+        "started_at": started_at.isoformat(),
+        "commit": _git_commit(),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": vars(args),
+        **asyncio.run(run(args)),
+    }
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            results["comparison"] = compare(results, json.load(f))
+        for path, change in results["comparison"].items():
+            flag = "WORSE" if change["worse"] else "     "
+            print(f"{flag} {path}: {change['baseline']} -> {change['current']} ({change['change']:+.1%})")
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", started_at.strftime("%Y%m%dT%H%M%SZ.json"))
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    ingest = results["ingest"]
+    print(f"Ingest: {ingest['written_per_second']} msgs/s written ({ingest['published_per_second']} msgs/s published)")
+    print(f"Lag p95: realtime {results['lag']['realtime_seconds']['p95']}s, "
+          f"queryable {results['lag']['queryable_seconds']['p95']}s")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import math
+from typing import Dict, Optional, Sequence
+
+
+def percentiles(values: Sequence[float], digits: int = 3) -> Dict[str, Optional[float]]:
+    """count/p50/p95/p99/max of ``values`` (nearest-rank); percentiles are None when empty."""
+    ordered = sorted(values)
+    n = len(ordered)
+
+    def rank(p: float) -> Optional[float]:
+        if not n:
+            return None
+        return round(ordered[min(n - 1, max(0, math.ceil(p / 100 * n) - 1))], digits)
+
+    return {
+        "count": n,
+        "p50": rank(50),
+        "p95": rank(95),
+        "p99": rank(99),
+        "max": round(ordered[-1], digits) if n else None,
+    }
@@ -8,6 +8,8 @@ class ApiClient {
   final String baseUrl;
   final String? token;
   final http.Client client;
+  // Last ETag and body per URL; polls revalidate with If-None-Match and reuse the body on 304
+  final Map<Uri, ({String etag, String body})> _validated = {};
   ApiClient({required this.baseUrl, required this.token, http.Client? client}) : client = client ?? http.Client();
 
   Map<String, String> _headers() => {
@@ -17,20 +19,34 @@ class ApiClient {
 
   Uri _uri(String path, [Map<String, String>? query]) => Uri.parse('$baseUrl$path').replace(queryParameters: query);
 
-  Future<Map<String, dynamic>> getJson(String path, [Map<String, String>? query]) async {
-    final resp = await client.get(_uri(path, query), headers: _headers());
+  Future<String> _getBody(String path, Map<String, String>? query) async {
+    final uri = _uri(path, query);
+    final previous = _validated[uri];
+    final resp = await client.get(uri, headers: {
+      ..._headers(),
+      if (previous != null) 'If-None-Match': previous.etag,
+    });
+    if (resp.statusCode == 304 && previous != null) {
+      return previous.body;
+    }
     if (resp.statusCode < 200 || resp.statusCode >= 300) {
       throw Exception('GET $path failed (${resp.statusCode})');
     }
-    return jsonDecode(resp.body) as Map<String, dynamic>;
+    final etag = resp.headers['etag'];
+    if (etag != null) {
+      _validated[uri] = (etag: etag, body: resp.body);
+    } else {
+      _validated.remove(uri);
+    }
+    return resp.body;
+  }
+
+  Future<Map<String, dynamic>> getJson(String path, [Map<String, String>? query]) async {
+    return jsonDecode(await _getBody(path, query)) as Map<String, dynamic>;
   }
 
   Future<List<dynamic>> getJsonList(String path, [Map<String, String>? query]) async {
-    final resp = await client.get(_uri(path, query), headers: _headers());
-    if (resp.statusCode < 200 || resp.statusCode >= 300) {
-      throw Exception('GET $path failed (${resp.statusCode})');
-    }
-    return (jsonDecode(resp.body) as List).cast<dynamic>();
+    return (jsonDecode(await _getBody(path, query)) as List).cast<dynamic>();
   }
 
   Future<bool> put(String path, {Map<String, String>? query, Map<String, dynamic>? body}) async {
@@ -1,90 +1,245 @@
 import base64
+import gzip
+import http.client
 import json
+import math
 import os
 import time
-from datetime import datetime
-from urllib import request, parse
-import boto3
+from datetime import datetime, timezone
+from urllib import parse
 
-DDB = boto3.resource('dynamodb')
+# Kinesis -> Influx (telemetry) / DynamoDB (alerts).
+# Each invocation writes all telemetry of the batch as one gzip line-protocol
+# request and all alerts through one DynamoDB batch writer. Records that could
+# not be written are returned as batchItemFailures, so the event source mapping
+# must have ReportBatchItemFailures enabled. Records that can never be written
+# (not JSON, not valid line protocol, rejected by Influx) are logged and dropped.
 
 INFLUX_URL = os.environ.get('INFLUX_URL', '')  # e.g., https://us-east-1-1.aws.cloud2.influxdata.com
 INFLUX_ORG = os.environ.get('INFLUX_ORG', '')
 INFLUX_BUCKET = os.environ.get('INFLUX_BUCKET', '')
 INFLUX_TOKEN = os.environ.get('INFLUX_TOKEN', '')
+INFLUX_TIMEOUT = float(os.environ.get('INFLUX_TIMEOUT_SECONDS', '10'))
 ALERTS_TABLE = os.environ.get('ALERTS_TABLE', '')
 
-def write_influx_line(measurement: str, fields: dict, tags: dict | None, ts_ns: int):
-    if not (INFLUX_URL and INFLUX_ORG and INFLUX_BUCKET and INFLUX_TOKEN):
-        return  # not configured
-    # Build line protocol
-    def esc(s):
-        return str(s).replace(' ', '\\ ').replace(',', '\\,')
+# Clients live for the lifetime of the execution environment and are reused across invocations
+_influx_conn = None
+_table = None
+
+
+def _alerts_table():
+    global _table
+    if _table is None:
+        import boto3
+        _table = boto3.resource('dynamodb').Table(ALERTS_TABLE)
+    return _table
+
+
+def _connection():
+    global _influx_conn
+    if _influx_conn is None:
+        url = parse.urlsplit(INFLUX_URL)
+        cls = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        _influx_conn = cls(url.hostname, url.port, timeout=INFLUX_TIMEOUT)
+    return _influx_conn
+
+
+def _reset_connection():
+    global _influx_conn
+    if _influx_conn is not None:
+        _influx_conn.close()
+        _influx_conn = None
+
+
+def _esc(s) -> str:
+    """Escape a measurement, tag or field key/value; raises ValueError for what line protocol cannot carry."""
+    if not isinstance(s, (str, int, float)) or s == '':
+        raise ValueError(f'{s!r} cannot be a name or tag value')
+    s = str(s)
+    if '\n' in s or '\r' in s:
+        raise ValueError(f'newline in {s!r}')
+    return s.replace(' ', '\\ ').replace(',', '\\,').replace('=', '\\=')
+
+
+def _field_value(v) -> str:
+    if isinstance(v, bool):
+        return 'true' if v else 'false'
+    if isinstance(v, float) and not math.isfinite(v):
+        raise ValueError(f'non-finite field value {v!r}')
+    if isinstance(v, (int, float)):
+        return repr(v)
+    if '\n' in v or '\r' in v:
+        raise ValueError(f'newline in field value {v!r}')
+    escaped = str(v).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def to_line(measurement: str, fields: dict, tags: dict | None, ts_ns: int) -> str:
+    """One line-protocol point; raises ValueError for tags or fields Influx would reject."""
     tag_str = ''
     if tags:
-        tag_str = ',' + ','.join(f"{esc(k)}={esc(v)}" for k, v in tags.items())
-    field_parts = []
-    for k, v in fields.items():
-        if isinstance(v, (int, float)):
-            field_parts.append(f"{esc(k)}={v}")
-        else:
-            field_parts.append(f"{esc(k)}=\"{str(v).replace('\\', '\\\\').replace('"', '\\"')}\"")
-    field_str = ','.join(field_parts)
-    line = f"{measurement}{tag_str} {field_str} {ts_ns}"
-    data = line.encode('utf-8')
-    url = f"{INFLUX_URL}/api/v2/write?org={parse.quote(INFLUX_ORG)}&bucket={parse.quote(INFLUX_BUCKET)}&precision=ns"
-    req = request.Request(url, data=data, method='POST')
-    req.add_header('Authorization', f'Token {INFLUX_TOKEN}')
-    req.add_header('Content-Type', 'text/plain; charset=utf-8')
-    try:
-        with request.urlopen(req, timeout=3) as resp:
-            _ = resp.read()
-    except Exception as e:
-        print('Influx write error:', e)
+        tag_str = ',' + ','.join(f"{_esc(k)}={_esc(v)}" for k, v in sorted(tags.items()))
+    field_str = ','.join(f"{_esc(k)}={_field_value(v)}" for k, v in fields.items())
+    return f"{_esc(measurement)}{tag_str} {field_str} {ts_ns}"
 
 
-def put_alert_ddb(alert: dict):
-    if not ALERTS_TABLE:
-        return
-    table = DDB.Table(ALERTS_TABLE)
-    # Ensure an id
-    if 'id' not in alert:
-        alert['id'] = f"alert-{int(time.time()*1000)}"
-    item = {
-        'alert_id': str(alert.get('id')),
+def record_time_ns(data: dict, rec: dict) -> int:
+    """The reading's own timestamp; falls back to when Kinesis received the record."""
+    ts = data.get('timestamp')
+    if isinstance(ts, str):
+        try:
+            parsed = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+        except ValueError:
+            parsed = None
+        if parsed is not None:
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            whole = int(parsed.replace(microsecond=0).timestamp())
+            return whole * 1_000_000_000 + parsed.microsecond * 1000
+    elif isinstance(ts, (int, float)) and not isinstance(ts, bool):
+        # Epoch in s, ms or ns, told apart by magnitude
+        if ts > 1e17:
+            return int(ts)
+        if ts > 1e11:
+            return int(ts * 1_000_000)
+        return int(ts * 1_000_000_000)
+    arrival = rec.get('kinesis', {}).get('approximateArrivalTimestamp')
+    if arrival is not None:
+        return int(float(arrival) * 1_000_000_000)
+    return time.time_ns()
+
+
+def _post_lines(lines: list) -> int | None:
+    """POST ``lines`` as one gzip body; the response status, or None if Influx could not be reached."""
+    body = gzip.compress('\n'.join(lines).encode('utf-8'), compresslevel=6)
+    path = (parse.urlsplit(INFLUX_URL).path.rstrip('/') + '/api/v2/write?'
+            + parse.urlencode({'org': INFLUX_ORG, 'bucket': INFLUX_BUCKET, 'precision': 'ns'}))
+    headers = {
+        'Authorization': f'Token {INFLUX_TOKEN}',
+        'Content-Type': 'text/plain; charset=utf-8',
+        'Content-Encoding': 'gzip',
+    }
+    for attempt in range(2):
+        conn = _connection()
+        try:
+            conn.request('POST', path, body=body, headers=headers)
+            resp = conn.getresponse()
+            detail = resp.read()
+        except (http.client.HTTPException, OSError) as e:
+            # A kept-alive connection may have been closed by the server while idle; retry once on a fresh one
+            _reset_connection()
+            if attempt:
+                print('Influx write error:', e)
+                return None
+            continue
+        if resp.will_close:
+            _reset_connection()
+        if resp.status >= 300:
+            print('Influx write rejected:', resp.status, detail[:500])
+        return resp.status
+    return None
+
+
+def write_influx(lines: list) -> list:
+    """Write ``lines``, one request per batch. Returns the indexes of the lines that should be retried.
+
+    A 400/422 means some line is malformed, and Influx does not say which, so
+    the batch is split in halves and each is sent on its own until the bad
+    lines are isolated; those are dropped and the rest are written.
+    """
+    if not (INFLUX_URL and INFLUX_ORG and INFLUX_BUCKET and INFLUX_TOKEN):
+        return []  # not configured
+    return _write_lines(lines, 0)
+
+
+def _write_lines(lines: list, offset: int) -> list:
+    status = _post_lines(lines)
+    if status is not None and status < 300:
+        return []
+    if status in (400, 422):
+        # Malformed points will never succeed; everything else (auth, throttling, 5xx) is worth a retry
+        if len(lines) == 1:
+            print('Dropping line Influx rejects:', lines[0][:500])
+            return []
+        half = len(lines) // 2
+        return _write_lines(lines[:half], offset) + _write_lines(lines[half:], offset + half)
+    return list(range(offset, offset + len(lines)))
+
+
+def alert_item(alert: dict, rec: dict) -> dict:
+    # Derive the id from the Kinesis sequence number so a retried record overwrites rather than duplicates
+    alert_id = alert.get('id') or f"alert-{rec['kinesis']['sequenceNumber']}"
+    ts = alert.get('timestamp')
+    if not ts:
+        ts = datetime.fromtimestamp(record_time_ns(alert, rec) / 1e9, timezone.utc).isoformat()
+    return {
+        'alert_id': str(alert_id),
         'message': str(alert.get('message', '')),
         'severity': str(alert.get('severity', 'info')),
         'grid_id': str(alert.get('grid_id', 'unknown')),
         'device_id': str(alert.get('device_id', '')),
-        'timestamp': alert.get('timestamp') or datetime.utcnow().isoformat(),
+        'timestamp': ts,
         'raw': json.dumps(alert),
     }
-    table.put_item(Item=item)
+
+
+def write_alerts(items: list) -> bool:
+    if not ALERTS_TABLE:
+        return True
+    try:
+        # batch_writer groups puts into BatchWriteItem calls of 25 and resends unprocessed items
+        with _alerts_table().batch_writer(overwrite_by_pkeys=['alert_id']) as batch:
+            for item in items:
+                batch.put_item(Item=item)
+    except Exception as e:
+        print('DynamoDB batch write error:', e)
+        return False
+    return True
 
 
 def handler(event, context):
-    # Kinesis event
+    lines, line_seqs = [], []
+    alerts, alert_seqs = [], []
+    invalid = 0
     for rec in event.get('Records', []):
-        payload = base64.b64decode(rec['kinesis']['data'])
+        seq = rec['kinesis']['sequenceNumber']
         try:
-            data = json.loads(payload)
+            data = json.loads(base64.b64decode(rec['kinesis']['data']))
         except Exception:
-            print('Non-JSON payload, skipping')
+            # Retrying cannot fix a malformed record, so it is dropped rather than reported
+            print('Non-JSON payload, skipping', seq)
+            continue
+        if not isinstance(data, dict):
             continue
         # Heuristic: if looks like alert -> DDB; else -> Influx
-        if isinstance(data, dict) and ('message' in data or data.get('type') == 'alert'):
-            put_alert_ddb(data)
-        else:
-            # Write as measurement=telemetry
-            ts_ns = int(time.time() * 1e9)
-            fields = {}
-            tags = {}
-            for k, v in data.items() if isinstance(data, dict) else []:
-                # Separate some tags if present
-                if k in ('grid_id', 'device_id'):
-                    tags[k] = v
-                elif isinstance(v, (int, float, str, bool)):
-                    fields[k] = v
-            if fields:
-                write_influx_line('telemetry', fields, tags, ts_ns)
-    return {'status': 'ok'}
+        if 'message' in data or data.get('type') == 'alert':
+            alerts.append(alert_item(data, rec))
+            alert_seqs.append(seq)
+            continue
+        fields = {}
+        tags = {}
+        for k, v in data.items():
+            # Separate some tags if present
+            if k in ('grid_id', 'device_id'):
+                tags[k] = v
+            elif k != 'timestamp' and isinstance(v, (int, float, str, bool)):
+                fields[k] = v
+        if fields:
+            try:
+                line = to_line('telemetry', fields, tags, record_time_ns(data, rec))
+            except ValueError as e:
+                # Like a malformed record, this would fail every retry; the rest of the batch still goes out
+                print('Invalid telemetry record, skipping', seq, e)
+                invalid += 1
+                continue
+            lines.append(line)
+            line_seqs.append(seq)
+    if invalid:
+        print('Skipped', invalid, 'invalid telemetry records')
+
+    failed = []
+    if lines:
+        failed.extend(line_seqs[i] for i in write_influx(lines))
+    if alerts and not write_alerts(alerts):
+        failed.extend(alert_seqs)
+    return {'batchItemFailures': [{'itemIdentifier': seq} for seq in failed]}
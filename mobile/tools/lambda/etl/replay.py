@@ -0,0 +1,187 @@
+"""Replay Kinesis batches through the ETL handler locally.
+
+Influx is replaced by a local HTTP server that counts connections,
+requests and lines; DynamoDB by an in-memory table with a batch writer.
+Input is a JSONL file of payloads (one record each), or synthetic
+telemetry and alerts with --generate.
+
+    python replay.py --generate 5000 --batch-size 500
+    python replay.py --input payloads.jsonl --influx-status 503
+"""
+
+import argparse
+import base64
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubInflux(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, status: int = 204):
+        self.status = status
+        self.connections = 0
+        self.requests = 0
+        self.lines = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+        super().__init__(('127.0.0.1', 0), _InfluxHandler)
+
+
+class _InfluxHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.bytes += int(self.headers['Content-Length'])
+            if self.server.status < 300:
+                self.server.lines += len(body.splitlines())
+        self.send_response(self.server.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class StubTable:
+    """DynamoDB Table stand-in; batch_writer flushes every 25 puts like boto3's."""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.items = {}
+        self.batch_calls = 0
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _StubBatch(self)
+
+
+class _StubBatch:
+    def __init__(self, table: StubTable):
+        self.table = table
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def put_item(self, Item):
+        self.pending.append(Item)
+        if len(self.pending) >= 25:
+            self._flush()
+
+    def _flush(self):
+        if self.table.fail:
+            raise RuntimeError('ProvisionedThroughputExceededException (stubbed)')
+        self.table.batch_calls += 1
+        for item in self.pending:
+            self.table.items[item['alert_id']] = item
+        self.pending = []
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None and self.pending:
+            self._flush()
+        return False
+
+
+def generate(count: int, seed: int):
+    rng = random.Random(seed)
+    start = datetime.now(timezone.utc) - timedelta(seconds=count)
+    for i in range(count):
+        ts = (start + timedelta(seconds=i)).isoformat()
+        grid = f"grid-{rng.randrange(10):03d}"
+        if rng.random() < 0.05:
+            yield {'type': 'alert', 'message': 'Load Abnormality: Unusual load increase detected.',
+                   'severity': 'warning', 'grid_id': grid, 'timestamp': ts}
+        else:
+            yield {'grid_id': grid, 'device_id': f"dev-{rng.randrange(4):03d}", 'timestamp': ts,
+                   'live_power_consumption': round(rng.uniform(5, 15), 2),
+                   'live_generation': round(rng.uniform(6, 16), 2),
+                   'battery_soc': rng.randint(20, 100)}
+
+
+def kinesis_batches(payloads, batch_size: int):
+    batch = []
+    for i, payload in enumerate(payloads):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        batch.append({'kinesis': {
+            'sequenceNumber': f"{i:020d}",
+            'partitionKey': 'replay',
+            'approximateArrivalTimestamp': time.time(),
+            'data': base64.b64encode(data).decode(),
+        }})
+        if len(batch) == batch_size:
+            yield {'Records': batch}
+            batch = []
+    if batch:
+        yield {'Records': batch}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--input', help='JSONL file with one payload per line')
+    parser.add_argument('--generate', type=int, default=1000, help='synthetic records when no --input')
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--influx-status', type=int, default=204, help='status the stub Influx answers with')
+    parser.add_argument('--ddb-fail', action='store_true', help='make the stub DynamoDB batch writes fail')
+    args = parser.parse_args()
+
+    influx = StubInflux(args.influx_status)
+    threading.Thread(target=influx.serve_forever, daemon=True).start()
+    os.environ.update({
+        'INFLUX_URL': f"http://127.0.0.1:{influx.server_address[1]}",
+        'INFLUX_ORG': 'replay', 'INFLUX_BUCKET': 'replay', 'INFLUX_TOKEN': 'replay',
+        'ALERTS_TABLE': 'replay-alerts',
+    })
+    import lambda_function  # reads its configuration from the environment on import
+
+    table = StubTable(fail=args.ddb_fail)
+    lambda_function._table = table
+
+    if args.input:
+        with open(args.input, 'rb') as f:
+            payloads = [line.rstrip(b'\n') for line in f if line.strip()]
+    else:
+        payloads = list(generate(args.generate, args.seed))
+
+    batches = 0
+    failures = 0
+    durations = []
+    for event in kinesis_batches(payloads, args.batch_size):
+        started = time.perf_counter()
+        result = lambda_function.handler(event, None)
+        durations.append(time.perf_counter() - started)
+        batches += 1
+        failures += len(result['batchItemFailures'])
+    influx.shutdown()
+
+    durations.sort()
+    print(json.dumps({
+        'records': len(payloads),
+        'batches': batches,
+        'batch_item_failures': failures,
+        'influx': {'connections': influx.connections, 'requests': influx.requests,
+                   'lines': influx.lines, 'gzip_bytes': influx.bytes},
+        'dynamodb': {'items': len(table.items), 'batch_write_calls': table.batch_calls},
+        'invocation_ms': {'mean': round(sum(durations) / len(durations) * 1000, 3) if durations else None,
+                          'max': round(durations[-1] * 1000, 3) if durations else None},
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,25 @@
-from fastapi import FastAPI, HTTPException
+import json
+import os
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from pydantic import BaseModel
-from datetime import datetime, timedelta
-import random
+
+from dataset import PERIODS, SERIES, Dataset
+
+# All series are built once here; requests only slice them (see dataset.py)
+data = Dataset(
+    grids=int(os.getenv("MOCK_GRIDS", "3")),
+    seed=int(os.getenv("MOCK_SEED", "1")),
+    step=int(os.getenv("MOCK_STEP_SECONDS", "60")),
+    history_days=float(os.getenv("MOCK_HISTORY_DAYS", "31")),
+    horizon_days=float(os.getenv("MOCK_HORIZON_DAYS", "7")),
+    time_scale=float(os.getenv("MOCK_TIME_SCALE", "1")),
+    start=datetime.fromisoformat(os.environ["MOCK_START"]).timestamp() if os.getenv("MOCK_START") else None,
+)
 
 app = FastAPI()
 
@@ -12,6 +29,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 class LoginBody(BaseModel):
@@ -24,78 +42,103 @@ async def login(body: LoginBody):
 
 @app.get("/api/microgrids")
 async def microgrids():
-    return [
-        {"id": "grid-001", "name": "Community A"},
-        {"id": "grid-002", "name": "Community B"},
-        {"id": "grid-003", "name": "Community C"},
-    ]
+    return [{"id": grid_id, "name": name} for grid_id, name in zip(data.ids, data.names)]
 
-@app.get("/api/dashboard/realtime")
-async def realtime(grid_id: str = "grid-001"):
+def _grid(grid_id: str) -> str:
+    if not data.has_grid(grid_id):
+        raise HTTPException(status_code=404, detail="Unknown grid")
+    return grid_id
+
+def _serve(request: Request, body, *key):
+    # Bodies only change when simulated time reaches the next sample, so they are
+    # cached per sample and validated with an ETag derived from the same key
+    index = data.now_index()
+    tag = data.etag(*key, index)
+    if request.headers.get("if-none-match") == tag:
+        return Response(status_code=304, headers={"ETag": tag})
+    return Response(body(*key, index), media_type="application/json", headers={"ETag": tag, "Cache-Control": "no-cache"})
+
+def _dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+def _realtime_values(grid_id: str, index: int) -> dict:
+    generation = data.value(grid_id, "generation_kW", index)
+    ambient = data.value(grid_id, "ambient_temp_c", index)
+    dc_voltage = 600 + 12 * generation
     return {
-        "consumption_kW": round(random.uniform(6, 16), 1),
-        "generation_kW": round(random.uniform(5, 15), 1),
-        "battery_soc": random.randint(20, 100),
-        # Extended telemetry
-        "dc_bus_voltage_v": round(random.uniform(350, 800), 1),
-        "dc_bus_current_a": round(random.uniform(10, 200), 1),
-        "ac_voltage_v": round(random.uniform(210, 240), 1),
-        "ac_frequency_hz": 50 if random.random() < 0.5 else 60,
-        "grid_tie_connected": random.random() > 0.1,
-        "equipment_temp_c": round(random.uniform(30, 70), 1),
-        "solar_irradiance": random.randint(0, 1000),
-        "ambient_temp_c": round(random.uniform(18, 36), 1),
-        "humidity_pct": round(random.uniform(20, 90), 1),
+        "consumption_kW": round(data.value(grid_id, "consumption_kW", index), 1),
+        "generation_kW": round(generation, 1),
+        "battery_soc": int(data.value(grid_id, "battery_soc", index)),
+        # Extended telemetry, derived from the stored series so it stays consistent with them
+        "dc_bus_voltage_v": round(dc_voltage, 1),
+        "dc_bus_current_a": round(generation * 1000 / dc_voltage, 1),
+        "ac_voltage_v": round(230 + 0.4 * (ambient - 22), 1),
+        "ac_frequency_hz": 50,
+        "grid_tie_connected": (index // 30 * 2654435761 + data.ids.index(grid_id)) % 100 >= 3,
+        "equipment_temp_c": round(ambient + 2.5 * generation, 1),
+        "solar_irradiance": int(data.value(grid_id, "solar_irradiance", index)),
+        "ambient_temp_c": round(ambient, 1),
+        "humidity_pct": round(data.value(grid_id, "humidity_pct", index), 1),
+        "as_of": data.timestamp(index).isoformat(),
     }
 
+@lru_cache(maxsize=4096)
+def _realtime_body(grid_id: str, index: int) -> bytes:
+    return _dumps(_realtime_values(grid_id, index))
+
+@lru_cache(maxsize=4096)
+def _alerts_body(grid_id: str, index: int) -> bytes:
+    return _dumps(data.alerts_until(grid_id, index))
+
+@lru_cache(maxsize=4096)
+def _historical_body(grid_id: str, metric: str, period: str, index: int) -> bytes:
+    times, values = data.historical(grid_id, metric, period, index)
+    return _dumps([{"time": t, "value": v} for t, v in zip(times.tolist(), values.tolist())])
+
+@lru_cache(maxsize=4096)
+def _summary_body(grid_id: str, index: int) -> bytes:
+    return _dumps({**_realtime_values(grid_id, index), "grid_id": grid_id, "alerts": data.alerts_until(grid_id, index)})
+
+@app.get("/api/dashboard/realtime")
+async def realtime(request: Request, grid_id: str = "grid-001"):
+    return _serve(request, _realtime_body, _grid(grid_id))
+
+@app.get("/api/dashboard/summary/{grid_id}")
+async def summary(request: Request, grid_id: str):
+    return _serve(request, _summary_body, _grid(grid_id))
+
 @app.get("/api/dashboard/alerts")
-async def alerts(grid_id: str = "grid-001"):
-    demo = [
-        {"id": "a1", "message": "Load Abnormality: Unusual load increase detected.", "timestamp": datetime.utcnow().isoformat(), "severity": "warning"},
-        {"id": "a2", "message": "Predictive alert: high temperature on equipment.", "timestamp": datetime.utcnow().isoformat(), "severity": "critical"},
-        {"id": "a3", "message": "Renewable Performance Issue: Solar output is low.", "timestamp": datetime.utcnow().isoformat(), "severity": "info"},
-    ]
-    # Randomly choose subset
-    n = random.randint(1, len(demo))
-    return demo[:n]
+async def alerts(request: Request, grid_id: str = "grid-001"):
+    return _serve(request, _alerts_body, _grid(grid_id))
+
+@app.get("/api/alerts/{grid_id}")
+async def grid_alerts(request: Request, grid_id: str, status: str = "active"):
+    # Mock alerts are never acknowledged, so only the active list has entries
+    if status != "active":
+        return []
+    return _serve(request, _alerts_body, _grid(grid_id))
 
 @app.get("/api/dashboard/historical")
-async def historical(metric: str = "consumption_kW", period: str = "1h"):
+async def historical(request: Request, metric: str = "consumption_kW", period: str = "1h", grid_id: str = "grid-001"):
     # existing legacy route used by earlier mobile builds
-    return await _build_historical(metric=metric, period=period)
+    return _historical(request, grid_id, metric, period)
 
 @app.get("/api/historical/{grid_id}/{metric}")
-async def historical_v2(grid_id: str, metric: str, period: str = "1h"):
+async def historical_v2(request: Request, grid_id: str, metric: str, period: str = "1h"):
     # new route shape expected by the app repository
-    return await _build_historical(metric=metric, period=period)
-
-async def _build_historical(metric: str, period: str):
-    points = []
-    now = datetime.utcnow()
-    if period == "1h":
-        count = 60
-        step = timedelta(minutes=1)
-    elif period == "24h":
-        count = 24
-        step = timedelta(hours=1)
-    elif period == "7d":
-        count = 7 * 24
-        step = timedelta(hours=1)
-    else:
-        count = 30
-        step = timedelta(days=1)
-    base = random.uniform(8, 12)
-    for i in range(count):
-        t = now - step * (count - i)
-        val = base + random.uniform(-2, 2)
-        if metric == "battery_soc":
-            val = random.uniform(20, 100)
-        points.append({"time": t.isoformat(), "value": round(val, 2)})
-    return points
+    return _historical(request, grid_id, metric, period)
+
+def _historical(request: Request, grid_id: str, metric: str, period: str):
+    if metric not in SERIES:
+        raise HTTPException(status_code=400, detail=f"Invalid metric. Must be one of: {list(SERIES)}")
+    if period not in PERIODS:
+        # The mock always answered unknown periods with the 30 day shape
+        period = "30d"
+    return _serve(request, _historical_body, _grid(grid_id), metric, period)
 
 @app.get("/api/device/{grid_id}/list")
 async def device_list(grid_id: str):
-    now = datetime.utcnow()
+    now = data.timestamp(data.now_index())
     return [
         {"id": f"{grid_id}-inv-1", "name": "Inverter 1", "status": "connected", "last_seen": now.isoformat()},
         {"id": f"{grid_id}-bat-1", "name": "Battery Rack A", "status": "connected", "last_seen": now.isoformat()},
@@ -104,15 +147,20 @@ async def device_list(grid_id: str):
 
 @app.get("/api/device/{device_id}/detail")
 async def device_detail(device_id: str):
-    return {"id": device_id, "name": device_id, "type": "inverter" if "inv" in device_id else "sensor", "firmware": "1.2.3", "status": "connected", "last_seen": datetime.utcnow().isoformat()}
+    return {"id": device_id, "name": device_id, "type": "inverter" if "inv" in device_id else "sensor", "firmware": "1.2.3", "status": "connected", "last_seen": data.timestamp(data.now_index()).isoformat()}
 
 @app.get("/api/device/{device_id}/telemetry")
 async def device_telemetry(device_id: str):
-    # Return generic k/v
+    # Device ids are "<grid_id>-<kind>-<n>"; readings follow the grid's series
+    grid_id = device_id.rsplit("-", 2)[0]
+    if not data.has_grid(grid_id):
+        grid_id = data.ids[0]
+    index = data.now_index()
+    values = _realtime_values(grid_id, index)
     return {
-        "temperature_c": round(random.uniform(30, 70), 1),
-        "voltage_v": round(random.uniform(210, 240), 1),
-        "current_a": round(random.uniform(5, 20), 1),
-        "power_kw": round(random.uniform(2, 10), 2),
-        "last_update": datetime.utcnow().isoformat(),
+        "temperature_c": values["equipment_temp_c"],
+        "voltage_v": values["ac_voltage_v"],
+        "current_a": round(values["generation_kW"] * 1000 / values["ac_voltage_v"] / 3, 1),
+        "power_kw": values["generation_kW"],
+        "last_update": values["as_of"],
     }
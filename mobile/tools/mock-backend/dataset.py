@@ -0,0 +1,168 @@
+"""Seeded, precomputed telemetry for the mock backend.
+
+Every grid gets NumPy arrays covering ``history_days`` before the simulated
+start and ``horizon_days`` after it, at ``step`` seconds per sample, built
+once at startup. Requests only slice those arrays: the same simulated
+instant always yields the same numbers, so responses are stable between
+requests and change only when simulated time crosses a sample boundary.
+"""
+
+import math
+import time
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Stored per grid; the realtime extras (DC bus, AC voltage, ...) are derived from these
+SERIES = ("consumption_kW", "generation_kW", "battery_soc", "solar_irradiance", "ambient_temp_c", "humidity_pct")
+
+# period -> (number of points, seconds per point), same shapes the mock always returned
+PERIODS = {
+    "1h": (60, 60),
+    "24h": (24, 3600),
+    "7d": (7 * 24, 3600),
+    "30d": (30, 86400),
+}
+
+ALERT_MESSAGES = (
+    ("Load Abnormality: Unusual load increase detected.", "warning"),
+    ("Predictive alert: high temperature on equipment.", "critical"),
+    ("Renewable Performance Issue: Solar output is low.", "info"),
+)
+
+_NAMES = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def grid_ids(count):
+    return [f"grid-{i + 1:03d}" for i in range(count)]
+
+
+def grid_name(index):
+    return f"Community {_NAMES[index]}" if index < len(_NAMES) else f"Community {index + 1}"
+
+
+def _smooth_noise(rng, n, scale, span):
+    # Random walk pulled back to zero: wanders slowly like weather or occupancy does
+    steps = rng.normal(0.0, scale, n)
+    decay = math.exp(-1.0 / span)
+    kernel = decay ** np.arange(min(n, int(span * 8) + 1), dtype=np.float64)
+    # FFT convolution keeps this fast for long, finely stepped histories
+    size = 1 << (n + len(kernel) - 1).bit_length()
+    smoothed = np.fft.irfft(np.fft.rfft(steps, size) * np.fft.rfft(kernel, size), size)[:n]
+    return smoothed * math.sqrt(1 - decay * decay)
+
+
+class Dataset:
+    def __init__(self, grids=3, seed=1, step=60, history_days=31, horizon_days=7, time_scale=1.0, start=None):
+        self.step = step
+        self.seed = seed
+        self.time_scale = time_scale
+        self.ids = grid_ids(grids)
+        self.names = [grid_name(i) for i in range(grids)]
+        # Simulated start, aligned to a sample boundary
+        start = start if start is not None else time.time()
+        self.start = int(start // step) * step
+        self.history = int(history_days * 86400 // step)
+        self.horizon = max(1, int(horizon_days * 86400 // step))
+        self.begin = self.start - self.history * step
+        self._clock0 = time.monotonic()
+
+        n = self.history + self.horizon
+        t = self.begin + np.arange(n, dtype=np.float64) * step
+        self.series = {}
+        self.prefix = {}
+        self.alerts = {}
+        for index, grid_id in enumerate(self.ids):
+            rng = np.random.default_rng([seed, index])
+            arrays = self._grid_arrays(rng, t)
+            self.series[grid_id] = {name: values.astype(np.float32) for name, values in arrays.items()}
+            # Prefix sums make any window mean two lookups
+            self.prefix[grid_id] = {
+                name: np.concatenate(([0.0], np.cumsum(values, dtype=np.float64))) for name, values in arrays.items()
+            }
+            self.alerts[grid_id] = self._grid_alerts(rng, n)
+
+    def _grid_arrays(self, rng, t):
+        n = len(t)
+        # Each grid sits at its own longitude, so its day is shifted a little
+        day = ((t / 86400.0) + rng.uniform(-0.05, 0.05)) % 1.0
+        sun = np.clip(np.sin(np.pi * (day - 0.25) / 0.5), 0.0, None) ** 1.2
+        clouds = np.clip(1.0 - np.abs(_smooth_noise(rng, n, 0.6, 3 * 3600 / self.step)), 0.25, 1.0)
+        irradiance = rng.uniform(850, 1050) * sun * clouds
+
+        capacity = rng.uniform(12, 18)
+        generation = capacity * irradiance / 1000.0 * 0.85
+
+        base = rng.uniform(6, 9)
+        morning = 3.0 * np.exp(-((day - 7 / 24) ** 2) / (2 * (1.2 / 24) ** 2))
+        evening = 5.0 * np.exp(-((day - 19.5 / 24) ** 2) / (2 * (1.8 / 24) ** 2))
+        consumption = np.clip(base + morning + evening + _smooth_noise(rng, n, 0.8, 1800 / self.step), 2.0, None)
+
+        # Charges through the day, drains overnight
+        soc = np.clip(55 + 35 * np.sin(2 * np.pi * (day - 0.42)) + _smooth_noise(rng, n, 2.0, 3600 / self.step), 5, 100)
+
+        ambient = 22 + 7 * np.sin(2 * np.pi * (day - 0.375)) + _smooth_noise(rng, n, 1.0, 6 * 3600 / self.step)
+        humidity = np.clip(70 - 2.2 * (ambient - 22) + _smooth_noise(rng, n, 3.0, 6 * 3600 / self.step), 15, 98)
+        return {
+            "consumption_kW": consumption,
+            "generation_kW": generation,
+            "battery_soc": soc,
+            "solar_irradiance": irradiance,
+            "ambient_temp_c": ambient,
+            "humidity_pct": humidity,
+        }
+
+    def _grid_alerts(self, rng, n):
+        # Roughly one alert every six hours, at fixed sample indices
+        count = max(1, int(n * self.step / (6 * 3600)))
+        indices = np.sort(rng.choice(n, size=min(count, n), replace=False))
+        kinds = rng.integers(0, len(ALERT_MESSAGES), size=len(indices))
+        return indices, kinds
+
+    def now_index(self):
+        """Index of the current simulated sample; simulated time wraps within the horizon."""
+        elapsed = int((time.monotonic() - self._clock0) * self.time_scale // self.step)
+        return self.history + elapsed % self.horizon
+
+    def timestamp(self, index):
+        return datetime.fromtimestamp(self.begin + index * self.step, timezone.utc)
+
+    def has_grid(self, grid_id):
+        return grid_id in self.series
+
+    def value(self, grid_id, name, index):
+        return float(self.series[grid_id][name][index])
+
+    def historical(self, grid_id, metric, period, index):
+        """(ISO timestamps, values) of ``period`` ending at ``index``, each point a window mean."""
+        count, width = PERIODS.get(period, PERIODS["30d"])
+        per_point = max(1, width // self.step)
+        ends = index + 1 - per_point * np.arange(count - 1, -1, -1)
+        starts = np.maximum(ends - per_point, 0)
+        prefix = self.prefix[grid_id][metric]
+        values = (prefix[np.maximum(ends, 0)] - prefix[starts]) / np.maximum(ends - starts, 1)
+        seconds = self.begin + (ends - 1).astype(np.int64) * self.step
+        times = np.datetime_as_string(seconds.astype("datetime64[s]"), unit="s", timezone="UTC")
+        return times, np.round(values, 2)
+
+    def alerts_until(self, grid_id, index, limit=20):
+        """Alerts raised up to ``index``, newest first."""
+        indices, kinds = self.alerts[grid_id]
+        end = int(np.searchsorted(indices, index, side="right"))
+        out = []
+        for i in range(end - 1, max(end - limit, 0) - 1, -1):
+            message, severity = ALERT_MESSAGES[kinds[i]]
+            out.append({
+                "id": f"{grid_id}-a{int(indices[i])}",
+                "message": message,
+                "timestamp": self.timestamp(int(indices[i])).isoformat(),
+                "severity": severity,
+                "grid_id": grid_id,
+                "status": "active",
+            })
+        return out
+
+    def etag(self, *parts):
+        # Same inputs and simulated sample -> same validator, across restarts with the same seed and start
+        return 'W/"%08x"' % zlib.crc32("|".join(map(str, (self.seed, self.start, *parts))).encode())
@@ -1,3 +1,4 @@
+import argparse
 import json
 import os
 import random
@@ -38,7 +39,7 @@ def detect_alerts(payload):
     return alerts
 
 
-def main():
+def main(publish_alerts: bool = False):
     client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
     client.connect(MQTT_BROKER_HOST, MQTT_BROKER_PORT, keepalive=60)
     client.loop_start()
@@ -48,7 +49,8 @@ def main():
             payload = generate_payload()
             client.publish(TOPIC_DATA, json.dumps(payload), qos=0, retain=False)
 
-            for message in detect_alerts(payload):
+            # The backend raises these same alerts from its rules, so publishing them is opt-in
+            for message in detect_alerts(payload) if publish_alerts else ():
                 alert = {
                     "timestamp": payload["timestamp"],
                     "message": message,
@@ -63,5 +65,51 @@ def main():
         client.disconnect()
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Publish simulated microgrid telemetry over MQTT.")
+    parser.add_argument("--load", action="store_true", help="run the multi-grid load generator instead")
+    parser.add_argument(
+        "--publish-alerts",
+        action="store_true",
+        help="also publish client-side alerts on microgrid/alerts (the backend rules already raise them)",
+    )
+    parser.add_argument("--grids", type=int, default=1000)
+    parser.add_argument("--devices-per-grid", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=0.2, help="readings per second per device")
+    parser.add_argument("--qos", type=int, choices=(0, 1), default=0)
+    parser.add_argument("--payload-bytes", type=int, default=0, help="pad payloads to this size")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds to run; 0 runs until interrupted")
+    parser.add_argument("--connections", type=int, default=4, help="MQTT connections per process")
+    parser.add_argument("--processes", type=int, default=1, help="publisher processes to split the fleet across")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="simulated seconds per second")
+    parser.add_argument("--start", default=None, help="ISO start of simulated time (default: now)")
+    parser.add_argument("--output", default=None, help="write the throughput summary as JSON")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.load:
+        from load_generator import LoadConfig, main as load_main
+
+        load_main(
+            LoadConfig(
+                host=MQTT_BROKER_HOST,
+                port=MQTT_BROKER_PORT,
+                grids=args.grids,
+                devices_per_grid=args.devices_per_grid,
+                rate=args.rate,
+                qos=args.qos,
+                payload_bytes=args.payload_bytes,
+                seed=args.seed,
+                duration=args.duration,
+                connections=args.connections,
+                time_scale=args.time_scale,
+                start=args.start,
+            ),
+            processes=args.processes,
+            output=args.output,
+        )
+    else:
+        main(publish_alerts=args.publish_alerts)
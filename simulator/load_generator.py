@@ -0,0 +1,310 @@
+"""Load generator mode for the data simulator.
+
+Runs many virtual grids and devices from one process: readings follow
+seeded diurnal solar and load curves computed with numpy for every device
+due in a tick, and are published on the per-grid/per-device topic tree
+through a small pool of MQTT connections driven from an asyncio scheduler.
+"""
+
+import asyncio
+import json
+import math
+import multiprocessing
+import threading
+import time
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+import paho.mqtt.client as mqtt
+
+TELEMETRY_TOPIC = "microgrid/{grid_id}/device/{device_id}/telemetry"
+
+_TEMPLATE = (
+    '{{"timestamp":"{}","live_power_consumption":{:.2f},"live_generation":{:.2f},'
+    '"battery_soc":{:d},"temp_equipment":{:.2f},"solar_irradiance":{:d}{}}}'
+)
+
+
+def grid_name(index: int) -> str:
+    return f"grid-{index:05d}"
+
+
+@dataclass
+class LoadConfig:
+    host: str = "localhost"
+    port: int = 1883
+    grids: int = 1000
+    devices_per_grid: int = 4
+    # Readings per second per device
+    rate: float = 0.2
+    qos: int = 0
+    # Pad payloads to at least this many bytes (0 = natural size, ~180 bytes)
+    payload_bytes: int = 0
+    seed: int = 42
+    # 0 runs until cancelled
+    duration: float = 60.0
+    connections: int = 4
+    tick: float = 0.1
+    # Simulated seconds per wall-clock second, so a run can sweep through a whole day
+    time_scale: float = 1.0
+    # ISO start of simulated time; None starts at the current time
+    start: Optional[str] = None
+    report_interval: float = 5.0
+    # Messages each connection may hold unsent before publishes are counted as dropped
+    max_queued: int = 10000
+    # This process publishes devices ``shard, shard + shards, ...`` of the fleet
+    shard: int = 0
+    shards: int = 1
+
+
+class DeviceFleet:
+    """Per-device parameters and state, held as arrays indexed by device number."""
+
+    def __init__(self, grids: int, devices_per_grid: int, seed: int, shard: int = 0, shards: int = 1) -> None:
+        n = grids * devices_per_grid
+        self.size = n
+        # Device parameters depend only on the seed, so every shard sees the same fleet
+        params = np.random.default_rng(seed)
+        self.rng = np.random.default_rng([seed, shard])
+        self.devices = np.arange(shard, n, shards)
+        self.topics: List[str] = [
+            TELEMETRY_TOPIC.format(grid_id=grid_name(g), device_id=f"dev-{d:03d}")
+            for g in range(grids)
+            for d in range(devices_per_grid)
+        ]
+        # Devices of one grid share its weather; capacity and load differ per device
+        grid_cloudiness = params.uniform(0.0, 0.6, grids)
+        self.cloudiness = np.repeat(grid_cloudiness, devices_per_grid)
+        self.capacity_kw = params.uniform(8.0, 18.0, n)
+        self.base_load_kw = params.uniform(4.0, 9.0, n)
+        self.battery_kwh = params.uniform(20.0, 60.0, n)
+        self.soc = params.uniform(40.0, 90.0, n)
+        self.last_t = np.full(n, np.nan)
+
+    def readings(self, idx: np.ndarray, t: float) -> Dict[str, np.ndarray]:
+        """Readings for devices ``idx`` at epoch seconds ``t`` (one timestamp per batch)."""
+        k = len(idx)
+        hour = (t % 86400) / 3600.0
+        # Half-sine daylight between 06:00 and 18:00, dimmed by per-grid cloud cover and gusts
+        sun = max(0.0, math.sin(math.pi * (hour - 6.0) / 12.0))
+        cloud = 1.0 - self.cloudiness[idx] * self.rng.uniform(0.0, 1.0, k)
+        irradiance = 100.0 * sun * cloud
+        # Measurement noise scales with the sun so panels read zero at night
+        generation = self.capacity_kw[idx] * sun * (cloud + self.rng.normal(0.0, 0.01, k))
+        # Load peaks in the morning and evening on top of a base draw
+        shape = 0.6 + 0.3 * math.exp(-((hour - 7.5) ** 2) / 2.0) + 0.7 * math.exp(-((hour - 19.5) ** 2) / 4.0)
+        consumption = self.base_load_kw[idx] * shape * self.rng.normal(1.0, 0.05, k)
+        generation = np.clip(generation, 0.0, None)
+        consumption = np.clip(consumption, 0.0, None)
+
+        # Battery absorbs the surplus or covers the deficit since this device's last reading
+        elapsed = np.nan_to_num(t - self.last_t[idx], nan=0.0)
+        soc = self.soc[idx] + (generation - consumption) * (elapsed / 3600.0) / self.battery_kwh[idx] * 100.0
+        soc = np.clip(soc, 20.0, 100.0)
+        self.soc[idx] = soc
+        self.last_t[idx] = t
+
+        ambient = 22.0 + 8.0 * math.sin(math.pi * (hour - 9.0) / 12.0)
+        temperature = ambient + 25.0 * consumption / self.base_load_kw[idx] + self.rng.normal(0.0, 1.5, k)
+        return {
+            "live_power_consumption": consumption,
+            "live_generation": generation,
+            "battery_soc": np.rint(soc).astype(np.int64),
+            "temp_equipment": temperature,
+            "solar_irradiance": np.rint(irradiance).astype(np.int64),
+        }
+
+
+def encode_batch(timestamp: str, values: Dict[str, np.ndarray], payload_bytes: int) -> List[bytes]:
+    rows = zip(
+        values["live_power_consumption"].tolist(),
+        values["live_generation"].tolist(),
+        values["battery_soc"].tolist(),
+        values["temp_equipment"].tolist(),
+        values["solar_irradiance"].tolist(),
+    )
+    payloads = [_TEMPLATE.format(timestamp, c, g, s, te, irr, "").encode() for c, g, s, te, irr in rows]
+    if payload_bytes:
+        for i, body in enumerate(payloads):
+            missing = payload_bytes - len(body) - len(',"pad":""')
+            if missing > 0:
+                payloads[i] = body[:-1] + b',"pad":"' + b"x" * missing + b'"}'
+    return payloads
+
+
+class _Counters:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.published = 0
+        self.acked = 0
+        self.dropped = 0
+        self.bytes = 0
+
+
+async def run_load(config: LoadConfig, on_report=None) -> Dict:
+    """Publish until ``config.duration`` elapses (or the task is cancelled); returns the summary."""
+    fleet = DeviceFleet(config.grids, config.devices_per_grid, config.seed, config.shard, config.shards)
+    counters = _Counters()
+
+    def on_publish(client, userdata, mid, reason_code=None, properties=None):
+        with counters.lock:
+            counters.acked += 1
+
+    clients: List[mqtt.Client] = []
+    connected: List[threading.Event] = []
+    for i in range(max(1, config.connections)):
+        client = mqtt.Client(
+            callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+            client_id=f"solnova-load-{config.seed}-{config.shard}-{i}",
+        )
+        client.max_queued_messages_set(config.max_queued)
+        client.max_inflight_messages_set(1000)
+        if config.qos:
+            client.on_publish = on_publish
+        ready = threading.Event()
+        client.on_connect = lambda c, u, f, rc, p=None, ready=ready: ready.set()
+        client.connect(config.host, config.port, keepalive=60)
+        client.loop_start()
+        clients.append(client)
+        connected.append(ready)
+    for ready in connected:
+        # Publishing before CONNACK would count the whole first tick as dropped
+        await asyncio.to_thread(ready.wait, 10)
+
+    start_sim = (
+        datetime.fromisoformat(config.start.replace("Z", "+00:00"))
+        if config.start
+        else datetime.now(timezone.utc)
+    )
+    # Devices are published round-robin so each tick carries an even share of the fleet
+    devices = fleet.devices
+    per_tick = len(devices) * config.rate * config.tick
+    cursor = 0
+    carry = 0.0
+    ticks = 0
+    behind = 0.0
+    started = time.perf_counter()
+    next_report = started + config.report_interval
+    reports = []
+
+    def snapshot(now: float) -> Dict:
+        elapsed = now - started
+        with counters.lock:
+            return {
+                "elapsed_seconds": round(elapsed, 3),
+                "published": counters.published,
+                "acked": counters.acked,
+                "dropped": counters.dropped,
+                "bytes": counters.bytes,
+                "msgs_per_second": round(counters.published / elapsed, 1) if elapsed else 0.0,
+                "behind_seconds": round(behind, 3),
+            }
+
+    try:
+        while True:
+            now = time.perf_counter()
+            if config.duration and now - started >= config.duration:
+                break
+            if now >= next_report:
+                report = snapshot(now)
+                reports.append(report)
+                if on_report is not None:
+                    on_report(report)
+                next_report += config.report_interval
+
+            carry += per_tick
+            count = min(int(carry), len(devices))
+            carry -= count
+            if count:
+                idx = devices[(cursor + np.arange(count)) % len(devices)]
+                cursor = (cursor + count) % len(devices)
+                sim_time = start_sim + timedelta(seconds=ticks * config.tick * config.time_scale)
+                values = fleet.readings(idx, sim_time.timestamp())
+                payloads = encode_batch(sim_time.isoformat(), values, config.payload_bytes)
+                published = dropped = size = 0
+                for device, body in zip(idx.tolist(), payloads):
+                    info = clients[device % len(clients)].publish(fleet.topics[device], body, qos=config.qos)
+                    if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                        published += 1
+                        size += len(body)
+                    else:
+                        dropped += 1
+                with counters.lock:
+                    counters.published += published
+                    counters.dropped += dropped
+                    counters.bytes += size
+            ticks += 1
+
+            # Sleep to the next tick boundary; when publishing overruns the tick, catch up without sleeping
+            delay = started + ticks * config.tick - time.perf_counter()
+            behind = max(0.0, -delay)
+            await asyncio.sleep(max(0.0, delay))
+    finally:
+        summary = snapshot(time.perf_counter())
+        for client in clients:
+            client.loop_stop()
+            client.disconnect()
+
+    summary["config"] = asdict(config)
+    summary["devices"] = len(devices)
+    summary["target_msgs_per_second"] = len(devices) * config.rate
+    summary["reports"] = reports
+    return summary
+
+
+def print_report(report: Dict) -> None:
+    shard = f"shard {report['shard']} " if "shard" in report else ""
+    print(
+        f"[{shard}{report['elapsed_seconds']:8.1f}s] published={report['published']} "
+        f"rate={report['msgs_per_second']}/s acked={report['acked']} "
+        f"dropped={report['dropped']} behind={report['behind_seconds']}s",
+        flush=True,
+    )
+
+
+def _run_shard(config: LoadConfig) -> Dict:
+    def report(snapshot: Dict) -> None:
+        print_report({"shard": config.shard, **snapshot})
+
+    return asyncio.run(run_load(config, on_report=report if config.shards > 1 else print_report))
+
+
+def run_sharded(config: LoadConfig, processes: int = 1) -> Dict:
+    """Split the fleet across ``processes`` publisher processes and merge their summaries.
+
+    One Python process tops out at a few thousand publishes per second, so
+    saturating the backend takes several.
+    """
+    if processes <= 1:
+        return _run_shard(config)
+    shards = [replace(config, shard=i, shards=processes) for i in range(processes)]
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map(_run_shard, shards)
+    totals = {key: sum(r[key] for r in results) for key in ("published", "acked", "dropped", "bytes", "devices")}
+    return {
+        "elapsed_seconds": max(r["elapsed_seconds"] for r in results),
+        **totals,
+        "msgs_per_second": round(sum(r["msgs_per_second"] for r in results), 1),
+        "behind_seconds": max(r["behind_seconds"] for r in results),
+        "target_msgs_per_second": sum(r["target_msgs_per_second"] for r in results),
+        "config": {**asdict(config), "shards": processes},
+        "shards": results,
+    }
+
+
+def main(config: LoadConfig, processes: int = 1, output: Optional[str] = None) -> None:
+    try:
+        summary = run_sharded(config, processes)
+    except KeyboardInterrupt:
+        return
+    print_report(summary)
+    print(
+        f"{summary['devices']} devices, target {summary['target_msgs_per_second']:.0f} msgs/s, "
+        f"achieved {summary['msgs_per_second']} msgs/s",
+        flush=True,
+    )
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
@@ -56,6 +56,22 @@ def test_alerts_endpoint(token: str) -> None:
     print(f"✓ Alerts endpoint working, {len(data)} alerts")
 
 
+def test_grid_alerts_endpoint(token: str) -> None:
+    """Test per-grid alerts endpoint returns a page of alerts."""
+    print("Testing grid alerts endpoint...")
+    resp = requests.get(
+        f"{API_BASE}/api/alerts/grid-001?status=active&limit=10",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert isinstance(data, list), "Alerts should be a list"
+    assert len(data) <= 10, "Page should respect the limit"
+    for alert in data:
+        assert alert["status"] == "active"
+    print(f"✓ Grid alerts endpoint working, {len(data)} alerts")
+
+
 def test_historical_endpoint(token: str) -> None:
     """Test historical endpoint returns data points."""
     print("Testing historical endpoint...")
@@ -106,6 +122,7 @@ def main():
         # Test protected endpoints
         test_realtime_endpoint(token)
         test_alerts_endpoint(token)
+        test_grid_alerts_endpoint(token)
         test_historical_endpoint(token)
         
         print("\n✅ All tests passed! Prototype is working correctly.")
@@ -0,0 +1,11 @@
+"""Keep the backend's on-disk state in a scratch directory while its modules are imported under test."""
+import os
+import tempfile
+
+_state = tempfile.mkdtemp(prefix="solnova-tests-")
+os.environ.update({
+    "ALERTS_DB_PATH": os.path.join(_state, "alerts.db"),
+    "SPOOL_DIR": os.path.join(_state, "spool"),
+    "ROLLUP_STATE_PATH": os.path.join(_state, "rollup_state.json"),
+    "RULES_PATH": "",
+})
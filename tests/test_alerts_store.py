@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend.alerts_store import AlertsStore
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = AlertsStore(str(tmp_path / "alerts.db"))
+    store.start()
+    yield store
+    store.stop()
+
+
+def _flush(store: AlertsStore) -> None:
+    # Stopping the writer commits everything queued; it can be started again afterwards
+    store._writer.stop()
+    store._writer.start()
+
+
+def _add_many(store: AlertsStore, n: int, grid_id: str = "g1") -> None:
+    for i in range(n):
+        # Distinct types so nothing coalesces
+        store.add(f"Type {i}: reading", (T0 + timedelta(seconds=i)).isoformat(), grid_id=grid_id, device_id="d")
+    _flush(store)
+
+
+def test_cursor_pagination_walks_every_alert_newest_first(store):
+    _add_many(store, 7)
+    seen, cursor = [], None
+    while True:
+        page, cursor = store.list(limit=3, cursor=cursor)
+        seen.extend(page)
+        if cursor is None:
+            break
+    assert len(seen) == 7
+    assert [a["timestamp"] for a in seen] == sorted((a["timestamp"] for a in seen), reverse=True)
+    assert len({a["id"] for a in seen}) == 7
+
+
+def test_filters_and_last_page_cursor(store):
+    _add_many(store, 2, grid_id="g1")
+    _add_many(store, 3, grid_id="g2")
+    page, cursor = store.list(grid_id="g2", status="active", limit=10)
+    assert len(page) == 3 and cursor is None
+    assert {a["grid_id"] for a in page} == {"g2"}
+    assert store.list(severity="critical")[0] == []
+
+
+def test_invalid_cursor_is_rejected(store):
+    with pytest.raises(ValueError):
+        store.list(cursor="not-a-cursor")
+
+
+def test_acknowledge_changes_the_version_only_when_a_row_changes(store):
+    _add_many(store, 1)
+    alert_id = store.list()[0][0]["id"]
+    version = store.version
+    acknowledged = store.acknowledge(alert_id, operator="ops")
+    assert (acknowledged.status, acknowledged.acknowledged_by) == ("acknowledged", "ops")
+    assert store.version == version + 1
+    # Repeats and unknown ids change nothing, so list validators stay valid
+    assert store.acknowledge(alert_id, operator="someone else").acknowledged_by == "ops"
+    assert store.acknowledge("alert-missing") is None
+    assert store.version == version + 1
+
+
+def test_an_alert_can_be_acknowledged_before_its_insert_is_committed(store):
+    alert = store.add("Load Abnormality: high", T0.isoformat(), grid_id="g1", device_id="d1")
+    acknowledged = store.acknowledge(alert.id, operator="ops")
+    assert (acknowledged.id, acknowledged.status, acknowledged.acknowledged_by) == (alert.id, "acknowledged", "ops")
+    assert store.acknowledge(alert.id, operator="someone else").acknowledged_by == "ops"
+    _flush(store)
+    stored = store.get(alert.id)
+    assert (stored.status, stored.acknowledged_by) == ("acknowledged", "ops")
+
+
+def test_a_repeat_after_an_acknowledgement_opens_a_new_active_alert(store):
+    first = store.add("Load Abnormality: high", T0.isoformat(), grid_id="g1", device_id="d1")
+    _flush(store)
+    store.acknowledge(first.id, operator="ops")
+    repeat = store.add("Load Abnormality: high", (T0 + timedelta(seconds=5)).isoformat(), grid_id="g1", device_id="d1")
+    assert repeat.id != first.id
+    assert (repeat.status, repeat.count) == ("active", 1)
+    _flush(store)
+    assert store.get(first.id).status == "closed"
+    assert store.get(first.id).acknowledged_by == "ops"
+    assert store.get(repeat.id).status == "active"
+
+
+def test_stored_count_is_kept_without_counting_the_table(store, tmp_path):
+    _add_many(store, 4)
+    assert store.stats()["stored"] == 4
+    store.stop()
+    reopened = AlertsStore(str(tmp_path / "alerts.db"))
+    assert reopened.stats()["stored"] == 4
+
+
+def test_repeats_of_an_alert_coalesce_into_the_open_one(store):
+    first = store.add("Load Abnormality: high", T0.isoformat(), grid_id="g1", device_id="d1")
+    repeat = store.add("Load Abnormality: higher", (T0 + timedelta(seconds=5)).isoformat(), grid_id="g1", device_id="d1")
+    other_device = store.add("Load Abnormality: high", T0.isoformat(), grid_id="g1", device_id="d2")
+    assert repeat.id == first.id and repeat.count == 2
+    assert other_device.id != first.id and other_device.count == 1
+    _flush(store)
+    stored = {a["id"]: a for a in store.list()[0]}
+    assert len(stored) == 2
+    assert stored[first.id]["count"] == 2
+    assert stored[first.id]["last_seen"] == (T0 + timedelta(seconds=5)).isoformat()
+    assert store.stats()["coalesced"] == 1
+
+
+def test_a_repeat_after_the_quiet_period_closes_the_old_alert_and_opens_a_new_one(tmp_path):
+    store = AlertsStore(str(tmp_path / "quiet.db"), quiet_period=0.0)
+    store.start()
+    try:
+        first = store.add("Load Abnormality: high", T0.isoformat(), grid_id="g1", device_id="d1")
+        second = store.add("Load Abnormality: high", (T0 + timedelta(minutes=10)).isoformat(), grid_id="g1", device_id="d1")
+        assert second.id != first.id
+        _flush(store)
+        assert store.get(first.id).status == "closed"
+        assert store.get(second.id).status == "active"
+    finally:
+        store.stop()
+
+
+def test_open_alerts_keep_coalescing_after_a_restart(store, tmp_path):
+    first = store.add("Load Abnormality: high", T0.isoformat(), grid_id="g1", device_id="d1")
+    store.stop()
+    reopened = AlertsStore(str(tmp_path / "alerts.db"))
+    reopened.start()
+    try:
+        repeat = reopened.add("Load Abnormality: high", T0.isoformat(), grid_id="g1", device_id="d1")
+        assert repeat.id == first.id and repeat.count == 2
+    finally:
+        reopened.stop()
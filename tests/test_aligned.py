@@ -0,0 +1,107 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import db, main
+from backend.config import settings
+from backend.encoding import to_aligned, to_aligned_columnar
+from backend.historical_cache import HistoricalCache
+from backend.rollups import TIERS
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+AUTH = {"Authorization": f"Bearer {settings.api_token}"}
+SAMPLES = [(T0, (5.0, 60.0)), (T0 + timedelta(hours=1), (None, 62.5))]
+
+
+def _record(time, **values):
+    return SimpleNamespace(get_time=lambda: time, values=values)
+
+
+@pytest.fixture
+def flux(monkeypatch):
+    """Captures Flux queries; answers with windows out of order and a missing value."""
+    queries = []
+    # Inside the requested period, which the cache trims to
+    recent = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) - timedelta(hours=2)
+
+    async def query(q):
+        queries.append(q)
+        return [SimpleNamespace(records=[
+            _record(recent + timedelta(hours=1), consumption_kW=None, battery_soc=62.5),
+            _record(recent, consumption_kW=5.0, battery_soc=60.0),
+        ])]
+
+    monkeypatch.setattr(db, "_query", query)
+    monkeypatch.setattr(db, "historical_cache", HistoricalCache(max_bytes=1 << 20))
+    return SimpleNamespace(queries=queries, start=recent)
+
+
+def test_several_metrics_come_from_one_query_in_time_order(flux):
+    samples = asyncio.run(db.query_aligned("g1", ["consumption_kW", "battery_soc"], "24h", 24))
+    assert samples == [(flux.start, (5.0, 60.0)), (flux.start + timedelta(hours=1), (None, 62.5))]
+    assert len(flux.queries) == 1
+
+
+def test_each_metric_is_combined_across_devices_by_its_own_aggregation():
+    q = db._aligned_query("g1", ["consumption_kW", "generation_kW", "battery_soc"], "24h", 3600, "mean")
+    assert q.count("by_sum = devices") == 1 and q.count("by_mean = devices") == 1
+    assert 'columnKey: ["_field"]' in q
+    assert 'keep(columns: ["_time", "consumption_kW", "generation_kW", "battery_soc"])' in q
+
+
+def test_rollup_tiers_read_their_aggregate_columns():
+    q = db._aligned_query("g1", ["consumption_kW", "battery_soc"], "30d", 3600 * 6, "max", T0, T0 + timedelta(days=1), TIERS[-1])
+    assert 'keep(columns: ["_time", "consumption_kW_max", "battery_soc_max"])' in q
+
+
+@pytest.mark.parametrize("metrics,agg", [([], "mean"), (["voltage"], "mean"), (["battery_soc"], "lttb")])
+def test_unsupported_requests_query_nothing(flux, metrics, agg):
+    assert asyncio.run(db.query_aligned("g1", metrics, "24h", 24, agg)) == []
+    assert flux.queries == []
+
+
+def test_aligned_encodings_keep_gaps_as_null():
+    metrics = ["consumption_kW", "battery_soc"]
+    assert to_aligned(SAMPLES, metrics) == {
+        "time": [T0.isoformat(), (T0 + timedelta(hours=1)).isoformat()],
+        "values": {"consumption_kW": [5.0, None], "battery_soc": [60.0, 62.5]},
+    }
+    columnar = to_aligned_columnar(SAMPLES, metrics)
+    assert columnar["start"] == int(T0.timestamp() * 1000) and columnar["step"] == 3600 * 1000
+    assert columnar["values"] == {"consumption_kW": [5.0, None], "battery_soc": [60.0, 62.5]}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    calls = []
+
+    async def query_aligned(grid_id, metrics, period, points, agg):
+        calls.append((grid_id, metrics, period, points, agg))
+        return SAMPLES
+
+    monkeypatch.setattr(main, "query_aligned", query_aligned)
+    return TestClient(main.app), calls
+
+
+def test_the_endpoint_serves_a_metrics_list_once_each(client):
+    client, calls = client
+    response = client.get(
+        "/api/dashboard/historical?period=24h&metrics=consumption_kW,battery_soc,consumption_kW&grid_id=g1", headers=AUTH
+    )
+    assert response.status_code == 200
+    assert response.json()["values"] == {"consumption_kW": [5.0, None], "battery_soc": [60.0, 62.5]}
+    assert calls[0][:3] == ("g1", ["consumption_kW", "battery_soc"], "24h")
+
+
+@pytest.mark.parametrize("query", [
+    "metrics=consumption_kW&agg=lttb",
+    "metrics=consumption_kW&format=binary",
+    "metrics=consumption_kW&stream=true",
+    "metrics=voltage",
+    "metrics=consumption_kW&metric=battery_soc",
+])
+def test_the_endpoint_rejects_what_cannot_be_aligned(client, query):
+    assert client[0].get(f"/api/dashboard/historical?period=24h&{query}", headers=AUTH).status_code == 400
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from backend.anomaly import RATIO, AnomalyDetector
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+LOAD = "live_power_consumption"
+
+
+def _load_readings(values, device_id="d1", start=0):
+    return [("g1", device_id, T0 + timedelta(seconds=start + i), {LOAD: v}) for i, v in enumerate(values)]
+
+
+def _steady(n, seed=0):
+    return (5.0 + np.random.default_rng(seed).normal(0.0, 0.1, n)).tolist()
+
+
+def test_nothing_fires_during_warmup():
+    detector = AnomalyDetector(metrics=[LOAD])
+    assert detector.observe(_load_readings([5.0, 5.1, 4.9, 50.0])) == []
+
+
+def test_a_spike_fires_once_per_episode_and_rearms():
+    detector = AnomalyDetector(metrics=[LOAD])
+    detector.observe(_load_readings(_steady(100)))
+    first = detector.observe(_load_readings([50.0, 60.0], start=100))
+    assert [(a.metric, a.value) for a in first] == [(LOAD, 50.0)]
+    assert first[0].score > 4.0 and 4.5 < first[0].baseline < 5.5
+    assert first[0].message.startswith(f"Anomaly ({LOAD}): value 50 is ")
+    assert detector.observe(_load_readings([5.0], start=102)) == []
+    assert len(detector.observe(_load_readings([50.0], start=103))) == 1
+    assert detector.stats()["fired"] == 2
+
+
+def test_one_spike_does_not_hide_the_next():
+    detector = AnomalyDetector(metrics=[LOAD])
+    detector.observe(_load_readings(_steady(100)))
+    readings = _load_readings([50.0] + _steady(5, seed=1) + [50.0], start=100)
+    assert len(detector.observe(readings)) == 2
+
+
+def test_a_batch_gives_the_same_result_as_single_readings():
+    values = _steady(100) + [40.0, 5.0, 45.0]
+    batched = AnomalyDetector(metrics=[LOAD])
+    single = AnomalyDetector(metrics=[LOAD])
+    readings = _load_readings(values) + _load_readings(values, device_id="d2")
+    # Interleave the devices so a batch carries several readings of each
+    readings = [r for pair in zip(readings[:len(values)], readings[len(values):]) for r in pair]
+    fired_batched = [(a.device_id, a.value) for a in batched.observe(readings)]
+    fired_single = [(a.device_id, a.value) for r in readings for a in single.observe([r])]
+    assert sorted(fired_batched) == sorted(fired_single) == sorted([("d1", 40.0), ("d1", 45.0), ("d2", 40.0), ("d2", 45.0)])
+    assert batched.snapshot("g1", "d1", T0.timestamp())["metrics"][LOAD]["mean"] == \
+        single.snapshot("g1", "d1", T0.timestamp())["metrics"][LOAD]["mean"]
+
+
+def test_generation_falling_behind_irradiance_fires_the_ratio():
+    detector = AnomalyDetector(metrics=["live_generation", "solar_irradiance"])
+    rng = np.random.default_rng(2)
+
+    def reading(i, irradiance, efficiency):
+        payload = {"live_generation": irradiance * efficiency * rng.normal(1.0, 0.01), "solar_irradiance": irradiance}
+        return "g1", "d1", T0 + timedelta(minutes=i), payload
+
+    # Each field alone swings widely with the sun; only their ratio is steady
+    assert detector.observe([reading(i, rng.uniform(200.0, 800.0), 0.02) for i in range(100)]) == []
+    # Irradiance below the minimum says nothing about the panels and is not scored
+    assert detector.observe([reading(100, 10.0, 0.0)]) == []
+    fired = detector.observe([reading(101, 700.0, 0.01)])
+    assert [a.metric for a in fired] == [RATIO]
+    assert "below its baseline" in fired[0].message and fired[0].value < fired[0].baseline / 1.5
+
+
+def test_least_recently_seen_device_is_evicted_at_capacity():
+    detector = AnomalyDetector(metrics=[LOAD], warmup=10, max_devices=2)
+    detector.observe(_load_readings([5.0], device_id="d1"))
+    detector.observe(_load_readings([5.0], device_id="d2"))
+    detector.observe(_load_readings([5.0], device_id="d1", start=1))
+    detector.observe(_load_readings([5.0], device_id="d3"))
+    stats = detector.stats()
+    assert stats["devices"] == 2 and stats["evicted"] == 1 and stats["capacity"] == 2
+    assert detector.snapshot("g1", "d2", T0.timestamp()) is None
+    # The reused row starts empty
+    assert detector.snapshot("g1", "d3", T0.timestamp())["metrics"][LOAD]["samples"] == 1
+
+
+def test_snapshot_min_and_max_cover_only_the_window():
+    detector = AnomalyDetector(metrics=[LOAD], window=600.0, blocks=6)
+    detector.observe(_load_readings([9.0, 1.0]))
+    detector.observe(_load_readings([5.0, 6.0], start=900))
+    now = (T0 + timedelta(seconds=901)).timestamp()
+    metrics = detector.snapshot("g1", "d1", now)["metrics"][LOAD]
+    assert (metrics["min"], metrics["max"], metrics["samples"]) == (5.0, 6.0, 4)
+    later = detector.snapshot("g1", "d1", now + 3600)["metrics"][LOAD]
+    assert later["min"] is None and later["max"] is None
+
+
+def test_non_numeric_fields_leave_statistics_untouched():
+    detector = AnomalyDetector(metrics=[LOAD, "battery_soc"])
+    detector.observe([("g1", "d1", T0, {LOAD: "5", "battery_soc": True}), ("g1", "d1", T0, {LOAD: 4.0})])
+    metrics = detector.snapshot("g1", "d1", T0.timestamp())["metrics"]
+    assert set(metrics) == {LOAD} and metrics[LOAD]["samples"] == 1
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from backend.batch_writer import BatchWriter
+
+
+def _full_writer(policy: str, **kwargs) -> BatchWriter:
+    # Not started, so nothing drains the queue
+    writer = BatchWriter(flush=lambda batch: None, max_queue=2, policy=policy, **kwargs)
+    assert writer.put(1) and writer.put(2)
+    return writer
+
+
+def _queued(writer: BatchWriter) -> list:
+    items = []
+    while not writer._queue.empty():
+        items.append(writer._queue.get_nowait())
+    return items
+
+
+def test_drop_oldest_evicts_the_head_of_the_queue():
+    writer = _full_writer("drop_oldest")
+    assert writer.put(3)
+    assert _queued(writer) == [2, 3]
+    assert writer.stats()["dropped"] == 1
+
+
+def test_drop_newest_rejects_the_incoming_item():
+    writer = _full_writer("drop_newest")
+    assert not writer.put(3)
+    assert _queued(writer) == [1, 2]
+    assert writer.stats()["dropped"] == 1
+
+
+def test_block_gives_up_after_the_timeout():
+    writer = _full_writer("block", block_timeout=0.05)
+    started = time.monotonic()
+    assert not writer.put(3)
+    assert time.monotonic() - started >= 0.05
+    assert writer.stats()["dropped"] == 1
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        BatchWriter(flush=lambda batch: None, policy="drop_all")
+
+
+def test_flushes_full_batches_and_the_rest_on_stop():
+    batches = []
+    writer = BatchWriter(flush=batches.append, batch_size=3, flush_interval=60.0)
+    for item in range(7):
+        writer.put(item)
+    writer.start()
+    writer.stop()
+    assert [item for batch in batches for item in batch] == list(range(7))
+    assert all(len(batch) <= 3 for batch in batches)
+    assert writer.stats()["written"] == 7
+
+
+def test_flushes_a_partial_batch_after_the_interval():
+    flushed = threading.Event()
+    writer = BatchWriter(flush=lambda batch: flushed.set(), batch_size=100, flush_interval=0.05)
+    writer.start()
+    try:
+        writer.put("reading")
+        assert flushed.wait(2.0)
+    finally:
+        writer.stop()
+
+
+def test_failed_flushes_are_counted():
+    def fail(batch):
+        raise ConnectionError("influx down")
+
+    writer = BatchWriter(flush=fail, batch_size=2, flush_interval=60.0)
+    writer.put(1)
+    writer.put(2)
+    writer.start()
+    writer.stop()
+    stats = writer.stats()
+    assert stats["failed"] == 2
+    assert stats["written"] == 0
@@ -0,0 +1,77 @@
+import time
+from argparse import Namespace
+
+import pytest
+
+from backend import db
+from benchmarks.broker import topic_matches
+from benchmarks.stats import percentiles
+
+# The Influx stand-in runs on aiohttp, which only benchmarks/requirements.txt installs
+pytest.importorskip("aiohttp")
+from benchmarks.influx_sink import Sink  # noqa: E402
+from benchmarks.run import _backend_env  # noqa: E402
+
+HOUR_NS = 3600 * 1_000_000_000
+
+
+def test_percentiles_use_nearest_rank():
+    values = list(range(1, 101))
+    assert percentiles(values) == {"count": 100, "p50": 50, "p95": 95, "p99": 99, "max": 100}
+    assert percentiles([]) == {"count": 0, "p50": None, "p95": None, "p99": None, "max": None}
+
+
+@pytest.mark.parametrize("pattern,topic,expected", [
+    ("microgrid/+/device/+/telemetry", "microgrid/g1/device/d1/telemetry", True),
+    ("microgrid/+/device/+/telemetry", "microgrid/g1/device/d1", False),
+    ("microgrid/#", "microgrid/g1/alerts", True),
+    ("microgrid/g1/alerts", "microgrid/g2/alerts", False),
+])
+def test_broker_topic_filters(pattern, topic, expected):
+    assert topic_matches(pattern, topic) is expected
+
+
+@pytest.fixture
+def sink():
+    """Two devices of g1 reporting twice in the previous whole hour."""
+    sink = Sink()
+    hour = (time.time_ns() // HOUR_NS - 1) * HOUR_NS
+    lines = [
+        f"microgrid,device_id=d1,grid_id=g1 consumption_kW=2.0,battery_soc=40i {hour}",
+        f"microgrid,device_id=d1,grid_id=g1 consumption_kW=4.0,battery_soc=60i {hour + 60_000_000_000}",
+        f"microgrid,device_id=d2,grid_id=g1 consumption_kW=1.0,battery_soc=80i {hour + 30_000_000_000}",
+        f"microgrid,device_id=d3,grid_id=g2 consumption_kW=9.0,battery_soc=10i {hour}",
+    ]
+    sink.write("\n".join(lines).encode(), "ns")
+    sink.hour = hour
+    return sink
+
+
+def _rows(csv):
+    return [line.split(",")[3:] for line in csv.split("\r\n") if line.startswith(",,")]
+
+
+def test_the_sink_answers_the_backends_series_queries_per_grid(sink):
+    # Power adds up across devices, state of charge is averaged, as the backend asks
+    consumption = _rows(sink.query(db._series_query("g1", "consumption_kW", "24h", 3600, "mean")))
+    soc = _rows(sink.query(db._series_query("g1", "battery_soc", "24h", 3600, "max")))
+    assert [float(value) for _, value in consumption] == [4.0]
+    assert [float(value) for _, value in soc] == [70.0]
+
+
+def test_the_sink_answers_the_backends_aligned_queries(sink):
+    rows = _rows(sink.query(db._aligned_query("g1", ["consumption_kW", "battery_soc"], "24h", 3600, "mean")))
+    assert [[float(v) for v in values] for _, *values in rows] == [[4.0, 65.0]]
+
+
+def test_the_sink_keeps_write_statistics(sink):
+    stats = sink.stats()
+    assert stats["points"] == 4 and stats["writes"] == 1 and stats["series"] == 4
+    assert stats["write_lag_seconds"]["count"] == 4
+
+
+def test_the_benchmarked_backend_writes_only_into_its_workdir(tmp_path):
+    args = Namespace(influx_org="org", influx_bucket="bucket")
+    env = _backend_env(args, str(tmp_path), 1883, "http://127.0.0.1:8086", "token")
+    for name in ("ALERTS_DB_PATH", "ROLLUP_STATE_PATH", "SPOOL_DIR"):
+        assert env[name].startswith(str(tmp_path))
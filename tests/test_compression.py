@@ -0,0 +1,71 @@
+import asyncio
+import zlib
+
+from backend import main
+from backend.compression import StreamingGZipMiddleware
+from backend.config import settings
+
+
+def _scope(path: str, query: str = "", headers=()) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"accept-encoding", b"gzip"), *headers],
+        "client": ("test", 1),
+        "server": ("test", 80),
+    }
+
+
+async def _first_chunks(app, scope: dict, chunks: int) -> list:
+    """Start, then the first ``chunks`` body messages, after which the client disconnects."""
+    messages = []
+    enough = asyncio.Event()
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await enough.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+        if len(messages) > chunks:
+            enough.set()
+
+    await asyncio.wait_for(app(scope, receive, send), 5)
+    return messages
+
+
+def test_event_stream_is_not_compressed_even_when_gzip_is_accepted():
+    scope = _scope("/api/stream", f"token={settings.api_token}")
+    start, first = asyncio.run(_first_chunks(main.app, scope, 1))[:2]
+    headers = dict(start["headers"])
+    assert headers[b"content-type"].startswith(b"text/event-stream")
+    assert b"content-encoding" not in headers
+    assert first["body"] == b"retry: 5000\n\n"
+
+
+def test_streamed_chunks_are_decodable_as_they_arrive():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/csv")]})
+        for i in range(3):
+            await send({"type": "http.response.body", "body": f"row {i}\n".encode(), "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    messages = asyncio.run(_first_chunks(StreamingGZipMiddleware(app, minimum_size=1), _scope("/"), 4))
+    assert (b"content-encoding", b"gzip") in messages[0]["headers"]
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for i, message in enumerate(messages[1:4]):
+        assert decoder.decompress(message["body"]) == f"row {i}\n".encode()
+    assert decoder.decompress(messages[4]["body"]) == b""
+    assert decoder.eof
@@ -0,0 +1,119 @@
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import latest_store as latest_store_module
+from backend import main
+from backend.conditional import etag, matches
+from backend.config import settings
+from backend.latest_store import LatestStore
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+AUTH = {"Authorization": f"Bearer {settings.api_token}"}
+READING = {"consumption_kW": 2.0, "generation_kW": 5.0, "battery_soc": 60.0}
+
+
+def test_etags_are_weak_and_depend_on_every_part():
+    tag = etag("realtime", "g1", 3)
+    assert tag.startswith('W/"') and tag == etag("realtime", "g1", 3)
+    assert tag != etag("realtime", "g1", 4)
+    assert tag != etag("realtime", "g2", 3)
+
+
+@pytest.mark.parametrize("header,expected", [
+    (None, False),
+    ("", False),
+    ("*", True),
+    ("{tag}", True),
+    ("{strong}", True),
+    ('W/"other", {tag}', True),
+    ('W/"other"', False),
+])
+def test_if_none_match_uses_weak_comparison(header, expected):
+    tag = etag("x")
+    if header is not None:
+        header = header.format(tag=tag, strong=tag[2:])
+    assert matches(header, tag) is expected
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Drives both the settle tracking and the window the current time falls in
+    clock = SimpleNamespace(monotonic=lambda: clock.now, time=lambda: clock.wall, perf_counter=time.perf_counter)
+    clock.now, clock.wall = 1000.0, T0.timestamp() + 3600
+    monkeypatch.setattr(latest_store_module, "time", clock)
+    monkeypatch.setattr(main, "time", clock)
+    return clock
+
+
+def test_readings_settle_once_the_delay_has_passed(clock):
+    store = LatestStore(settle_delay=2.0)
+    assert store.settled("g1") is None
+    store.update("g1", "d1", READING, T0)
+    clock.now += 1.0
+    store.update("g1", "d1", READING, T0 + timedelta(seconds=1))
+    assert store.settled("g1") is None
+    clock.now += 1.5
+    assert store.settled("g1") == T0.timestamp()
+    clock.now += 1.0
+    assert store.settled("g1") == T0.timestamp() + 1
+    # An out-of-order reading never moves the settled time backwards
+    store.update("g1", "d1", READING, T0 - timedelta(minutes=5))
+    clock.now += 3.0
+    assert store.settled("g1") == T0.timestamp() + 1
+
+
+@pytest.fixture
+def api(clock, monkeypatch):
+    store = LatestStore(settle_delay=0.0)
+
+    async def query_historical(**kwargs):
+        return []
+
+    monkeypatch.setattr(main, "latest_store", store)
+    monkeypatch.setattr(main, "query_historical", query_historical)
+    return TestClient(main.app), store
+
+
+def test_realtime_revalidates_until_the_next_reading(api):
+    client, store = api
+    cold = client.get("/api/dashboard/realtime?grid_id=g1", headers=AUTH)
+    assert "ETag" not in cold.headers
+
+    store.update("g1", "d1", READING, T0)
+    tag = client.get("/api/dashboard/realtime?grid_id=g1", headers=AUTH).headers["ETag"]
+    assert client.get("/api/dashboard/realtime?grid_id=g1", headers={**AUTH, "If-None-Match": tag}).status_code == 304
+    store.update("g1", "d1", READING, T0 + timedelta(seconds=1))
+    assert client.get("/api/dashboard/realtime?grid_id=g1", headers={**AUTH, "If-None-Match": tag}).status_code == 200
+
+
+def test_series_keep_their_tag_while_readings_fill_a_served_window(api, clock):
+    client, store = api
+    url = "/api/historical/g1/consumption_kW?period=1h&max_points=60"
+
+    def get(tag=None):
+        return client.get(url, headers={**AUTH, "If-None-Match": tag} if tag else AUTH)
+
+    store.update("g1", "d1", READING, T0 + timedelta(seconds=5))
+    clock.now += 1.0
+    tag = get().headers["ETag"]
+
+    # Readings in the same minute window, settled or not, do not change the series
+    store.update("g1", "d1", READING, T0 + timedelta(seconds=30))
+    clock.now += 1.0
+    assert get(tag).status_code == 304
+
+    # A reading in the next window changes it once it has settled
+    store.update("g1", "d1", READING, T0 + timedelta(seconds=61))
+    assert get(tag).status_code == 304
+    clock.now += 1.0
+    response = get(tag)
+    assert response.status_code == 200
+
+    # So does the range sliding forward by a window
+    tag = response.headers["ETag"]
+    clock.wall += 60
+    assert get(tag).status_code == 200
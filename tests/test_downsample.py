@@ -0,0 +1,41 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+from backend.downsample import PERIOD_SECONDS, lttb, window_seconds
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _series(values) -> list:
+    return [(T0 + timedelta(seconds=i), float(v)) for i, v in enumerate(values)]
+
+
+def test_window_keeps_the_period_within_the_budget():
+    for period, seconds in PERIOD_SECONDS.items():
+        for budget in (10, 500, 1000, 5000):
+            every = window_seconds(period, budget)
+            assert math.ceil(seconds / every) <= budget
+    assert window_seconds("1h", 100000) == 1
+
+
+def test_lttb_returns_at_most_threshold_samples_with_both_ends():
+    samples = _series(math.sin(i / 10) for i in range(1000))
+    reduced = lttb(samples, 100)
+    assert len(reduced) == 100
+    assert reduced[0] == samples[0]
+    assert reduced[-1] == samples[-1]
+    assert [t for t, _ in reduced] == sorted(t for t, _ in reduced)
+
+
+def test_lttb_keeps_a_spike_that_averaging_would_flatten():
+    values = [0.0] * 1000
+    values[537] = 100.0
+    reduced = lttb(_series(values), 50)
+    assert max(v for _, v in reduced) == 100.0
+
+
+def test_lttb_leaves_short_series_and_tiny_thresholds_alone():
+    samples = _series(range(10))
+    assert lttb(samples, 10) == samples
+    assert lttb(samples, 50) == samples
+    assert lttb(samples, 2) == samples
@@ -0,0 +1,100 @@
+import asyncio
+import struct
+from datetime import datetime, timedelta, timezone
+
+import orjson
+import pytest
+
+from backend.encoding import (
+    BINARY,
+    BINARY_MAGIC,
+    BINARY_MEDIA_TYPE,
+    COLUMNAR,
+    COLUMNAR_MEDIA_TYPE,
+    JSON,
+    iter_json_points,
+    negotiate,
+    pack_series,
+    to_columnar,
+)
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _samples(n: int, step: float = 60.0) -> list:
+    return [(T0 + timedelta(seconds=i * step), i / 2) for i in range(n)]
+
+
+async def _aiter(samples):
+    for sample in samples:
+        yield sample
+
+
+async def _collect(chunks) -> list:
+    return [chunk async for chunk in chunks]
+
+
+def test_streamed_json_is_one_valid_array_in_several_chunks():
+    samples = _samples(25)
+    chunks = asyncio.run(_collect(iter_json_points(_aiter(samples), chunk_size=10)))
+    # Opening bracket, three chunks of points, closing bracket
+    assert len(chunks) == 5
+    body = orjson.loads(b"".join(chunks))
+    assert body == [{"time": t.isoformat(), "value": v} for t, v in samples]
+
+
+def test_streamed_json_of_nothing_is_an_empty_array():
+    chunks = asyncio.run(_collect(iter_json_points(_aiter([]))))
+    assert orjson.loads(b"".join(chunks)) == []
+
+
+@pytest.mark.parametrize(
+    "accept, fmt, expected",
+    [
+        (None, None, JSON),
+        ("application/json", None, JSON),
+        (COLUMNAR_MEDIA_TYPE, None, COLUMNAR),
+        (f"text/html, {BINARY_MEDIA_TYPE};q=0.9", None, BINARY),
+        ("application/octet-stream", None, BINARY),
+        (BINARY_MEDIA_TYPE, COLUMNAR, COLUMNAR),
+    ],
+)
+def test_negotiate_prefers_the_format_parameter_then_accept(accept, fmt, expected):
+    assert negotiate(accept, fmt) == expected
+
+
+def test_columnar_uses_a_fixed_step_when_samples_are_evenly_spaced():
+    series = to_columnar(_samples(4))
+    assert series == {"start": int(T0.timestamp() * 1000), "count": 4, "step": 60000, "values": [0.0, 0.5, 1.0, 1.5]}
+
+
+def test_columnar_falls_back_to_deltas_for_gaps():
+    samples = _samples(3) + [(T0 + timedelta(minutes=10), 9.0)]
+    series = to_columnar(samples)
+    assert series["step"] is None
+    assert series["deltas"] == [60000, 60000, 480000]
+
+
+def _unpack(body: bytes):
+    magic, start, count, step = struct.unpack_from("<4sqII", body)
+    offset = struct.calcsize("<4sqII")
+    if step or count < 2:
+        times = [start + i * step for i in range(count)]
+    else:
+        deltas = struct.unpack_from(f"<{count - 1}I", body, offset)
+        offset += 4 * (count - 1)
+        times = [start]
+        for delta in deltas:
+            times.append(times[-1] + delta)
+    values = list(struct.unpack_from(f"<{count}f", body, offset))
+    assert offset + 4 * count == len(body)
+    return magic, times, values
+
+
+@pytest.mark.parametrize("samples", [_samples(5), _samples(3) + [(T0 + timedelta(hours=1), 7.25)], _samples(1), []])
+def test_binary_series_round_trips(samples):
+    magic, times, values = _unpack(pack_series(samples))
+    assert magic == BINARY_MAGIC
+    assert times == [round(t.timestamp() * 1000) for t, _ in samples]
+    # float32 is exact for these values
+    assert values == [v for _, v in samples]
@@ -0,0 +1,142 @@
+import base64
+import importlib.util
+import json
+from pathlib import Path
+
+import pytest
+
+_PATH = Path(__file__).resolve().parents[1] / "mobile" / "tools" / "lambda" / "etl" / "lambda_function.py"
+
+
+@pytest.fixture
+def etl():
+    # "lambda" is a keyword, so the function is loaded from its file rather than imported as a package
+    spec = importlib.util.spec_from_file_location("etl_lambda_function", _PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _record(seq, payload, arrival=1767225600.0):
+    data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+    return {"kinesis": {
+        "sequenceNumber": seq,
+        "data": base64.b64encode(data).decode(),
+        "approximateArrivalTimestamp": arrival,
+    }}
+
+
+def test_line_protocol_escapes_tags_and_quotes_strings(etl):
+    line = etl.to_line("telemetry", {"power": 1.5, "status": 'ok "now"', "on": True}, {"grid_id": "g 1"}, 7)
+    assert line == 'telemetry,grid_id=g\\ 1 power=1.5,status="ok \\"now\\"",on=true 7'
+
+
+@pytest.mark.parametrize("timestamp,expected", [
+    ("2026-01-01T00:00:00.250Z", 1767225600_250_000_000),
+    ("2026-01-01T00:00:00", 1767225600_000_000_000),
+    (1767225600, 1767225600_000_000_000),
+    (1767225600250, 1767225600_250_000_000),
+    (1767225600_250_000_000, 1767225600_250_000_000),
+    ("not a time", 1767225601_000_000_000),
+])
+def test_record_time_prefers_the_reading_and_falls_back_to_arrival(etl, timestamp, expected):
+    rec = _record("1", {}, arrival=1767225601.0)
+    assert etl.record_time_ns({"timestamp": timestamp}, rec) == expected
+
+
+def test_one_invocation_makes_one_influx_write_and_one_alert_batch(etl, monkeypatch):
+    writes, batches = [], []
+    monkeypatch.setattr(etl, "write_influx", lambda lines: writes.append(lines) or [])
+    monkeypatch.setattr(etl, "write_alerts", lambda items: batches.append(items) or True)
+    event = {"Records": [
+        _record("1", {"grid_id": "g1", "device_id": "d1", "live_generation": 4.2}),
+        _record("2", {"grid_id": "g1", "message": "Load Abnormality: high", "timestamp": "2026-01-01T00:00:00Z"}),
+        _record("3", b"not json"),
+        _record("4", {"grid_id": "g2", "live_generation": 1.0}),
+        _record("5", {"type": "alert", "grid_id": "g2"}),
+    ]}
+    assert etl.handler(event, None) == {"batchItemFailures": []}
+    assert len(writes) == 1 and len(writes[0]) == 2
+    assert writes[0][0].startswith("telemetry,device_id=d1,grid_id=g1 live_generation=4.2 ")
+    assert len(batches) == 1
+    assert [item["alert_id"] for item in batches[0]] == ["alert-2", "alert-5"]
+
+
+def test_failed_writes_report_only_their_own_records(etl, monkeypatch):
+    monkeypatch.setattr(etl, "write_influx", lambda lines: list(range(len(lines))))
+    monkeypatch.setattr(etl, "write_alerts", lambda items: True)
+    event = {"Records": [
+        _record("1", {"grid_id": "g1", "live_generation": 4.2}),
+        _record("2", {"grid_id": "g1", "message": "Load Abnormality: high"}),
+        _record("3", {"grid_id": "g1", "live_generation": 4.3}),
+    ]}
+    failures = etl.handler(event, None)["batchItemFailures"]
+    assert failures == [{"itemIdentifier": "1"}, {"itemIdentifier": "3"}]
+
+
+@pytest.mark.parametrize("fields,tags", [
+    ({"power": 1.0}, {"grid_id": "g1\nmicrogrid x=1"}),
+    ({"power": 1.0}, {"grid_id": ""}),
+    ({"power": 1.0}, {"grid_id": None}),
+    ({"power": 1.0}, {"grid_id": {"nested": 1}}),
+    ({"power": float("nan")}, {"grid_id": "g1"}),
+    ({"note": "two\nlines"}, {"grid_id": "g1"}),
+    ({"": 1.0}, {"grid_id": "g1"}),
+])
+def test_line_protocol_rejects_what_it_cannot_carry(etl, fields, tags):
+    with pytest.raises(ValueError):
+        etl.to_line("telemetry", fields, tags, 1)
+
+
+def test_invalid_records_are_skipped_without_failing_the_batch(etl, monkeypatch):
+    writes = []
+    monkeypatch.setattr(etl, "write_influx", lambda lines: writes.append(lines) or [])
+    event = {"Records": [
+        _record("1", {"grid_id": "g1", "live_generation": 4.2}),
+        _record("2", {"grid_id": "g1\nbad", "live_generation": 4.2}),
+        _record("3", {"grid_id": None, "live_generation": 4.2}),
+        _record("4", {"grid_id": "g2", "live_generation": 1.0}),
+    ]}
+    assert etl.handler(event, None) == {"batchItemFailures": []}
+    assert [line.split(" ")[0] for line in writes[0]] == ["telemetry,grid_id=g1", "telemetry,grid_id=g2"]
+
+
+@pytest.fixture
+def influx(etl, monkeypatch):
+    """Influx that rejects requests containing a "bad" line, cannot be reached for "down" lines, and records the rest."""
+    for name in ("INFLUX_URL", "INFLUX_ORG", "INFLUX_BUCKET", "INFLUX_TOKEN"):
+        monkeypatch.setattr(etl, name, "http://influx" if name == "INFLUX_URL" else "x")
+    influx = {"written": [], "requests": 0, "down": set()}
+
+    def post(lines):
+        influx["requests"] += 1
+        if any("bad" in line for line in lines):
+            return 400
+        if any(line in influx["down"] for line in lines):
+            return None
+        influx["written"].extend(lines)
+        return 204
+
+    monkeypatch.setattr(etl, "_post_lines", post)
+    return influx
+
+
+def test_a_rejected_batch_is_split_until_only_the_bad_lines_are_dropped(etl, influx):
+    lines = [f"telemetry x={i} {i}" for i in range(8)]
+    lines[5] = "telemetry bad 5"
+    assert etl.write_influx(lines) == []
+    assert influx["written"] == lines[:5] + lines[6:]
+    # One request for the batch, then one per half on the way down to the bad line
+    assert influx["requests"] == 7
+
+
+def test_lines_that_could_not_be_sent_after_a_split_are_retried(etl, influx):
+    lines = ["telemetry bad 0", "telemetry x=1 1", "telemetry x=2 2", "telemetry x=3 3"]
+    influx["down"].add("telemetry x=3 3")
+    assert etl.write_influx(lines) == [2, 3]
+    assert influx["written"] == ["telemetry x=1 1"]
+
+
+def test_unconfigured_sinks_accept_everything(etl):
+    assert etl.write_influx(["telemetry x=1 1"]) == []
+    assert etl.write_alerts([{"alert_id": "a"}]) is True
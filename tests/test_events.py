@@ -0,0 +1,78 @@
+import asyncio
+import threading
+
+from backend.events import EventHub, Subscription
+
+
+def _measurement(grid_id: str, device_id: str, value: float) -> dict:
+    return {"type": "measurement", "grid_id": grid_id, "device_id": device_id, "consumption_kW": value}
+
+
+def test_measurements_coalesce_per_device_and_alerts_are_bounded():
+    async def run():
+        sub = Subscription(None, max_alerts=2)
+        sub.offer(_measurement("g", "a", 1.0))
+        sub.offer(_measurement("g", "a", 2.0))
+        sub.offer(_measurement("g", "b", 3.0))
+        for i in range(3):
+            sub.offer({"type": "alert", "grid_id": "g", "id": i})
+        return sub, await sub.next_batch(1.0)
+
+    sub, batch = asyncio.run(run())
+    assert [e["id"] for e in batch if e["type"] == "alert"] == [1, 2]
+    assert sorted(e["consumption_kW"] for e in batch if e["type"] == "measurement") == [2.0, 3.0]
+    assert sub.dropped == 1
+
+
+def test_next_batch_times_out_empty_for_a_heartbeat():
+    async def run():
+        return await Subscription(None, max_alerts=2).next_batch(0.01)
+
+    assert asyncio.run(run()) == []
+
+
+def test_hub_delivers_thread_published_events_to_matching_subscribers():
+    hub = EventHub()
+
+    async def run():
+        hub.bind(asyncio.get_running_loop())
+        grid_a = hub.subscribe(frozenset({"a"}))
+        everything = hub.subscribe(None)
+        publisher = threading.Thread(target=lambda: [hub.publish(_measurement(g, "d", 1.0)) for g in ("a", "b")])
+        publisher.start()
+        publisher.join()
+        return await grid_a.next_batch(1.0), await everything.next_batch(1.0)
+
+    only_a, both = asyncio.run(run())
+    assert [e["grid_id"] for e in only_a] == ["a"]
+    assert sorted(e["grid_id"] for e in both) == ["a", "b"]
+
+
+def test_unsubscribe_stops_delivery_and_publish_without_subscribers_is_dropped():
+    hub = EventHub()
+
+    async def run():
+        hub.bind(asyncio.get_running_loop())
+        sub = hub.subscribe(frozenset({"a"}))
+        hub.unsubscribe(sub)
+        hub.publish(_measurement("a", "d", 1.0))
+        return await sub.next_batch(0.01)
+
+    assert asyncio.run(run()) == []
+    assert hub.stats() == {"subscribers": 0, "published": 0, "pending": 0}
+
+
+def test_sse_stream_subscribes_only_while_it_is_being_consumed():
+    from backend.main import _sse_events, event_hub
+
+    async def run():
+        never_started = _sse_events(frozenset({"a"}))
+        assert event_hub.stats()["subscribers"] == 0
+        stream = _sse_events(frozenset({"a"}))
+        assert await stream.__anext__() == b"retry: 5000\n\n"
+        assert event_hub.stats()["subscribers"] == 1
+        await stream.aclose()
+        del never_started
+
+    asyncio.run(run())
+    assert event_hub.stats()["subscribers"] == 0
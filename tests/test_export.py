@@ -0,0 +1,188 @@
+import asyncio
+import csv
+import io
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import export as export_module
+from backend import main
+from backend.config import settings
+from backend.export import CSV, CSV_CANCELLED, PARQUET, PARQUET_STATUS_KEY, ExportRegistry, plan_chunks
+from backend.slots import QuerySlots
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+HOUR = timedelta(hours=1)
+
+
+def test_chunks_split_on_multiples_of_the_chunk_length():
+    start = T0 + timedelta(minutes=30)
+    assert plan_chunks(start, T0 + 3 * HOUR, 3600, None) == [
+        (start, T0 + HOUR), (T0 + HOUR, T0 + 2 * HOUR), (T0 + 2 * HOUR, T0 + 3 * HOUR),
+    ]
+    assert plan_chunks(T0, T0, 3600, None) == []
+
+
+def test_chunks_hold_whole_aggregation_windows():
+    chunks = plan_chunks(T0, T0 + 2 * HOUR, 1000, 900)
+    assert [(a - T0, b - T0) for a, b in chunks] == [
+        (timedelta(0), timedelta(minutes=30)),
+        (timedelta(minutes=30), timedelta(minutes=60)),
+        (timedelta(minutes=60), timedelta(minutes=90)),
+        (timedelta(minutes=90), timedelta(minutes=120)),
+    ]
+
+
+class _Chunks:
+    """Stands in for ``query_export_chunk``; later chunks answer first."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+        self.started = []
+
+    async def __call__(self, grids, metrics, start, stop, every):
+        self.started.append(start)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(max(0.002, 0.02 - (start - T0).total_seconds() / 3600 * 0.005))
+        finally:
+            self.in_flight -= 1
+        return [(start + timedelta(minutes=m), grids[0], "d1", float(m)) for m in (0, 30)]
+
+
+@pytest.fixture
+def chunks(monkeypatch):
+    chunks = _Chunks()
+    monkeypatch.setattr(export_module, "query_export_chunk", chunks)
+    return chunks
+
+
+async def _collect(registry, export):
+    return b"".join([data async for data in registry.stream(export)])
+
+
+def test_csv_export_streams_chunks_in_time_order(chunks):
+    registry = ExportRegistry(chunk_seconds=3600, concurrency=2)
+    export = registry.create(["g1"], ["generation_kW"], T0, T0 + 4 * HOUR, None, CSV)
+    rows = list(csv.reader(io.StringIO(asyncio.run(_collect(registry, export)).decode())))
+    assert rows[0] == ["time", "grid_id", "device_id", "generation_kW"]
+    assert [row[0] for row in rows[1:]] == [
+        (T0 + timedelta(minutes=30 * i)).isoformat().replace("+00:00", "Z") for i in range(8)
+    ]
+    assert chunks.peak == 2
+    assert export.summary()["rows"] == 8 and export.chunks_done == 4
+    assert registry.stats()["completed"] == 1 and registry.stats()["active"] == []
+
+
+def test_parquet_export_round_trips(chunks):
+    pq = pytest.importorskip("pyarrow.parquet")
+    registry = ExportRegistry(chunk_seconds=3600, concurrency=2)
+    export = registry.create(["g1"], ["generation_kW"], T0, T0 + 2 * HOUR, None, PARQUET)
+    table = pq.read_table(io.BytesIO(asyncio.run(_collect(registry, export))))
+    assert table.num_rows == 4
+    assert table.column("generation_kW").to_pylist() == [0.0, 30.0, 0.0, 30.0]
+
+
+def _collect_cancelling(registry, export, after: int) -> bytes:
+    """Everything the export streams when it is cancelled after ``after`` pieces."""
+
+    async def run():
+        received = []
+        async for data in registry.stream(export):
+            received.append(data)
+            if len(received) == after:
+                assert registry.cancel(export.id)
+        await asyncio.sleep(0)
+        return b"".join(received)
+
+    return asyncio.run(run())
+
+
+def test_cancelling_an_export_stops_its_queries_and_ends_the_body_cleanly(chunks):
+    registry = ExportRegistry(chunk_seconds=3600, concurrency=2)
+    export = registry.create(["g1"], ["generation_kW"], T0, T0 + 24 * HOUR, None, CSV)
+    body = _collect_cancelling(registry, export, after=2)
+    assert body.endswith(CSV_CANCELLED)
+    rows = list(csv.reader(io.StringIO(body[:-len(CSV_CANCELLED)].decode())))
+    assert rows[0] == ["time", "grid_id", "device_id", "generation_kW"] and len(rows) == 3
+    assert len(chunks.started) < 24 and chunks.in_flight == 0
+    assert registry.stats()["cancelled"] == 1 and not registry.cancel(export.id)
+
+
+def test_a_cancelled_parquet_export_is_a_readable_file_marked_cancelled(chunks):
+    pq = pytest.importorskip("pyarrow.parquet")
+    registry = ExportRegistry(chunk_seconds=3600, concurrency=2)
+    export = registry.create(["g1"], ["generation_kW"], T0, T0 + 24 * HOUR, None, PARQUET)
+    parquet = pq.ParquetFile(io.BytesIO(_collect_cancelling(registry, export, after=2)))
+    assert parquet.metadata.num_rows == 2
+    assert parquet.metadata.metadata[PARQUET_STATUS_KEY.encode()] == b"cancelled"
+
+
+def test_parquet_exports_are_refused_without_pyarrow(monkeypatch):
+    monkeypatch.setattr(main, "parquet_available", lambda: False)
+    response = TestClient(main.app).get(
+        "/api/export",
+        params={"start": T0.isoformat(), "end": (T0 + HOUR).isoformat(), "grids": "g1", "format": "parquet"},
+        headers={"Authorization": f"Bearer {settings.api_token}"},
+    )
+    assert response.status_code == 400
+
+
+def test_freed_slots_go_to_interactive_callers_first():
+    slots = QuerySlots(size=1, background_limit=1)
+
+    async def run():
+        await slots.acquire(background=True)
+        granted = []
+
+        async def take(name, background):
+            async with slots.slot(background):
+                granted.append(name)
+                await asyncio.sleep(0)
+
+        tasks = [asyncio.ensure_future(take(n, b)) for n, b in [("export", True), ("dash-1", False), ("dash-2", False)]]
+        await asyncio.sleep(0)
+        assert slots.stats()["waiting"] == 2 and slots.stats()["background_waiting"] == 1
+        slots.release(background=True)
+        await asyncio.gather(*tasks)
+        return granted
+
+    assert asyncio.run(run()) == ["dash-1", "dash-2", "export"]
+    assert slots.stats()["in_use"] == 0
+
+
+def test_background_callers_never_hold_more_than_their_limit():
+    slots = QuerySlots(size=3, background_limit=1)
+
+    async def run():
+        await slots.acquire(background=True)
+        second = asyncio.ensure_future(slots.acquire(background=True))
+        await slots.acquire()
+        await asyncio.sleep(0)
+        assert not second.done() and slots.stats()["in_use"] == 2
+        slots.release(background=True)
+        await second
+        return slots.stats()
+
+    assert asyncio.run(run())["background"] == 1
+
+
+def test_a_cancelled_waiter_gives_up_its_place():
+    slots = QuerySlots(size=1, background_limit=1)
+
+    async def run():
+        await slots.acquire()
+        waiter = asyncio.ensure_future(slots.acquire())
+        behind = asyncio.ensure_future(slots.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        slots.release()
+        await behind
+        return waiter.cancelled(), slots.stats()
+
+    cancelled, stats = asyncio.run(run())
+    assert cancelled and stats["in_use"] == 1 and stats["waiting"] == 0
@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from backend.historical_cache import ENTRY_BYTES, SAMPLE_BYTES, HistoricalCache
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+class _Source:
+    """Fetch stub recording the start of every call."""
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.calls = []
+
+    async def __call__(self, start):
+        self.calls.append(start)
+        return [s for s in self.samples if start is None or s[0] >= start]
+
+
+def test_miss_then_hit_within_min_refresh():
+    now = _now()
+    source = _Source([(now - timedelta(seconds=10), 1.0), (now, 2.0)])
+    cache = HistoricalCache(max_bytes=1 << 20, min_refresh=60.0)
+
+    async def run():
+        first = await cache.get("k", 3600, source)
+        second = await cache.get("k", 3600, source)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second == source.samples
+    assert source.calls == [None]
+    stats = cache.stats()
+    assert (stats["misses"], stats["hits"]) == (1, 1)
+
+
+def test_refresh_replaces_the_last_bucket_and_appends_new_samples():
+    now = _now()
+    source = _Source([(now - timedelta(seconds=20), 1.0), (now - timedelta(seconds=10), 2.0)])
+    cache = HistoricalCache(max_bytes=1 << 20, min_refresh=0.0)
+
+    async def run():
+        await cache.get("k", 3600, source)
+        # The last bucket filled up and a new one started
+        source.samples = [(now - timedelta(seconds=20), 1.0), (now - timedelta(seconds=10), 2.5), (now, 3.0)]
+        return await cache.get("k", 3600, source)
+
+    samples = asyncio.run(run())
+    assert source.calls == [None, now - timedelta(seconds=10)]
+    assert [v for _, v in samples] == [1.0, 2.5, 3.0]
+    assert cache.stats()["refreshes"] == 1
+
+
+def test_samples_older_than_the_window_are_trimmed():
+    now = _now()
+    source = _Source([(now - timedelta(hours=2), 1.0), (now - timedelta(minutes=5), 2.0)])
+    cache = HistoricalCache(max_bytes=1 << 20)
+    samples = asyncio.run(cache.get("k", 3600, source))
+    assert [v for _, v in samples] == [2.0]
+
+
+def test_least_recently_used_entries_are_evicted_over_the_size_cap():
+    now = _now()
+    source = _Source([(now, 1.0)])
+    entry = ENTRY_BYTES + SAMPLE_BYTES
+    cache = HistoricalCache(max_bytes=2 * entry, min_refresh=60.0)
+
+    async def run():
+        await cache.get("a", 3600, source)
+        await cache.get("b", 3600, source)
+        await cache.get("a", 3600, source)  # a is now the most recently used
+        await cache.get("c", 3600, source)
+
+    asyncio.run(run())
+    assert set(cache._entries) == {"a", "c"}
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= 2 * entry
+
+
+def test_entry_larger_than_the_cap_is_not_stored():
+    now = _now()
+    source = _Source([(now - timedelta(seconds=i), float(i)) for i in range(100, 0, -1)])
+    cache = HistoricalCache(max_bytes=ENTRY_BYTES)
+    assert len(asyncio.run(cache.get("big", 3600, source))) == 100
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,116 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend import db, main
+from backend.config import settings
+from backend.slots import QuerySlots
+
+
+class _Record:
+    def __init__(self, i: int):
+        self.i = i
+
+    def get_time(self):
+        return datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=self.i)
+
+    def get_value(self):
+        return float(self.i)
+
+
+async def _records(count: int):
+    for i in range(count):
+        yield _Record(i)
+
+
+class _QueryApi:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.queries = []
+
+    async def query(self, q, org=None):
+        self.queries.append(q)
+        await asyncio.sleep(self.delay)
+        return ["table"]
+
+    async def query_stream(self, q, org=None):
+        self.queries.append(q)
+        return _records(100_000)
+
+
+class _AsyncClient:
+    def __init__(self, api: _QueryApi):
+        self._api = api
+
+    def query_api(self):
+        return self._api
+
+
+@pytest.fixture
+def query_api(monkeypatch):
+    api = _QueryApi(delay=0.0)
+    monkeypatch.setattr(db, "_async_client", _AsyncClient(api))
+    monkeypatch.setattr(db, "_query_slots", QuerySlots(2, 1))
+    return api
+
+
+def test_queries_need_an_open_client(monkeypatch):
+    monkeypatch.setattr(db, "_async_client", None)
+    with pytest.raises(RuntimeError):
+        db._query_api()
+
+
+def test_query_runs_on_the_async_client(query_api):
+    assert asyncio.run(db._query("from(bucket: \"x\")")) == ["table"]
+    assert query_api.queries == ['from(bucket: "x")']
+
+
+def test_slow_query_times_out_and_frees_its_slot(query_api, monkeypatch):
+    query_api.delay = 1.0
+    monkeypatch.setattr(db.settings, "influx_query_timeout", 0.05)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(db._query("slow"))
+    assert db._query_slots.stats()["in_use"] == 0
+
+
+def test_abandoned_historical_stream_frees_its_slot(query_api, monkeypatch):
+    monkeypatch.setattr(db.settings, "rollups_enabled", False)
+    query = "metric=consumption_kW&period=1h&grid_id=grid-001&stream=true"
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/dashboard/historical",
+        "raw_path": b"/api/dashboard/historical",
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"authorization", f"Bearer {settings.api_token}".encode())],
+        "client": ("test", 1),
+        "server": ("test", 80),
+    }
+
+    async def run():
+        first_body = asyncio.Event()
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await first_body.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            # A client that reads the first chunk and then stops reading
+            if message["type"] == "http.response.body" and message.get("body"):
+                first_body.set()
+                await asyncio.sleep(3600)
+
+        await asyncio.wait_for(main.app(scope, receive, send), 5)
+
+    asyncio.run(run())
+    assert db._query_slots.stats()["in_use"] == 0
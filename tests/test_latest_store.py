@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta, timezone
+
+from backend.latest_store import LatestStore
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _reading(consumption: float, generation: float, soc: float) -> dict:
+    return {"consumption_kW": consumption, "generation_kW": generation, "battery_soc": soc}
+
+
+def test_grid_sums_power_and_averages_soc_across_devices():
+    store = LatestStore()
+    store.update("grid", "a", _reading(2.0, 5.0, 40.0), T0)
+    store.update("grid", "b", _reading(3.0, 1.0, 80.0), T0 + timedelta(seconds=1))
+    snapshot = store.get_grid("grid")
+    assert snapshot.values == _reading(5.0, 6.0, 60.0)
+    assert snapshot.timestamp == T0 + timedelta(seconds=1)
+
+
+def test_a_device_contributes_only_its_latest_reading():
+    store = LatestStore()
+    store.update("grid", "a", _reading(2.0, 5.0, 40.0), T0)
+    store.update("grid", "a", _reading(4.0, 5.0, 40.0), T0 + timedelta(seconds=1))
+    assert store.get_grid("grid").values["consumption_kW"] == 4.0
+
+
+def test_offline_device_drops_out_of_the_grid_until_it_reports_again():
+    store = LatestStore(offline_after=60.0)
+    store.update("grid", "a", _reading(2.0, 5.0, 40.0), T0)
+    store.update("grid", "b", _reading(3.0, 1.0, 80.0), T0)
+    store.update("grid", "b", _reading(3.0, 1.0, 80.0), T0 + timedelta(seconds=61))
+    assert store.get_grid("grid").values == _reading(3.0, 1.0, 80.0)
+    assert store.get_device("grid", "a") is None
+
+    store.update("grid", "a", _reading(2.0, 5.0, 40.0), T0 + timedelta(seconds=62))
+    assert store.get_grid("grid").values == _reading(5.0, 6.0, 60.0)
+
+
+def test_out_of_order_reading_keeps_the_newer_snapshot_but_bumps_the_version():
+    store = LatestStore()
+    store.update("grid", "a", _reading(4.0, 5.0, 40.0), T0 + timedelta(seconds=5))
+    store.update("grid", "a", _reading(1.0, 1.0, 10.0), T0)
+    assert store.get_device("grid", "a").values["consumption_kW"] == 4.0
+    assert store.version("grid")[0] == 2
+
+
+def test_seed_fills_a_cold_grid_but_never_overrides_ingest():
+    store = LatestStore()
+    seeded = store.seed("cold", {"a": (_reading(1.0, 2.0, 50.0), T0), "b": (_reading(1.0, 2.0, 70.0), T0)})
+    assert seeded.values == _reading(2.0, 4.0, 60.0)
+
+    store.update("live", "a", _reading(9.0, 9.0, 90.0), T0)
+    assert store.seed("live", {"a": (_reading(1.0, 1.0, 10.0), T0)}).values == _reading(9.0, 9.0, 90.0)
+
+
+def test_unknown_grid_has_no_snapshot_or_version():
+    store = LatestStore()
+    assert store.get_grid("nope") is None
+    assert store.version("nope") == (0, 0.0)
@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+
+from simulator.load_generator import TELEMETRY_TOPIC, DeviceFleet, encode_batch, grid_name
+
+NOON = 1767268800.0  # 2026-01-01T12:00:00Z
+
+
+def test_fleet_topics_cover_every_grid_and_device():
+    fleet = DeviceFleet(grids=3, devices_per_grid=2, seed=1)
+    assert fleet.size == 6
+    assert fleet.topics[0] == TELEMETRY_TOPIC.format(grid_id="grid-00000", device_id="dev-000")
+    assert fleet.topics[-1] == "microgrid/grid-00002/device/dev-001/telemetry"
+    assert grid_name(12) == "grid-00012"
+
+
+def test_shards_split_the_fleet_and_share_its_parameters():
+    shards = [DeviceFleet(grids=5, devices_per_grid=3, seed=7, shard=i, shards=3) for i in range(3)]
+    assert sorted(np.concatenate([s.devices for s in shards]).tolist()) == list(range(15))
+    for shard in shards[1:]:
+        assert np.array_equal(shard.capacity_kw, shards[0].capacity_kw)
+        assert np.array_equal(shard.cloudiness, shards[0].cloudiness)
+
+
+def test_readings_are_reproducible_for_a_seed():
+    def run(seed):
+        fleet = DeviceFleet(grids=4, devices_per_grid=2, seed=seed)
+        idx = fleet.devices
+        return [fleet.readings(idx, NOON + i * 60) for i in range(3)]
+
+    first, again, other = run(3), run(3), run(4)
+    for a, b in zip(first, again):
+        assert all(np.array_equal(a[k], b[k]) for k in a)
+    assert not np.array_equal(first[0]["live_generation"], other[0]["live_generation"])
+
+
+def test_readings_follow_the_sun_and_keep_the_battery_in_range():
+    fleet = DeviceFleet(grids=10, devices_per_grid=2, seed=5)
+    idx = fleet.devices
+    night = fleet.readings(idx, NOON - 12 * 3600)
+    noon = fleet.readings(idx, NOON)
+    assert np.all(night["live_generation"] == 0.0) and np.all(night["solar_irradiance"] == 0)
+    assert np.all(noon["live_generation"] > 0.0)
+    assert np.all(noon["live_power_consumption"] >= 0.0)
+    assert np.all((noon["battery_soc"] >= 20) & (noon["battery_soc"] <= 100))
+
+
+def test_encoded_payloads_are_json_and_padded_to_size():
+    fleet = DeviceFleet(grids=1, devices_per_grid=3, seed=2)
+    values = fleet.readings(fleet.devices, NOON)
+    natural = encode_batch("2026-01-01T12:00:00+00:00", values, 0)
+    padded = encode_batch("2026-01-01T12:00:00+00:00", values, 400)
+    for body, big, consumption in zip(natural, padded, values["live_power_consumption"]):
+        reading = json.loads(body)
+        assert reading["timestamp"] == "2026-01-01T12:00:00+00:00"
+        assert reading["live_power_consumption"] == round(float(consumption), 2)
+        assert len(big) == 400
+        assert {k: v for k, v in json.loads(big).items() if k != "pad"} == reading
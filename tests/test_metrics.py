@@ -0,0 +1,118 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend import main
+from backend.metrics import MetricsMiddleware, Registry, counter, gauge, http_request_seconds
+
+
+def test_counters_sum_increments_from_every_thread():
+    counter = Registry().counter("test_total", "Test.")
+
+    def work():
+        for _ in range(1000):
+            counter.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc(0.5)
+    assert counter.value() == 4000.5
+
+
+def test_labelled_metrics_need_every_label():
+    counter = Registry().counter("test_total", "Test.", ["topic"])
+    with pytest.raises(ValueError):
+        counter.labels("a", "b")
+    assert counter.labels("a") is counter.labels("a")
+
+
+def test_render_writes_the_text_exposition_format():
+    registry = Registry()
+    registry.counter("test_messages_total", "Messages.", ["topic"]).labels('a"b\\c').inc(3)
+    histogram = registry.histogram("test_seconds", "Latency.", buckets=(0.5, 0.1))
+    for value in (0.05, 0.1, 0.3, 2.0):
+        histogram.observe(value)
+    registry.add_collector(lambda: [
+        gauge("test_queue", "Queue depth.", 1.5), gauge("test_unset", "Unset.", None), counter("test_sent_total", "Sent.", 7)
+    ])
+    assert registry.render() == "\n".join([
+        "# HELP test_messages_total Messages.",
+        "# TYPE test_messages_total counter",
+        'test_messages_total{topic="a\\"b\\\\c"} 3',
+        "# HELP test_seconds Latency.",
+        "# TYPE test_seconds histogram",
+        # Buckets are cumulative and a value on a bound counts towards it
+        'test_seconds_bucket{le="0.1"} 2',
+        'test_seconds_bucket{le="0.5"} 3',
+        'test_seconds_bucket{le="+Inf"} 4',
+        "test_seconds_sum 2.45",
+        "test_seconds_count 4",
+        "# HELP test_queue Queue depth.",
+        "# TYPE test_queue gauge",
+        "test_queue 1.5",
+        "# HELP test_unset Unset.",
+        "# TYPE test_unset gauge",
+        "# HELP test_sent_total Sent.",
+        "# TYPE test_sent_total counter",
+        "test_sent_total 7",
+    ]) + "\n"
+
+
+def test_component_counts_are_exported_as_counters_and_levels_as_gauges():
+    families = {name: kind for name, kind, _, _ in main._collect_stats()}
+    assert all(kind == ("counter" if name.endswith("_total") else "gauge") for name, kind in families.items())
+    assert families["solnova_influx_writer_written_total"] == "counter"
+    assert families["solnova_spool_replayed_lines_total"] == "counter"
+    assert families["solnova_influx_writer_queued"] == "gauge"
+    assert families["solnova_alerts_open"] == "gauge"
+
+
+def _request(app, path, query=b"", route_path=None):
+    async def run():
+        scope = {"type": "http", "path": path, "query_string": query}
+        if route_path is not None:
+            scope["route"] = type("Route", (), {"path": route_path})()
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await app(scope, None, send)
+        return sent
+
+    return asyncio.run(run())
+
+
+def _count(route, period, status):
+    return http_request_seconds.labels(route, period, status).snapshot()[-1]
+
+
+def test_middleware_labels_requests_by_route_template_and_known_period():
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    app = MetricsMiddleware(endpoint, periods=["1h", "24h"])
+    route = "/api/test/{grid_id}"
+    before = _count(route, "24h", "200"), _count(route, "", "200")
+    _request(app, "/api/test/g1", b"period=24h", route)
+    _request(app, "/api/test/g1", b"period=9999d", route)
+    assert (_count(route, "24h", "200"), _count(route, "", "200")) == (before[0] + 1, before[1] + 1)
+
+
+def test_middleware_skips_event_streams_and_counts_failures_as_500():
+    async def stream(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream")]})
+
+    async def broken(scope, receive, send):
+        raise RuntimeError("boom")
+
+    before = _count("/api/test/stream", "", "200"), _count("unmatched", "", "500")
+    _request(MetricsMiddleware(stream), "/api/test/stream", route_path="/api/test/stream")
+    with pytest.raises(RuntimeError):
+        _request(MetricsMiddleware(broken), "/nowhere")
+    assert (_count("/api/test/stream", "", "200"), _count("unmatched", "", "500")) == (before[0], before[1] + 1)
@@ -0,0 +1,69 @@
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+_PATH = Path(__file__).resolve().parents[1] / "mobile" / "tools" / "mock-backend" / "dataset.py"
+_spec = importlib.util.spec_from_file_location("mock_backend_dataset", _PATH)
+dataset = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(dataset)
+
+START = 1767225600  # 2026-01-01T00:00:00Z
+
+
+def _dataset(seed=1, **kwargs):
+    return dataset.Dataset(grids=2, seed=seed, step=300, history_days=8, horizon_days=1, start=START + 17, **kwargs)
+
+
+@pytest.fixture(scope="module")
+def data():
+    return _dataset()
+
+
+def test_the_same_seed_and_start_build_the_same_series(data):
+    again = _dataset()
+    for grid_id in data.ids:
+        for name in dataset.SERIES:
+            assert np.array_equal(data.series[grid_id][name], again.series[grid_id][name])
+    assert data.etag("realtime", "grid-001", 5) == again.etag("realtime", "grid-001", 5)
+    other = _dataset(seed=2)
+    assert not np.array_equal(data.series["grid-001"]["generation_kW"], other.series["grid-001"]["generation_kW"])
+    assert data.etag("realtime", "grid-001", 5) != other.etag("realtime", "grid-001", 5)
+
+
+def test_the_start_is_aligned_and_grids_differ(data):
+    assert data.start == START and data.ids == ["grid-001", "grid-002"]
+    assert data.timestamp(data.history).timestamp() == START
+    assert not np.array_equal(data.series["grid-001"]["consumption_kW"], data.series["grid-002"]["consumption_kW"])
+
+
+def test_series_stay_in_physical_ranges(data):
+    series = data.series["grid-001"]
+    assert series["generation_kW"].min() >= 0.0
+    assert series["consumption_kW"].min() >= 2.0
+    assert 5.0 <= series["battery_soc"].min() and series["battery_soc"].max() <= 100.0
+    # The sun sets: some samples of every day have no generation
+    assert (series["generation_kW"] == 0.0).any()
+
+
+@pytest.mark.parametrize("period", list(dataset.PERIODS))
+def test_historical_points_are_window_means_ending_at_the_index(data, period):
+    index = data.history
+    times, values = data.historical("grid-001", "consumption_kW", period, index)
+    count, width = dataset.PERIODS[period]
+    assert len(times) == len(values) == count
+    per_point = max(1, width // data.step)
+    raw = data.series["grid-001"]["consumption_kW"].astype(np.float64)
+    assert values[-1] == pytest.approx(raw[index + 1 - per_point:index + 1].mean(), abs=0.006)
+    assert times[-1] == data.timestamp(index).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def test_alerts_are_newest_first_and_only_up_to_the_index(data):
+    index = data.history
+    alerts = data.alerts_until("grid-001", index, limit=5)
+    assert 0 < len(alerts) <= 5
+    stamps = [alert["timestamp"] for alert in alerts]
+    assert stamps == sorted(stamps, reverse=True)
+    assert stamps[0] <= data.timestamp(index).isoformat()
+    assert alerts == data.alerts_until("grid-001", index, limit=5)
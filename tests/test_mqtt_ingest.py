@@ -0,0 +1,99 @@
+import json
+import queue
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from backend.config import settings
+from backend.latest_store import latest_store
+from backend.metrics import ingest_decode_failures, ingest_errors
+from backend.mqtt_client import (
+    ALERT,
+    ALERTS_TOPIC,
+    LEGACY_DATA_TOPIC,
+    LEGACY_DEVICE_ID,
+    TELEMETRY,
+    TELEMETRY_TOPIC,
+    _STOP,
+    MQTTIngest,
+    parse_topic,
+    topic_filter,
+)
+
+
+def _telemetry(**extra) -> bytes:
+    return json.dumps({
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "live_power_consumption": 3.0,
+        "live_generation": 4.0,
+        "battery_soc": 50,
+        **extra,
+    }).encode()
+
+
+@pytest.mark.parametrize(
+    "topic, route",
+    [
+        ("microgrid/grid-7/device/inv-1/telemetry", (TELEMETRY, "grid-7", "inv-1")),
+        ("microgrid/grid-7/alerts", (ALERT, "grid-7", None)),
+        (LEGACY_DATA_TOPIC, (TELEMETRY, settings.default_grid_id, None)),
+        ("microgrid/grid 7/device/inv-1/telemetry", None),
+        ("microgrid/grid-7/device/inv-1", None),
+        ("other/topic", None),
+    ],
+)
+def test_parse_topic(topic, route):
+    assert parse_topic(topic) == route
+
+
+def test_topic_filter_keeps_metric_labels_to_the_subscriptions():
+    assert topic_filter("microgrid/g/device/d/telemetry", TELEMETRY) == TELEMETRY_TOPIC
+    assert topic_filter("microgrid/g/alerts", ALERT) == ALERTS_TOPIC
+    assert topic_filter(LEGACY_DATA_TOPIC, TELEMETRY) == LEGACY_DATA_TOPIC
+
+
+def test_legacy_readings_take_the_payload_device_or_a_fixed_one():
+    ingest = MQTTIngest()
+    grid = settings.default_grid_id
+    ingest._handle((TELEMETRY, LEGACY_DATA_TOPIC, grid, None, _telemetry(device_id="inv-2")), [])
+    ingest._handle((TELEMETRY, LEGACY_DATA_TOPIC, grid, None, _telemetry()), [])
+    assert latest_store.get_device(grid, "inv-2") is not None
+    assert latest_store.get_device(grid, LEGACY_DEVICE_ID) is not None
+    assert latest_store.get_device(grid, grid) is None
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"message": "Fault", "timestamp": 12345},
+        {"message": ["Fault"], "timestamp": "2026-01-01T00:00:00Z"},
+        {"message": "Fault"},
+    ],
+)
+def test_alerts_with_unusable_fields_count_as_decode_failures(payload):
+    before = ingest_decode_failures.labels(ALERTS_TOPIC).value()
+    MQTTIngest()._handle((ALERT, ALERTS_TOPIC, "grid-x", None, json.dumps(payload).encode()), [])
+    assert ingest_decode_failures.labels(ALERTS_TOPIC).value() == before + 1
+
+
+def test_a_failing_message_is_counted_and_the_worker_keeps_going():
+    ingest = MQTTIngest()
+    handled = []
+
+    def handle(item, readings):
+        if item == "bad":
+            raise RuntimeError("boom")
+        handled.append(item)
+
+    ingest._handle = handle
+    partition = queue.Queue()
+    for item in ("bad", "good", _STOP):
+        partition.put(item)
+    before = ingest_errors.labels("message").value()
+    worker = threading.Thread(target=ingest._work, args=(partition,))
+    worker.start()
+    worker.join(timeout=5)
+    assert not worker.is_alive()
+    assert handled == ["good"]
+    assert ingest_errors.labels("message").value() == before + 1
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend import db
+from backend.rollups import TIERS, RollupAggregator, RollupCoverage, plan_tier, tier_window
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+MINUTE, FIVE_MINUTES, HOUR = TIERS
+
+
+@pytest.mark.parametrize("every,tier", [(60, None), (239, None), (240, MINUTE), (1200, FIVE_MINUTES), (14400, HOUR)])
+def test_the_coarsest_tier_with_enough_buckets_per_window_is_chosen(every, tier):
+    assert plan_tier(every) == tier
+
+
+def test_windows_round_up_to_whole_buckets():
+    assert tier_window(250, MINUTE) == 300
+    assert tier_window(3600, FIVE_MINUTES) == 3600
+
+
+def _aggregator():
+    emitted = []
+    aggregator = RollupAggregator(lambda tier, grid, start, values: emitted.append((tier, grid, start, values)), grace=5.0)
+    return aggregator, emitted
+
+
+def test_buckets_combine_devices_by_metric():
+    aggregator, emitted = _aggregator()
+    for seconds, device, consumption, soc in [(0, "d1", 2.0, 50.0), (30, "d1", 4.0, 70.0), (10, "d2", 1.0, 90.0)]:
+        aggregator.add("g1", device, {"consumption_kW": consumption, "battery_soc": soc}, T0 + timedelta(seconds=seconds))
+    aggregator.stop()
+    minute = {start: values for tier, _, start, values in emitted if tier == MINUTE}
+    # Consumption adds up across devices, state of charge is averaged
+    assert minute == {T0: {"consumption_kW": (3.0, 4.0, 5.0), "battery_soc": (70.0, 75.0, 80.0)}}
+
+
+def test_a_bucket_is_emitted_once_readings_pass_its_end_plus_grace():
+    aggregator, emitted = _aggregator()
+    aggregator.add("g1", "d1", {"generation_kW": 1.0}, T0)
+    aggregator.add("g1", "d1", {"generation_kW": 1.0}, T0 + timedelta(seconds=64))
+    aggregator.sweep()
+    assert emitted == []
+    aggregator.add("g1", "d1", {"generation_kW": 1.0}, T0 + timedelta(seconds=65))
+    aggregator.sweep()
+    assert [(tier, start) for tier, _, start, _ in emitted] == [(MINUTE, T0)]
+    assert aggregator.rolled_until(MINUTE, "g1") == T0 + timedelta(minutes=1)
+    assert aggregator.rolled_until(FIVE_MINUTES, "g1") is None
+
+    # A reading for the emitted bucket is too late to change it
+    aggregator.add("g1", "d1", {"generation_kW": 1.0}, T0 + timedelta(seconds=30))
+    assert aggregator.stats()["late"] == 1
+
+
+def test_coverage_only_extends_backwards_and_survives_a_new_instance(tmp_path):
+    path = str(tmp_path / "rollup_state.json")
+    coverage = RollupCoverage(path)
+    assert coverage.since() is None
+    coverage.extend(T0)
+    coverage.extend(T0 + timedelta(days=1))
+    assert coverage.since() == T0
+    coverage.extend(T0 - timedelta(days=1))
+    assert RollupCoverage(path).since() == T0 - timedelta(days=1)
+    coverage.reset()
+    coverage.reset()
+    assert coverage.since() is None
+
+
+def test_unreadable_coverage_counts_as_none(tmp_path):
+    path = tmp_path / "rollup_state.json"
+    path.write_text("{")
+    assert RollupCoverage(str(path)).since() is None
+
+
+@pytest.fixture
+def rollup_state(tmp_path, monkeypatch):
+    aggregator, _ = _aggregator()
+    coverage = RollupCoverage(str(tmp_path / "rollup_state.json"))
+    monkeypatch.setattr(db, "rollup_aggregator", aggregator)
+    monkeypatch.setattr(db, "rollup_coverage", coverage)
+    # Roll grid g1 up to 12:00 in this process
+    aggregator.add("g1", "d1", {"generation_kW": 1.0}, T0 + timedelta(hours=12) - timedelta(seconds=1))
+    aggregator.add("g1", "d1", {"generation_kW": 1.0}, T0 + timedelta(hours=12, seconds=5))
+    aggregator.sweep()
+    return coverage
+
+
+def test_queries_read_raw_data_without_coverage(rollup_state):
+    assert db._segments("g1", "24h", 900, T0, MINUTE) == [(T0, None, None)]
+    assert db._segments("g1", "24h", 900, T0, None) == [(T0, None, None)]
+
+
+def test_queries_read_the_tier_up_to_the_watermark_and_raw_data_after(rollup_state):
+    rollup_state.extend(T0 - timedelta(days=1))
+    noon = T0 + timedelta(hours=12)
+    assert db._segments("g1", "24h", 900, T0, MINUTE) == [(T0, noon, MINUTE), (noon, None, None)]
+
+
+def test_raw_data_fills_the_range_before_coverage_begins(rollup_state):
+    # Coverage starting mid-window rounds up so the tier only serves fully covered windows
+    rollup_state.extend(T0 + timedelta(hours=6, minutes=1))
+    covered = T0 + timedelta(hours=6, minutes=15)
+    noon = T0 + timedelta(hours=12)
+    assert db._segments("g1", "24h", 900, T0, MINUTE) == [
+        (T0, covered, None), (covered, noon, MINUTE), (noon, None, None),
+    ]
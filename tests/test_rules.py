@@ -0,0 +1,126 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend.rules import RuleEngine, RuleError, compile_rules
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+HIGH_LOAD = {
+    "name": "high_load",
+    "message": "Load Abnormality: sustained high consumption",
+    "severity": "critical",
+    "for_seconds": 10,
+    "when": {"metric": "consumption_kW", "op": ">", "value": 5},
+}
+
+
+def _engine(tmp_path, rules, **kwargs):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(rules))
+    return RuleEngine(str(path), reload_interval=0.0, **kwargs), path
+
+
+def _feed(engine, readings, device_id="d1"):
+    """Feed (seconds after T0, reading) pairs; returns the names fired at each step."""
+    return [
+        [f.rule for f in engine.evaluate("g1", device_id, reading, T0 + timedelta(seconds=s))]
+        for s, reading in readings
+    ]
+
+
+def test_a_rule_fires_once_after_holding_for_its_duration_and_rearms(tmp_path):
+    engine, _ = _engine(tmp_path, [HIGH_LOAD])
+    fired = _feed(engine, [
+        (0, {"consumption_kW": 6}),
+        (5, {"consumption_kW": 7}),
+        (10, {"consumption_kW": 7}),
+        (15, {"consumption_kW": 8}),
+        (20, {"consumption_kW": 1}),
+        (21, {"consumption_kW": 9}),
+        (31, {"consumption_kW": 9}),
+    ])
+    assert fired == [[], [], ["high_load"], [], [], [], ["high_load"]]
+    assert engine.stats()["fired"] == 2
+
+
+def test_rate_conditions_compare_change_per_second(tmp_path):
+    rule = {"name": "soc_drop", "message": "Battery draining fast",
+            "when": {"metric": "battery_soc", "rate": "<", "value": -1}}
+    engine, _ = _engine(tmp_path, [rule])
+    fired = _feed(engine, [
+        (0, {"battery_soc": 80}),
+        (10, {"battery_soc": 75}),
+        (20, {"battery_soc": 50}),
+        (20, {"battery_soc": 10}),
+    ])
+    # Samples that do not move time forward are ignored rather than dividing by zero
+    assert fired == [[], [], ["soc_drop"], []]
+
+
+def test_any_and_all_combine_child_conditions(tmp_path):
+    rules = [
+        {"name": "either", "message": "Either", "when": {"any": [
+            {"metric": "consumption_kW", "op": ">", "value": 5},
+            {"metric": "generation_kW", "op": ">", "value": 5},
+        ]}},
+        {"name": "both", "message": "Both", "when": {"all": [
+            {"metric": "consumption_kW", "op": ">", "value": 5},
+            {"metric": "generation_kW", "op": ">", "value": 5},
+        ]}},
+    ]
+    engine, _ = _engine(tmp_path, rules)
+    assert _feed(engine, [(0, {"consumption_kW": 6, "generation_kW": 1})]) == [["either"]]
+    assert _feed(engine, [(1, {"consumption_kW": 6, "generation_kW": 6})], device_id="d2") == [["either", "both"]]
+
+
+def test_devices_keep_separate_episodes(tmp_path):
+    engine, _ = _engine(tmp_path, [HIGH_LOAD])
+    _feed(engine, [(0, {"consumption_kW": 6})], device_id="d1")
+    assert _feed(engine, [(10, {"consumption_kW": 6})], device_id="d2") == [[]]
+    assert _feed(engine, [(10, {"consumption_kW": 6})], device_id="d1") == [["high_load"]]
+
+
+@pytest.mark.parametrize("rules", [
+    {"name": "not a list"},
+    [{"name": "x", "message": "m", "when": {"metric": "a", "op": "~", "value": 1}}],
+    [{"name": "x", "message": "m", "when": {"metric": "a", "op": ">", "value": "1"}}],
+    [{"name": "x", "message": "m", "when": {"any": []}}],
+    [{"name": "x", "message": "m", "severity": "fatal", "when": {"metric": "a", "op": ">", "value": 1}}],
+    [HIGH_LOAD, HIGH_LOAD],
+])
+def test_invalid_rules_are_rejected(rules):
+    with pytest.raises(RuleError):
+        compile_rules(rules, version=1)
+
+
+def test_changed_rules_file_is_reloaded_and_a_bad_one_keeps_the_old_rules(tmp_path):
+    engine, path = _engine(tmp_path, [HIGH_LOAD])
+    assert engine.stats()["version"] == 1
+
+    instant = dict(HIGH_LOAD, for_seconds=0)
+    path.write_text(json.dumps([instant]))
+    os.utime(path, (1, 1))
+    assert _feed(engine, [(0, {"consumption_kW": 6})]) == [["high_load"]]
+    assert engine.stats()["version"] == 2
+
+    path.write_text("[{not json")
+    os.utime(path, (2, 2))
+    assert _feed(engine, [(1, {"consumption_kW": 1}), (2, {"consumption_kW": 6})]) == [[], ["high_load"]]
+    stats = engine.stats()
+    assert stats["version"] == 2 and stats["error"].startswith("JSONDecodeError")
+
+
+def test_least_recently_seen_device_loses_its_state_past_the_limit(tmp_path):
+    engine, _ = _engine(tmp_path, [HIGH_LOAD], max_devices=2)
+    _feed(engine, [(0, {"consumption_kW": 6})], device_id="d1")
+    _feed(engine, [(0, {"consumption_kW": 6})], device_id="d2")
+    _feed(engine, [(1, {"consumption_kW": 6})], device_id="d1")
+    _feed(engine, [(2, {"consumption_kW": 6})], device_id="d3")
+    stats = engine.stats()
+    assert stats["devices"] == 2 and stats["evicted"] == 1
+    # d1 was touched after d2, so it kept its episode
+    assert _feed(engine, [(10, {"consumption_kW": 6})], device_id="d1") == [["high_load"]]
+    assert _feed(engine, [(10, {"consumption_kW": 6})], device_id="d2") == [[]]
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.singleflight import AsyncSingleFlight, SingleFlight
+
+
+def _wait(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def _concurrently(flight, key, fn, callers=5):
+    """Run ``callers`` threads through ``flight.do``; ``fn`` is released once all have joined."""
+    release = threading.Event()
+
+    def leader():
+        release.wait(5)
+        return fn()
+
+    with ThreadPoolExecutor(callers) as pool:
+        futures = [pool.submit(flight.do, key, leader)]
+        # The leader is now in flight; followers share its call
+        _wait(lambda: flight.stats()["in_flight"] == 1)
+        futures += [pool.submit(flight.do, key, fn) for _ in range(callers - 1)]
+        _wait(lambda: flight.shared == callers - 1)
+        release.set()
+        return [f.exception() or f.result() for f in futures]
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    runs = []
+    results = _concurrently(flight, "q", lambda: runs.append(1) or len(runs))
+    assert results == [1] * 5 and runs == [1]
+    assert flight.stats() == {"calls": 1, "shared": 4, "in_flight": 0}
+
+
+def test_every_waiter_gets_the_exception():
+    flight = SingleFlight()
+    error = ConnectionError("influx down")
+
+    def fail():
+        raise error
+
+    assert _concurrently(flight, "q", fail) == [error] * 5
+
+
+def test_calls_after_completion_run_again():
+    flight = SingleFlight()
+    assert flight.do("q", lambda: 1) == 1
+    assert flight.do("q", lambda: 2) == 2
+    assert flight.stats()["calls"] == 2
+
+
+def test_async_calls_with_the_same_key_share_one_task():
+    flight = AsyncSingleFlight()
+    runs = []
+
+    async def query(value):
+        runs.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    async def run():
+        return await asyncio.gather(
+            flight.do("a", lambda: query(1)), flight.do("a", lambda: query(2)), flight.do("b", lambda: query(3))
+        )
+
+    assert asyncio.run(run()) == [1, 1, 3]
+    assert runs == [1, 3]
+    assert flight.stats() == {"calls": 2, "shared": 1, "in_flight": 0}
+
+
+def test_a_cancelled_waiter_does_not_cancel_the_shared_task():
+    flight = AsyncSingleFlight()
+
+    async def query():
+        await asyncio.sleep(0.02)
+        return "rows"
+
+    async def run():
+        first = asyncio.ensure_future(flight.do("q", query))
+        second = asyncio.ensure_future(flight.do("q", query))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(run()) == ("rows", True)
+
+
+def test_async_waiters_all_get_the_exception():
+    flight = AsyncSingleFlight()
+
+    async def query():
+        await asyncio.sleep(0)
+        raise ConnectionError("influx down")
+
+    async def run():
+        return await asyncio.gather(flight.do("q", query), flight.do("q", query), return_exceptions=True)
+
+    first, second = asyncio.run(run())
+    assert isinstance(first, ConnectionError) and second is first
+    assert flight.stats()["in_flight"] == 0
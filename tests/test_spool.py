@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from backend.spool import RejectedError, Spool
+
+
+class _Influx:
+    def __init__(self):
+        self.up = True
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.received = []
+
+    def send(self, lines):
+        with self.lock:
+            self.calls += 1
+            if not self.up:
+                raise ConnectionError("influx down")
+            if any("bad" in line for line in lines):
+                raise RejectedError("unparseable point")
+            self.received.extend(lines)
+
+
+def _wait(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _lines(start, count):
+    return [f"microgrid,grid_id=g1 generation_kW=1 {i}" for i in range(start, start + count)]
+
+
+@pytest.fixture
+def influx():
+    return _Influx()
+
+
+@pytest.fixture
+def spool(tmp_path, influx):
+    spool = Spool(str(tmp_path / "spool"), influx.send, replay_batch=3, replay_rate=0.0, retry_interval=0.01)
+    yield spool
+    spool.stop()
+
+
+def test_healthy_writes_go_straight_to_influx(spool, influx):
+    spool.start()
+    spool.write(_lines(0, 2))
+    assert influx.received == _lines(0, 2)
+    assert spool.stats()["spooled"] == 0
+
+
+def test_an_outage_spools_without_retrying_and_replays_in_order(spool, influx):
+    influx.up = False
+    spool.write(_lines(0, 4))
+    spool.write(_lines(4, 4))
+    # Only the first batch tried Influx; the second went straight to disk
+    assert influx.calls == 1
+    stats = spool.stats()
+    assert stats["outage"] and stats["pending_lines"] == 8
+
+    spool.start()
+    influx.up = True
+    _wait(lambda: spool.stats()["segments"] == 0)
+    # The probe sends the head of the backlog ahead of the replay; repeats are harmless
+    assert list(dict.fromkeys(influx.received)) == _lines(0, 8)
+    stats = spool.stats()
+    assert not stats["outage"] and stats["replayed"] == 8
+
+    spool.write(_lines(8, 1))
+    assert influx.received[-1] == _lines(8, 1)[0]
+
+
+def test_probes_during_an_outage_keep_appending_to_one_segment(spool, influx):
+    influx.up = False
+    spool.write(_lines(0, 2))
+    spool.start()
+    _wait(lambda: influx.calls >= 5)
+    spool.write(_lines(2, 2))
+    assert spool.stats()["segments"] == 1
+
+
+def test_segments_roll_over_and_the_oldest_are_dropped_at_the_cap(tmp_path, influx):
+    line_bytes = len(_lines(0, 1)[0]) + 1
+    spool = Spool(str(tmp_path / "spool"), influx.send, max_bytes=3 * line_bytes, segment_bytes=line_bytes)
+    influx.up = False
+    for i in range(5):
+        spool.write(_lines(i, 1))
+    spool.stop()
+    stats = spool.stats()
+    assert stats["segments"] == 3 and stats["dropped"] == 2
+    assert stats["pending_lines"] == 3
+
+
+def test_rejected_batches_are_not_spooled(spool, influx):
+    with pytest.raises(RejectedError):
+        spool.write(["bad line"])
+    stats = spool.stats()
+    assert stats["rejected"] == 1 and stats["spooled"] == 0 and not stats["outage"]
+
+
+def test_segments_left_by_a_previous_run_are_replayed(tmp_path, influx):
+    directory = str(tmp_path / "spool")
+    influx.up = False
+    first = Spool(directory, influx.send)
+    first.write(_lines(0, 3))
+    first.stop()
+
+    influx.up = True
+    second = Spool(directory, influx.send, replay_rate=0.0, retry_interval=0.01)
+    second.start()
+    try:
+        _wait(lambda: second.stats()["segments"] == 0)
+    finally:
+        second.stop()
+    assert influx.received == _lines(0, 3)
+
+
+def test_a_disabled_spool_surfaces_send_errors(influx):
+    spool = Spool("", influx.send)
+    influx.up = False
+    with pytest.raises(ConnectionError):
+        spool.write(_lines(0, 1))
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main
+from backend.alerts_store import AlertsStore
+from backend.config import settings
+from backend.latest_store import LatestStore
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+AUTH = {"Authorization": f"Bearer {settings.api_token}"}
+
+
+class _Series:
+    def __init__(self):
+        self.fail = set()
+        self.calls = []
+
+    async def __call__(self, grid_id, metric, period, points):
+        self.calls.append((grid_id, metric, period, points))
+        if metric in self.fail:
+            raise ConnectionError("influx down")
+        return [(T0, 1.0), (T0 + timedelta(minutes=30), 2.0)]
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    latest = LatestStore(settle_delay=0.0)
+    latest.update("g1", "d1", {"consumption_kW": 2.0, "generation_kW": 5.0, "battery_soc": 60.0}, T0)
+    alerts = AlertsStore(str(tmp_path / "alerts.db"))
+    alerts.start()
+    series = _Series()
+    monkeypatch.setattr(main, "latest_store", latest)
+    monkeypatch.setattr(main, "alerts_store", alerts)
+    monkeypatch.setattr(main, "query_series", series)
+    # Not entered as a context manager, so the lifespan (MQTT, Influx) does not start
+    yield TestClient(main.app), latest, alerts, series
+    alerts.stop()
+
+
+def _add_alert(alerts, message, grid_id="g1"):
+    alert = alerts.add(message, T0.isoformat(), grid_id=grid_id, device_id="d1")
+    alerts._writer.stop()
+    alerts._writer.start()
+    return alert
+
+
+def test_summary_carries_kpis_active_alerts_and_sparklines(api):
+    client, _, alerts, series = api
+    _add_alert(alerts, "Load Abnormality: high")
+    _add_alert(alerts, "Load Abnormality: high", grid_id="g2")
+    response = client.get("/api/dashboard/summary/g1?period=24h&points=48", headers=AUTH)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["consumption_kW"] == 2.0 and body["source"] == "live" and body["grid_id"] == "g1"
+    assert [alert["grid_id"] for alert in body["alerts"]] == ["g1"]
+    assert set(body["sparklines"]) == set(main.SPARKLINE_METRICS)
+    assert sorted(call[1] for call in series.calls) == sorted(main.SPARKLINE_METRICS)
+    assert response.headers["ETag"]
+
+
+def test_summary_revalidates_until_a_reading_or_alert_changes(api):
+    client, latest, alerts, _ = api
+    tag = client.get("/api/dashboard/summary/g1", headers=AUTH).headers["ETag"]
+    response = client.get("/api/dashboard/summary/g1", headers={**AUTH, "If-None-Match": tag})
+    assert response.status_code == 304
+
+    latest.update("g1", "d1", {"consumption_kW": 3.0, "generation_kW": 5.0, "battery_soc": 60.0}, T0 + timedelta(seconds=1))
+    response = client.get("/api/dashboard/summary/g1", headers={**AUTH, "If-None-Match": tag})
+    assert response.status_code == 200 and response.json()["consumption_kW"] == 3.0
+
+    tag = response.headers["ETag"]
+    _add_alert(alerts, "Battery Low: 10%")
+    assert client.get("/api/dashboard/summary/g1", headers={**AUTH, "If-None-Match": tag}).status_code == 200
+
+
+def test_a_failed_sparkline_is_null_and_the_summary_is_not_validated(api):
+    client, _, _, series = api
+    series.fail.add("battery_soc")
+    response = client.get("/api/dashboard/summary/g1", headers=AUTH)
+    assert response.status_code == 200
+    assert response.json()["sparklines"]["battery_soc"] is None
+    assert "ETag" not in response.headers
+
+
+@pytest.mark.parametrize("latest", [{}, ConnectionError("influx down")])
+def test_a_grid_with_alerts_but_no_reading_gets_a_summary_without_kpis(api, monkeypatch, latest):
+    client, _, alerts, _ = api
+
+    async def query_latest(grid_id):
+        if isinstance(latest, Exception):
+            raise latest
+        return latest
+
+    monkeypatch.setattr(main, "query_latest", query_latest)
+    _add_alert(alerts, "Battery Low: 10%", grid_id="g9")
+    response = client.get("/api/dashboard/summary/g9", headers=AUTH)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["source"] is None and "consumption_kW" not in body
+    assert [alert["message"] for alert in body["alerts"]] == ["Battery Low: 10%"]
+    assert set(body["sparklines"]) == set(main.SPARKLINE_METRICS)
+    assert "ETag" not in response.headers
+
+
+@pytest.mark.parametrize("query", ["period=2h", "points=5", "points=501", "alerts_limit=0", "alerts_limit=101"])
+def test_summary_rejects_out_of_range_parameters(api, query):
+    client = api[0]
+    assert client.get(f"/api/dashboard/summary/g1?{query}", headers=AUTH).status_code == 400
+
+
+def test_summary_requires_a_token(api):
+    assert api[0].get("/api/dashboard/summary/g1").status_code == 401